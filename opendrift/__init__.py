@@ -61,6 +61,11 @@ def open(filename, times=None, elements=None, load_history=True):
                        'opendrift_module and opendrift_class, defaulting to OceanDrift')
         module_name = 'oceandrift'
         class_name = 'OceanDrift'
+    # Contiguous ragged array, written with iomodule netcdf_ragged
+    if 'rowSize' in n.variables:
+        iomodule = 'netcdf_ragged'
+    else:
+        iomodule = 'netcdf'
     n.close()
 
     if class_name == 'OpenOil3D':
@@ -73,7 +78,7 @@ def open(filename, times=None, elements=None, load_history=True):
     if cls is None:
         from opendrift.models import oceandrift
         cls = oceandrift.OceanDrift
-    o = cls()
+    o = cls(iomodule=iomodule)
     o.io_import_file(filename, times=times, elements=elements, load_history=load_history)
     logger.info('Returning ' + str(type(o)) + ' object')
     return o
@@ -154,6 +159,7 @@ def import_from_ladim(ladimfile, romsfile):
     from models.oceandrift import OceanDrift
     o = OceanDrift()
     from netCDF4 import Dataset, date2num, num2date
+    from opendrift.export.history import History
     if isinstance(romsfile, str):
         from opendrift.readers import reader_ROMS_native
         romsfile = reader_ROMS_native.Reader(romsfile)
@@ -177,24 +183,22 @@ def import_from_ladim(ladimfile, romsfile):
 
     num_timesteps = len(time)
     num_elements = len(l.dimensions['particle'])
-    o.history = np.ma.array(
-        np.zeros([num_elements, num_timesteps]),
-        dtype=history_dtype, mask=[True])
+    o.history = History(history_dtype, num_elements, num_timesteps)
 
     for n in range(num_timesteps):
         start = start_index[n]
         active = pid[start:start+particle_count[n]]
-        o.history['lon'][active, n] = \
-            lon[start:start+particle_count[n]]
-        o.history['lat'][active, n] = \
-            lat[start:start+particle_count[n]]
-        o.history['status'][active, n] = 0
+        o.history.store('lon', active, n,
+                        lon[start:start+particle_count[n]])
+        o.history.store('lat', active, n,
+                        lat[start:start+particle_count[n]])
+        o.history.store('status', active, n, 0)
+        o.history.set_valid(active, n)
 
     o.status_categories = ['active', 'missing_data']
-    firstlast = np.ma.notmasked_edges(o.history['status'], axis=1)
-    index_of_last = firstlast[1][1]
-    o.history['status'][np.arange(len(index_of_last)),
-                        index_of_last] = 1
+    index_of_last = o.history.last
+    o.history.store('status', np.arange(len(index_of_last)),
+                    index_of_last, 1)
     kwargs = {}
     for var in ['lon', 'lat', 'status']:
         kwargs[var] = o.history[var][
@@ -24,7 +24,9 @@ class LagrangianArray:
     properties ('variables') of a collection of particles at a given time.
     Values are stored as named attributes (similar to recarray) which are
     ndarrays (1D, vectors) with one value for each particle, or as scalars
-    for values shared among all particles.
+    for values shared among all particles. Arrays are views of buffers
+    with spare capacity, so that elements may be added (extend) and
+    removed (move_elements) without reallocating arrays.
 
     This is an Abstract Base Class, meaning that only subclasses can be used.
     Subclasses will add specific variables for specific purposes (particle
@@ -156,6 +158,75 @@ class LagrangianArray:
         variables.update(new_variables)
         return variables
 
+    max_shifted_segments = 32  # Above this, compaction uses boolean indexing
+
+    def __getstate__(self):
+        # Spare capacity of buffers is not pickled (e.g. to worker processes)
+        state = self.__dict__.copy()
+        state.pop('_buffers', None)
+        return state
+
+    def _buffer(self, var, values):
+        """Return capacity buffer of var, if values is a view of its start.
+
+        Buffers are allocated with spare capacity when elements are added,
+        and elements are removed by compaction within the buffer. The
+        attribute is then a view of the first part of the buffer. If the
+        attribute has been replaced with another array, this array is
+        not owned by the object, and None is returned.
+        """
+        buffers = self.__dict__.setdefault('_buffers', {})
+        buf = buffers.get(var)
+        if buf is None or not isinstance(values, np.ndarray):
+            return None
+        # The buffer is kept alive, hence no other array may start at
+        # the same memory address
+        if values is buf or (values.ndim == 1 and values.dtype == buf.dtype
+                             and values.strides == buf.strides and
+                             len(values) <= len(buf) and
+                             values.__array_interface__['data'][0] ==
+                             buf.__array_interface__['data'][0]):
+            return buf
+        return None
+
+    def _append(self, var, present, new):
+        """Append array new to array present, and store as variable var.
+
+        Capacity is grown geometrically, so that adding elements is
+        amortised O(number of added elements). The dtype is as for
+        np.concatenate."""
+        num_present = len(present)
+        num_new = len(new)
+        dtype = np.result_type(present, new)
+        buf = self._buffer(var, present)
+        if buf is None or buf.dtype != dtype or \
+                len(buf) < num_present + num_new:
+            buf = np.empty(max(num_present + num_new, 2*num_present),
+                           dtype=dtype)
+            buf[:num_present] = present
+            self._buffers[var] = buf
+        buf[num_present:num_present + num_new] = new
+        setattr(self, var, buf[:num_present + num_new])
+
+    def _remove(self, var, present, keep, removed):
+        """Remove elements (indices removed) from array present, in place.
+
+        The remaining elements are kept in order. For few removed elements,
+        the segments between them are shifted within the buffer, otherwise
+        the remaining elements are gathered with the boolean array keep."""
+        num_keep = len(present) - len(removed)
+        buf = self._buffer(var, present)
+        if buf is None:  # Not owned: copy once, and keep as buffer
+            buf = present[keep]
+            self._buffers[var] = buf
+        elif len(removed) <= self.max_shifted_segments:
+            ends = np.append(removed[1:], len(present))
+            for i, (r, end) in enumerate(zip(removed, ends)):
+                buf[r - i:end - i - 1] = buf[r + 1:end]
+        else:
+            buf[:num_keep] = present[keep]
+        setattr(self, var, buf[:num_keep])
+
     def extend(self, other):
         """Add elements from another object."""
         len_self = len(self)
@@ -170,60 +241,48 @@ class LagrangianArray:
                 present_data == new_data):
                 continue
 
-            else:  # Otherwise we create arrays and concatenate
+            else:  # Otherwise we create arrays and append
                 if not hasattr(present_data, '__len__'):
                     present_data = present_data*np.ones(len_self)
                 if not hasattr(new_data, '__len__'):
                     new_data = new_data*np.ones(len_other)
-                setattr(self, var, np.concatenate((present_data,
-                                                   new_data)))
+                self._append(var, np.asarray(present_data),
+                             np.asarray(new_data))
 
     def move_elements(self, other, indices):
         """Remove elements with given indices, and append to another object.
-        NB: indices is boolean array, not real indices!"""
+        NB: indices is boolean array, not real indices!
+
+        Removed elements are appended to the buffers of other, and the
+        remaining elements are compacted within the buffers of self, so
+        that arrays are not reallocated at every deactivation or release.
+        Identical scalars of self and other remain scalars."""
 
-        # Move elements with given indices (boolean array)
-        # to another LagrangianArray
-        # NB: scalars and 1D arrays are converted to ndarrays and concatenated
         self_len = len(self)
         other_len = len(other)
+        indices = np.asarray(indices, dtype=bool)
+        removed = np.flatnonzero(indices)
+        keep = ~indices
         for var in self.variables:
             self_var = getattr(self, var)
             other_var = getattr(other, var)
             if (not isinstance(self_var, np.ndarray) and
                 not isinstance(other_var, np.ndarray)) and \
                     (other_var == self_var):
-                    if np.sum(indices) == len(self):
+                    if len(removed) == self_len:
                         setattr(self, var, [])  # Empty if all elements moved
                     continue  # Equal scalars - we do nothing
 
-            # Copy elements to other
+            # Scalars are converted to arrays once, and thereafter kept
+            # in buffers
             self_var = np.atleast_1d(self_var)
             other_var = np.atleast_1d(other_var)
             if len(self_var) < self_len:  # Convert scalar to array
                 self_var = self_var*np.ones(self_len)
-            if len(other_var) < other_len:  # Convert scalar to aray
+            if len(other_var) < other_len:  # Convert scalar to array
                 other_var = other_var*np.ones(other_len)
-            if len(self_var) > 0:
-                setattr(other, var, np.concatenate((other_var,
-                                                    self_var[indices])))
-            else:
-                setattr(other, var, self_var[indices])
-            setattr(self, var, self_var[~indices])  # Remove from self
-
-            #if isinstance(self_var, np.ndarray) or\
-            #    isinstance(other_var, np.ndarray):  # Array
-            #    setattr(other, var,
-            #            np.concatenate((getattr(other, var),
-            #                            getattr(self, var)[indices])))
-            #    # Remove elements from self
-            #    setattr(self, var, getattr(self, var)[~indices])
-            #elif isinstance(getattr(other, var), np.ndarray):
-            #    setattr(other, var,
-            #            np.concatenate((getattr(other, var),
-            #                            np.atleast_1d(getattr(self, var)))))
-            #else:
-            #    setattr(other, var, getattr(self, var))  # Scalar
+            other._append(var, other_var, self_var[removed])
+            self._remove(var, self_var, keep, removed)
 
     def __len__(self):
         length = 0
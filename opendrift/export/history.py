@@ -0,0 +1,162 @@
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class History():
+    """
+    Columnar store of element properties and environment along trajectories.
+
+    Each variable is stored in a separate, preallocated array with shape
+    (trajectory, time). Instead of a mask for each value, the first and
+    last stored output step is kept for each element, as elements are
+    stored contiguously from seeding until deactivation.
+
+    Variables may be stored with reduced precision, given as storage dtype
+    in `packing`: either a float dtype (e.g. 'float16'), or a tuple
+    (integer dtype, scale_factor, add_offset) as for packed data in CF.
+
+    Indexing with a variable name returns a read-only masked array of the
+    (unpacked) values, as for a masked structured array with dtype `dtype`.
+    Any other indexing is applied to such a structured array, see `load`.
+    """
+
+    def __init__(self, dtype, num_elements, num_steps, packing=None):
+        self.dtype = np.dtype(dtype)
+        self.shape = (num_elements, num_steps)
+        self.ndim = 2
+        self.packing = {}
+        for var, pack in (packing or {}).items():
+            if var not in self.dtype.names:
+                continue
+            if isinstance(pack, (tuple, list)):
+                pack = (np.dtype(pack[0]), float(pack[1]), float(pack[2]))
+                if pack[0].kind not in 'iu':
+                    raise ValueError('Packing of %s with scale_factor and '
+                                     'add_offset requires integer dtype' % var)
+            else:
+                pack = np.dtype(pack)
+            self.packing[var] = pack
+        self.columns = {var: np.zeros(self.shape,
+                                      dtype=self.storage_dtype(var))
+                        for var in self.dtype.names}
+        self.first = np.full(num_elements, -1, dtype=np.int32)
+        self.last = np.full(num_elements, -1, dtype=np.int32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.columns.values()) + \
+            self.first.nbytes + self.last.nbytes
+
+    def storage_dtype(self, var):
+        pack = self.packing.get(var)
+        if pack is None:
+            return self.dtype[var]
+        if isinstance(pack, tuple):
+            return pack[0]
+        return pack
+
+    def fill_value(self, var):
+        """Value of packed integers marking missing (NaN) values."""
+        return np.iinfo(self.packing[var][0]).min
+
+    def pack(self, var, values):
+        pack = self.packing.get(var)
+        if not isinstance(pack, tuple):
+            return values
+        dtype, scale_factor, add_offset = pack
+        info = np.iinfo(dtype)
+        values = np.asarray(values, dtype=np.float64)
+        packed = np.round((values - add_offset) / scale_factor)
+        packed = np.clip(packed, info.min + 1, info.max)
+        packed[np.isnan(values)] = self.fill_value(var)
+        return packed.astype(dtype)
+
+    def unpack(self, var, data):
+        pack = self.packing.get(var)
+        if not isinstance(pack, tuple):
+            return data.astype(self.dtype[var], copy=False)
+        dtype, scale_factor, add_offset = pack
+        values = (data * scale_factor + add_offset).astype(self.dtype[var])
+        if self.dtype[var].kind == 'f':
+            values[data == self.fill_value(var)] = np.nan
+        return values
+
+    def store(self, var, rows, steps, values):
+        """Store values of a variable for elements (rows) at output steps."""
+        self.columns[var][rows, steps] = self.pack(var, values)
+
+    def set_valid(self, rows, steps):
+        """Mark values of elements at output steps as stored."""
+        rows = np.arange(len(self))[rows]  # Rows may be repeated
+        steps = np.broadcast_to(steps, rows.shape)
+        # Missing (-1) is larger than any step when viewed as unsigned
+        np.minimum.at(self.first.view(np.uint32), rows,
+                      steps.astype(np.uint32))
+        np.maximum.at(self.last, rows, steps.astype(np.int32))
+
+    def assign(self, rows, other):
+        """Copy history of other (with same variables) into given rows."""
+        num_steps = other.shape[1]
+        for var in self.dtype.names:
+            self.columns[var][rows, 0:num_steps] = other.columns[var]
+        self.first[rows] = other.first
+        self.last[rows] = other.last
+
+    def clear(self):
+        """Mark all values as missing, e.g. after writing to file."""
+        self.first[:] = -1
+        self.last[:] = -1
+
+    def mask(self):
+        """Mask with True for missing values, as for masked arrays."""
+        steps = np.arange(self.shape[1])
+        return (steps < self.first[:, np.newaxis]) | \
+               (steps > self.last[:, np.newaxis])
+
+    def subset(self, rows=None, num_steps=None):
+        """Return history of given elements (rows) and first output steps."""
+        rows = slice(None) if rows is None else rows
+        num_steps = self.shape[1] if num_steps is None else num_steps
+        first = self.first[rows]
+        last = np.minimum(self.last[rows], num_steps - 1)
+        invalid = first > last
+        sub = History.__new__(History)
+        sub.dtype = self.dtype
+        sub.ndim = 2
+        sub.packing = self.packing
+        sub.columns = {var: c[rows, 0:num_steps].copy()
+                       for var, c in self.columns.items()}
+        sub.shape = sub.columns[self.dtype.names[0]].shape
+        sub.first = np.where(invalid, -1, first).astype(np.int32)
+        sub.last = np.where(invalid, -1, last).astype(np.int32)
+        return sub
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            return self.load()[key]
+        if key not in self.dtype.names:
+            raise ValueError('no field of name %s' % key)
+        # Read only, as writes would not update packed values or the mask;
+        # values are stored with `store` and `set_valid`
+        data = self.unpack(key, self.columns[key]).view()
+        data.flags.writeable = False
+        return np.ma.array(data, mask=self.mask(), copy=False)
+
+    def __setitem__(self, key, values):
+        if not isinstance(key, str):
+            raise TypeError('History can only be assigned by variable name')
+        self.columns[key][:] = self.pack(key, np.ma.filled(
+            np.ma.asarray(values, dtype=self.dtype[key]), 0))
+
+    def load(self):
+        """Return history as masked structured array."""
+        history = np.ma.array(np.zeros(self.shape), dtype=self.dtype)
+        history[:] = np.ma.masked
+        for var in self.dtype.names:
+            history[var] = self[var]
+        return history
@@ -3,11 +3,15 @@ import os
 from datetime import datetime, timedelta
 import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
 import string
+import queue
+import threading
 from shutil import move
 
 import numpy as np
 from netCDF4 import Dataset, num2date, date2num
 
+from opendrift.export.history import History
+
 # Module with functions to export/import trajectory data to/from netCDF file
 # Strives to be compliant with netCDF CF-convention on trajectories
 # https://cfconventions.org/Data/cf-conventions/cf-conventions-1.6/build/cf-conventions.html#idp8377728
@@ -15,6 +19,148 @@ from netCDF4 import Dataset, num2date, date2num
 
 skip_parameters = ['ID']  # Do not write to file
 
+# Output buffers are written by a background thread, with at most
+# writer_queue_size filled buffers waiting in memory
+writer_queue_size = 2
+# Element properties are stored in chunks of about chunk_bytes, spanning
+# the export buffer length in time, and compressed with zlib
+chunk_bytes = 2**20
+complevel = 1
+
+
+class TrajectoryWriter():
+    """
+    Background thread writing history slabs to an open netCDF file.
+
+    Slabs are received through a bounded queue, so that the simulation
+    may continue while previous output is written, but is blocked if
+    writing falls more than `queue_size` buffers behind.
+    Errors in the writer thread are raised by the next call to
+    `put` or `close`.
+    """
+
+    def __init__(self, outfile, queue_size=writer_queue_size):
+        self.outfile = outfile
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name='opendrift-writer')
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self._write(*item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _write(self, start, slabs, times):
+        for prop, slab in slabs.items():
+            self.outfile.variables[prop][:, start:start+slab.shape[1]] = slab
+        self.outfile.variables['time'][start:start+len(times)] = times
+        self.outfile.steps_exported = start + len(times)
+        logger.info('Wrote %s steps to file %s' % (len(times),
+                                                    self.outfile.filepath()))
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('Could not write output: %s' % error) \
+                from error
+
+    def put(self, start, slabs, times):
+        """Queue slabs of history, starting at output step `start`."""
+        self.check()
+        self.queue.put((start, slabs, times))
+
+    def close(self):
+        """Wait until all slabs are written, and stop thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.check()
+
+
+def chunksizes(self, dtype, dimensions=('trajectory', 'time')):
+    """Chunk shape of element properties in output file."""
+    if dimensions == ('obs',):  # Ragged array
+        return (max(1, chunk_bytes // np.dtype(dtype).itemsize),)
+    # History in memory is written at once if not exporting during run
+    num_steps = self.history.shape[1]
+    num_time = max(1, min(getattr(self, 'export_buffer_length', num_steps),
+                          getattr(self, 'expected_steps_output', num_steps)))
+    num_trajectory = chunk_bytes // (np.dtype(dtype).itemsize*num_time)
+    num_trajectory = max(1, min(num_trajectory, self.num_elements_total()))
+    return (num_trajectory, num_time)
+
+
+def write_attributes(self, outfile):
+    """Write global attributes, config settings and metadata."""
+    outfile.Conventions = 'CF-1.6'
+    outfile.standard_name_vocabulary = 'CF-1.6'
+    outfile.featureType = 'trajectory'
+    outfile.history = 'Created ' + str(datetime.now())
+    outfile.source = 'Output from simulation with OpenDrift'
+    outfile.model_url = 'https://github.com/OpenDrift/opendrift'
+    outfile.opendrift_class = self.__class__.__name__
+    outfile.opendrift_module = self.__class__.__module__
+    outfile.readers = str(self.readers.keys())
+    outfile.time_coverage_start = str(self.start_time)
+    outfile.time_step_calculation = str(self.time_step)
+    outfile.time_step_output = str(self.time_step_output)
+
+    # Write config settings
+    for key in self._config:
+        value = self.get_config(key)
+        if isinstance(value, (bool, type(None))):
+            value = str(value)
+        outfile.setncattr('config_' + key, value)
+
+    # Write additionaly metadata attributes, if given
+    if hasattr(self, 'metadata_dict'):
+        for key, value in self.metadata_dict.items():
+            outfile.setncattr(key, str(value))
+
+def create_property(self, prop, dimensions, outfile=None):
+    """Create variable for element property in output file."""
+    if outfile is None:
+        outfile = self.outfile
+    # Note: Should use 'f8' if 'f4' is not accurate enough,
+    #       at expense of larger files
+    try:
+        dtype = self.history.dtype[prop]
+    except:
+        dtype = 'f4'
+    # Variables packed as integers in memory are packed also in file
+    packing = getattr(self.history, 'packing', {}).get(prop)
+    fill_value = None
+    if isinstance(packing, tuple):
+        dtype = packing[0]
+        fill_value = self.history.fill_value(prop)
+    # Chunks can not be larger than fixed dimensions
+    chunks = [c if outfile.dimensions[d].isunlimited() else
+              max(1, min(c, len(outfile.dimensions[d])))
+              for c, d in zip(chunksizes(self, dtype, dimensions), dimensions)]
+    var = outfile.createVariable(
+        prop, dtype, dimensions, zlib=complevel > 0,
+        complevel=complevel, shuffle=True,
+        chunksizes=chunks, fill_value=fill_value)
+    if isinstance(packing, tuple):
+        var.scale_factor = packing[1]
+        var.add_offset = packing[2]
+    for subprop in self.history_metadata[prop].items():
+        if subprop[0] not in ['dtype', 'constant', 'default', 'seed']:
+            # Apparently axis attribute shall not be given for lon and lat:
+            if prop in ['lon', 'lat'] and subprop[0] == 'axis':
+                continue
+            var.setncattr(subprop[0], subprop[1])
+    return var
 
 def init(self, filename):
 
@@ -30,18 +176,7 @@ def init(self, filename):
     self.outfile.variables['trajectory'].cf_role = 'trajectory_id'
     self.outfile.variables['trajectory'].units = '1'
 
-    self.outfile.Conventions = 'CF-1.6'
-    self.outfile.standard_name_vocabulary = 'CF-1.6'
-    self.outfile.featureType = 'trajectory'
-    self.outfile.history = 'Created ' + str(datetime.now())
-    self.outfile.source = 'Output from simulation with OpenDrift'
-    self.outfile.model_url = 'https://github.com/OpenDrift/opendrift'
-    self.outfile.opendrift_class = self.__class__.__name__
-    self.outfile.opendrift_module = self.__class__.__module__
-    self.outfile.readers = str(self.readers.keys())
-    self.outfile.time_coverage_start = str(self.start_time)
-    self.outfile.time_step_calculation = str(self.time_step)
-    self.outfile.time_step_output = str(self.time_step_output)
+    write_attributes(self, self.outfile)
 
     # Time
     self.timeStr = 'seconds since 1970-01-01 00:00:00'
@@ -51,52 +186,31 @@ def init(self, filename):
     # Apparently axis attribute shall not be given for time, lon and lat
     #self.outfile.variables['time'].axis = 'T'
 
-    # Write config settings
-    for key in self._config:
-        value = self.get_config(key)
-        if isinstance(value, (bool, type(None))):
-            value = str(value)
-        self.outfile.setncattr('config_' + key, value)
-
-    # Write additionaly metadata attributes, if given
-    if hasattr(self, 'metadata_dict'):
-        for key, value in self.metadata_dict.items():
-            self.outfile.setncattr(key, str(value))
-
     # Add all element properties as variables
     for prop in self.history.dtype.fields:
         if prop in skip_parameters:
             continue
-        # Note: Should use 'f8' if 'f4' is not accurate enough,
-        #       at expense of larger files
-        try:
-            dtype = self.history.dtype[prop]
-        except:
-            dtype = 'f4'
-        var = self.outfile.createVariable(prop, dtype, ('trajectory', 'time'))
-        for subprop in self.history_metadata[prop].items():
-            if subprop[0] not in ['dtype', 'constant', 'default', 'seed']:
-                # Apparently axis attribute shall not be given for lon and lat:
-                if prop in ['lon', 'lat'] and subprop[0] == 'axis':
-                    continue
-                var.setncattr(subprop[0], subprop[1])
+        create_property(self, prop, ('trajectory', 'time'))
+
+    # File is kept open, and written to by a background thread
+    self.outfile_writer = TrajectoryWriter(self.outfile)
 
 def write_buffer(self):
-    if self.outfile._isopen == 0:
-        self.outfile = Dataset(self.outfile_name, 'a')
     num_steps_to_export = self.steps_output - self.steps_exported
+    # Copies are queued, as history array is reset for new data below
+    history = self.history.subset(num_steps=num_steps_to_export)
+    slabs = {}
     for prop in self.history_metadata:
         if prop in skip_parameters:
             continue
-        var = self.outfile.variables[prop]
-        var[:, self.steps_exported:self.steps_exported+num_steps_to_export] = \
-            self.history[prop][:, 0:num_steps_to_export]
+        slabs[prop] = history[prop]
+        if prop in history.packing:  # Missing values of packed integers
+            slabs[prop] = np.ma.masked_invalid(slabs[prop])
 
     times = [self.start_time + n*self.time_step_output for n in
              range(self.steps_exported, self.steps_output)]
-    self.outfile.variables['time'][
-        self.steps_exported:self.steps_exported+len(times)] = \
-            date2num(times, self.timeStr)
+    self.outfile_writer.put(self.steps_exported, slabs,
+                            date2num(times, self.timeStr))
 
     # Write status categories metadata
     # TODO: need not be written each output timestep, thus this could be deleted?
@@ -108,32 +222,34 @@ def write_buffer(self):
     #self.outfile.variables['status'].flag_meanings = \
     #    " ".join(self.status_categories)
 
-    logger.info('Wrote %s steps to file %s' % (num_steps_to_export,
-                                                self.outfile_name))
-    self.history.mask = True  # Reset history array, for new data
+    logger.debug('Queued %s steps for writing to file %s' %
+                 (num_steps_to_export, self.outfile_name))
+    self.history.clear()  # Reset history array, for new data
     self.steps_exported = self.steps_exported + num_steps_to_export
-    self.outfile.steps_exported = self.steps_exported
-    self.outfile.sync()  # Flush from memory to disk
-    self.outfile.close()  # close file temporarily
 
-def close(self):
-    self.outfile = Dataset(self.outfile_name, 'a')
+def write_flag_attributes(self, outfile):
+    """Write meanings of status and origin_marker values."""
     # Write status categories metadata
     status_dtype = self.ElementType.variables['status']['dtype']
-    self.outfile.variables['status'].valid_range = np.array(
+    outfile.variables['status'].valid_range = np.array(
         (0, len(self.status_categories) - 1)).astype(status_dtype)
-    self.outfile.variables['status'].flag_values = \
+    outfile.variables['status'].flag_values = \
         np.array(np.arange(len(self.status_categories)), dtype=status_dtype)
-    self.outfile.variables['status'].flag_meanings = \
+    outfile.variables['status'].flag_meanings = \
         " ".join(self.status_categories)
 
     # Write origin_marker definitions
-    if 'origin_marker' in self.outfile.variables:
-        self.outfile.variables['origin_marker'].flag_values = \
-            np.array(np.arange(len(self.origin_marker)))
-        self.outfile.variables['origin_marker'].flag_meanings = \
+    if 'origin_marker' in outfile.variables and \
+            isinstance(self.origin_marker, dict):
+        outfile.variables['origin_marker'].flag_values = \
+            np.array([int(om) for om in self.origin_marker])
+        outfile.variables['origin_marker'].flag_meanings = \
             " ".join(self.origin_marker.values())
 
+def write_final_attributes(self):
+    """Write metadata known at end of simulation to open output file."""
+    write_flag_attributes(self, self.outfile)
+
     # Write final timesteps to file
     self.outfile.time_coverage_end = str(self.time)
 
@@ -163,6 +279,15 @@ def close(self):
     self.outfile.runtime = str(datetime.now() -
                                self.timers['total time'])
 
+def close(self):
+    try:
+        self.outfile_writer.close()  # Wait for queued output
+    finally:
+        del self.outfile_writer
+    if self.outfile._isopen == 0:
+        self.outfile = Dataset(self.outfile_name, 'a')
+    write_final_attributes(self)
+
     self.outfile.close()  # Finally close file
 
     # Finally changing UNLIMITED time dimension to fixed, for CDM compliance.
@@ -176,6 +301,9 @@ def close(self):
             mask[self.elements_scheduled.ID-1] = False
         with Dataset(self.outfile_name) as src, \
                 Dataset(self.outfile_name + '_tmp', 'w') as dst:
+            # Packed integers are copied as is
+            src.set_auto_scale(False)
+            dst.set_auto_scale(False)
             for name, dimension in src.dimensions.items():
                 if name=='trajectory':
                     # Truncate dimension length to  number actually seeded
@@ -184,8 +312,20 @@ def close(self):
                     dst.createDimension(name, len(dimension))
 
             for name, variable in src.variables.items():
+                # Keep compression and chunking of element properties
+                filters = {}
+                chunking = variable.chunking()
+                shape = [len(dst.dimensions[d]) for d in variable.dimensions]
+                if variable.ndim == 2 and chunking != 'contiguous' and \
+                        min(shape) > 0:
+                    filters = {k: v for k, v in variable.filters().items()
+                               if k in ['zlib', 'complevel', 'shuffle']}
+                    filters['chunksizes'] = [min(c, n) for c, n in
+                                             zip(chunking, shape)]
+                if '_FillValue' in variable.ncattrs():
+                    filters['fill_value'] = variable.getncattr('_FillValue')
                 dstVar = dst.createVariable(name, variable.datatype,
-                                             variable.dimensions)
+                                             variable.dimensions, **filters)
                 srcVar = src.variables[name]
                 # Truncate data to number actually seeded
                 if 'trajectory' in variable.dimensions:
@@ -200,6 +340,8 @@ def close(self):
                     dstVar[:] = srcVar[:]
                 for att in src.variables[name].ncattrs():
                     # Copy variable attributes
+                    if att == '_FillValue':
+                        continue
                     dstVar.setncattr(att, srcVar.getncattr(att))
 
             for att in src.ncattrs():  # Copy global attributes
@@ -210,6 +352,51 @@ def close(self):
         print(me)
         print('Could not convert netCDF file from unlimited to fixed dimension. Could be due to netCDF library incompatibility(?)')
 
+def write_subset(self, filename, elements, times, attributes=None):
+    """Write subset of history (elements and output time indices) to new file.
+
+    Used e.g. to split output from several release groups after a run.
+    History must be in memory.
+    """
+    elements = np.atleast_1d(elements)
+    times = np.atleast_1d(times)
+    alltimes = [self.start_time + n*self.time_step_output
+                for n in range(self.history.shape[1])]
+    timeStr = 'seconds since 1970-01-01 00:00:00'
+    with Dataset(filename, 'w') as outfile:
+        outfile.createDimension('trajectory', len(elements))
+        outfile.createDimension('time', len(times))
+        outfile.createVariable('trajectory', 'i4', ('trajectory',))
+        outfile.variables['trajectory'][:] = np.arange(len(elements)) + 1
+        outfile.variables['trajectory'].cf_role = 'trajectory_id'
+        outfile.variables['trajectory'].units = '1'
+        outfile.createVariable('time', 'f8', ('time',))
+        outfile.variables['time'][:] = date2num(
+            [alltimes[t] for t in times], timeStr)
+        outfile.variables['time'].units = timeStr
+        outfile.variables['time'].standard_name = 'time'
+        outfile.variables['time'].long_name = 'time'
+
+        write_attributes(self, outfile)
+        outfile.time_coverage_start = str(alltimes[times[0]])
+        outfile.time_coverage_end = str(alltimes[times[-1]])
+        for key, value in (attributes or {}).items():
+            outfile.setncattr(key, str(value))
+
+        for prop in self.history.dtype.fields:
+            if prop in skip_parameters:
+                continue
+            var = create_property(self, prop, ('trajectory', 'time'), outfile)
+            values = self.history[prop][elements, :][:, times]
+            if prop in getattr(self.history, 'packing', {}):
+                values = np.ma.masked_invalid(values)  # Packed integers
+            var[:] = values
+
+        write_flag_attributes(self, outfile)
+
+    logger.info('Wrote %i elements and %i times to file %s' %
+                (len(elements), len(times), filename))
+
 def import_file_xarray(self, filename, chunks):
 
     import xarray as xr
@@ -258,10 +445,137 @@ def import_file_xarray(self, filename, chunks):
         self.lonmax = np.float32(self.ds.lon.maxval)
         self.latmax = np.float32(self.ds.lat.maxval)
 
+class HistoryFile():
+    """
+    History of element properties, read from output file on demand.
+
+    Mimics the masked history array with shape (trajectory, time):
+    indexing with a property name reads only that property from file, and
+    keeps it in memory for later access. Other indexing (e.g. [0:2, :])
+    reads only the indexed elements and times of properties not already
+    in memory.
+    """
+
+    def __init__(self, filename, dtype, elements, times):
+        self.filename = filename
+        self.dtype = dtype
+        self.elements = np.asarray(elements)
+        self.times = np.asarray(times)
+        self.shape = (len(elements), len(times))
+        self.ndim = 2
+        self.properties = {}  # Properties already read
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self.dtype.names:
+                raise ValueError('no field of name %s' % key)
+            if key not in self.properties:
+                self.properties[key] = self._read(
+                    key, self.elements, self.times)
+            return self.properties[key]
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) == 1:
+            key = key + (slice(None),)
+        if len(key) != 2 or any(k is Ellipsis or k is None for k in key):
+            return self.load()[key]
+        # Rows and columns to be read, and key for indexing these
+        positions = []
+        local_key = []
+        for k, length in zip(key, self.shape):
+            selected = np.atleast_1d(np.arange(length)[k])
+            if isinstance(k, slice):
+                positions.append(selected)
+                local_key.append(slice(None))
+            else:
+                unique = np.unique(selected)
+                positions.append(unique)
+                local_key.append(np.searchsorted(unique, np.arange(length)[k]))
+        history = np.ma.array(np.zeros((len(positions[0]),
+                                        len(positions[1]))),
+                              dtype=self.dtype)
+        history[:] = np.ma.masked
+        if history.size == 0:
+            return history[tuple(local_key)]
+        for var in self.dtype.names:
+            if var in self.properties:
+                history[var] = self.properties[var][np.ix_(*positions)]
+            else:
+                history[var] = self._read(var, self.elements[positions[0]],
+                                          self.times[positions[1]])
+        return history[tuple(local_key)]
+
+    def _read(self, var, elements, times):
+        with Dataset(self.filename, 'r') as infile:
+            data = infile.variables[var][self._index(elements),
+                                         self._index(times)]
+        return np.ma.array(data, dtype=self.dtype[var], copy=False)
+
+    @staticmethod
+    def _index(indices):
+        # Contiguous ranges are read as slices
+        if len(indices) > 0 and np.all(np.diff(indices) == 1):
+            return slice(indices[0], indices[-1] + 1)
+        return indices
+
+    def load(self):
+        """Return history of all properties as masked array."""
+        history = np.ma.array(np.zeros(self.shape), dtype=self.dtype)
+        history[:] = np.ma.masked
+        for var in self.dtype.names:
+            history[var] = self[var]
+        return history
+
+def import_attributes(self, infile):
+    """Apply config settings and time steps from attributes of output file."""
+    # Import and apply config settings
+    attributes = infile.ncattrs()
+    for attr in attributes:
+        if attr.startswith('config_'):
+            value = infile.getncattr(attr)
+            conf_key = attr[7:]
+            if value == 'True':
+                value = True
+            if value == 'False':
+                value = False
+            if value == 'None':
+                value = None
+            try:
+                self.set_config(conf_key, value)
+                logger.debug('Setting imported config: %s -> %s' %
+                             (conf_key, value))
+            except:
+                logger.warning('Could not set config: %s -> %s' %
+                                (conf_key, value))
+
+    # Import time steps from metadata
+    def timedelta_from_string(timestring):
+        if 'day' in timestring:
+            days = int(timestring.split('day')[0])
+            hs = timestring.split(' ')[-1]
+            th = datetime.strptime(hs, '%H:%M:%S')
+            return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
+        else:
+            t = datetime.strptime(timestring, '%H:%M:%S')
+            return timedelta(
+                hours=t.hour, minutes=t.minute, seconds=t.second)
+    try:
+        self.time_step = timedelta_from_string(infile.time_step_calculation)
+        self.time_step_output = timedelta_from_string(infile.time_step_output)
+    except Exception as e:
+        logger.warning(e)
+        logger.warning('Could not parse time_steps from netCDF file')
+
 def import_file(self, filename, times=None, elements=None, load_history=True):
     """Create OpenDrift object from imported file.
      times: indices of time steps to be imported, must be contineous range.
      elements: indices of elements to be imported
+     load_history: if True, history is imported into memory. If 'lazy',
+        history properties are read from file only when accessed.
     """
 
     logger.debug('Importing from ' + filename)
@@ -301,8 +615,11 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
     history_dtype_fields = []
     self.history_metadata = self.ElementType.variables.copy()
     for env_var in infile.variables:
-            history_dtype_fields.append((env_var, np.dtype('float32')))
-            self.history_metadata[env_var] = {}
+        if load_history == 'lazy' and \
+                infile.variables[env_var].dimensions != ('trajectory', 'time'):
+            continue
+        history_dtype_fields.append((env_var, np.dtype('float32')))
+        self.history_metadata[env_var] = {}
     history_dtype = np.dtype(history_dtype_fields)
 
     # Import dataset (history)
@@ -315,28 +632,37 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
         elements = firstlast[0][0]
         logger.warning('A subset is requested, and number of active elements is %d'
                        % num_elements)
-    if load_history is True:
-        self.history = np.ma.array(
-            np.zeros([num_elements, self.steps_output]),
-            dtype=history_dtype)
-        self.history[:] = np.ma.masked
+    if load_history == 'lazy':
+        self.history = HistoryFile(filename, history_dtype, elements, times)
+    elif load_history is True:
+        self.history = History(history_dtype, num_elements,
+                               self.steps_output)
         for var in infile.variables:
             if var in ['time', 'trajectory']:
                 continue
             try:
-                self.history[var] = infile.variables[var][elements, times]
+                self.history[var] = np.ma.filled(np.ma.asarray(
+                    infile.variables[var][elements, times],
+                    dtype=np.float32), np.nan)
             except Exception as e:
                 logger.info(e)
                 pass
-
+        rows, steps = np.nonzero(~np.ma.getmaskarray(
+            infile.variables['status'][elements, times]))
+        self.history.set_valid(rows, steps)
+        index_of_last = self.history.last
+    if load_history in [True, 'lazy']:
         # Initialise elements from given (or last) state/time
-        firstlast = np.ma.notmasked_edges(self.history['status'], axis=1)
-        index_of_last = firstlast[1][1]
         kwargs = {}
+        if load_history == 'lazy':  # Reading only the last time steps
+            last = self.history[np.arange(num_elements), index_of_last]
         for var in infile.variables:
             if var in self.ElementType.variables:
-                kwargs[var] = self.history[var][
-                    np.arange(num_elements), index_of_last]
+                if load_history == 'lazy':
+                    kwargs[var] = last[var]
+                else:
+                    kwargs[var] = self.history[var][
+                        np.arange(num_elements), index_of_last]
         #kwargs['ID'] = np.arange(num_elements) + 1
         kwargs['ID'] = np.array(list(elements)) + 1
         self.elements = self.ElementType(**kwargs)
@@ -348,42 +674,6 @@ def import_file(self, filename, times=None, elements=None, load_history=True):
     # Remove elements which are scheduled for deactivation
     self.remove_deactivated_elements()
 
-    # Import and apply config settings
-    attributes = infile.ncattrs()
-    for attr in attributes:
-        if attr.startswith('config_'):
-            value = infile.getncattr(attr)
-            conf_key = attr[7:]
-            if value == 'True':
-                value = True
-            if value == 'False':
-                value = False
-            if value == 'None':
-                value = None
-            try:
-                self.set_config(conf_key, value)
-                logger.debug('Setting imported config: %s -> %s' %
-                             (conf_key, value))
-            except:
-                logger.warning('Could not set config: %s -> %s' %
-                                (conf_key, value))
-
-    # Import time steps from metadata
-    def timedelta_from_string(timestring):
-        if 'day' in timestring:
-            days = int(timestring.split('day')[0])
-            hs = timestring.split(' ')[-1]
-            th = datetime.strptime(hs, '%H:%M:%S')
-            return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
-        else:
-            t = datetime.strptime(timestring, '%H:%M:%S')
-            return timedelta(
-                hours=t.hour, minutes=t.minute, seconds=t.second)
-    try:
-        self.time_step = timedelta_from_string(infile.time_step_calculation)
-        self.time_step_output = timedelta_from_string(infile.time_step_output)
-    except Exception as e:
-        logger.warning(e)
-        logger.warning('Could not parse time_steps from netCDF file')
+    import_attributes(self, infile)
 
     infile.close()
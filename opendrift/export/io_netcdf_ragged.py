@@ -0,0 +1,257 @@
+from datetime import datetime
+import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
+from shutil import move
+
+import numpy as np
+from netCDF4 import Dataset, date2num
+
+from opendrift.export.io_netcdf import skip_parameters, TrajectoryWriter, \
+    write_attributes, create_property, write_final_attributes, \
+    import_attributes, write_subset
+from opendrift.export.history import History
+
+# Module with functions to export/import trajectory data to/from netCDF file
+# as CF contiguous ragged array, storing only output steps where elements
+# are active. This is much more compact than the (trajectory, time) array
+# of io_netcdf for continuous releases.
+# https://cfconventions.org/Data/cf-conventions/cf-conventions-1.6/build/cf-conventions.html#_contiguous_ragged_array_representation_of_trajectories
+#
+# During the simulation, output is appended chronologically along the
+# dimension 'obs' as an indexed ragged array (with variable
+# 'trajectory_index'), which is sorted by trajectory when closing the file.
+#
+# Select with: OpenDriftSimulation(iomodule='netcdf_ragged')
+
+
+class RaggedWriter(TrajectoryWriter):
+    """Background thread appending observations to an open netCDF file."""
+
+    def _write(self, start, obs, steps_exported):
+        for name, values in obs.items():
+            self.outfile.variables[name][start:start+len(values)] = values
+        self.outfile.steps_exported = steps_exported
+        logger.info('Wrote %s observations to file %s' %
+                    (len(obs['time']), self.outfile.filepath()))
+
+
+def init(self, filename):
+
+    self.outfile_name = filename
+    self.outfile = Dataset(filename, 'w')
+    self.outfile.createDimension('trajectory', self.num_elements_total())
+    self.outfile.createDimension('obs', None)  # Unlimited obs dimension
+    self.outfile.createVariable('trajectory', 'i4', ('trajectory',))
+    self.outfile.variables['trajectory'][:] = \
+        np.arange(self.num_elements_total())+1
+    self.outfile.variables['trajectory'].cf_role = 'trajectory_id'
+    self.outfile.variables['trajectory'].units = '1'
+    self.outfile.createVariable('trajectory_index', 'i4', ('obs',))
+    self.outfile.variables['trajectory_index'].instance_dimension = \
+        'trajectory'
+
+    write_attributes(self, self.outfile)
+
+    # Time
+    self.timeStr = 'seconds since 1970-01-01 00:00:00'
+    self.outfile.createVariable('time', 'f8', ('obs',))
+    self.outfile.variables['time'].units = self.timeStr
+    self.outfile.variables['time'].standard_name = 'time'
+    self.outfile.variables['time'].long_name = 'time'
+
+    # Add all element properties as variables
+    for prop in self.history.dtype.fields:
+        if prop in skip_parameters:
+            continue
+        var = create_property(self, prop, ('obs',))
+        if prop not in ['lon', 'lat']:
+            var.coordinates = 'time lat lon'
+
+    self.obs_exported = 0
+    # File is kept open, and written to by a background thread
+    self.outfile_writer = RaggedWriter(self.outfile)
+
+def write_buffer(self):
+    num_steps_to_export = self.steps_output - self.steps_exported
+    history = self.history.subset(num_steps=num_steps_to_export)
+    # Only output steps where elements are active, in chronological order
+    steps, rows = np.nonzero(~history.mask().T)
+    obs = {'trajectory_index': rows.astype(np.int32)}
+    obs['time'] = date2num(self.start_time, self.timeStr) + \
+        (self.steps_exported + steps)*self.time_step_output.total_seconds()
+    for prop in self.history_metadata:
+        if prop in skip_parameters:
+            continue
+        obs[prop] = history[prop][rows, steps]
+        if prop in history.packing:  # Missing values of packed integers
+            obs[prop] = np.ma.masked_invalid(obs[prop])
+
+    self.steps_exported = self.steps_exported + num_steps_to_export
+    self.outfile_writer.put(self.obs_exported, obs, self.steps_exported)
+    logger.debug('Queued %s observations for writing to file %s' %
+                 (len(rows), self.outfile_name))
+    self.obs_exported = self.obs_exported + len(rows)
+    self.history.clear()  # Reset history array, for new data
+
+def close(self):
+    try:
+        self.outfile_writer.close()  # Wait for queued output
+    finally:
+        del self.outfile_writer
+    if self.outfile._isopen == 0:
+        self.outfile = Dataset(self.outfile_name, 'a')
+    write_final_attributes(self)
+
+    self.outfile.close()  # Finally close file
+
+    # Finally sorting observations by trajectory, to contiguous ragged
+    # array with fixed dimensions, for CDM compliance.
+    logger.debug('Sorting observations by trajectory')
+    with Dataset(self.outfile_name) as src, \
+            Dataset(self.outfile_name + '_tmp', 'w') as dst:
+        src.set_auto_scale(False)  # Packed integers are copied as is
+        dst.set_auto_scale(False)
+        trajectory_index = src.variables['trajectory_index'][:]
+        order = np.argsort(trajectory_index, kind='stable')
+        row_size = np.bincount(trajectory_index,
+                               minlength=len(src.dimensions['trajectory']))
+        # Removing elements which have not been seeded
+        seeded = np.ones(len(row_size), dtype=bool)
+        if self.num_elements_scheduled() > 0:
+            logger.info('Removing %i unseeded elements from file' %
+                        self.num_elements_scheduled())
+            seeded[self.elements_scheduled.ID-1] = False
+        dst.createDimension('trajectory', np.sum(seeded))
+        dst.createDimension('obs', len(order))
+
+        dst.createVariable('rowSize', 'i4', ('trajectory',))
+        dst.variables['rowSize'][:] = row_size[seeded]
+        dst.variables['rowSize'].long_name = \
+            'number of observations for this trajectory'
+        dst.variables['rowSize'].sample_dimension = 'obs'
+
+        for name, variable in src.variables.items():
+            if name == 'trajectory_index':
+                continue
+            filters = {}
+            if '_FillValue' in variable.ncattrs():
+                filters['fill_value'] = variable.getncattr('_FillValue')
+            chunking = variable.chunking()
+            if variable.dimensions == ('obs',) and \
+                    chunking != 'contiguous' and len(order) > 0:
+                filters.update({k: v for k, v in variable.filters().items()
+                                if k in ['zlib', 'complevel', 'shuffle']})
+                filters['chunksizes'] = [min(chunking[0], len(order))]
+            dstVar = dst.createVariable(name, variable.datatype,
+                                        variable.dimensions, **filters)
+            if variable.dimensions == ('obs',):
+                dstVar[:] = variable[:][order]
+            else:
+                dstVar[:] = variable[:][seeded]
+            for att in variable.ncattrs():
+                if att == '_FillValue':
+                    continue
+                dstVar.setncattr(att, variable.getncattr(att))
+
+        for att in src.ncattrs():  # Copy global attributes
+            dst.setncattr(att, src.getncattr(att))
+
+    move(self.outfile_name + '_tmp', self.outfile_name)  # Replace original
+
+def import_file_xarray(self, filename, chunks):
+    raise ValueError('Lazy import with Xarray is not available for ragged '
+                     'array files, please use opendrift.open')
+
+def import_file(self, filename, times=None, elements=None, load_history=True):
+    """Create OpenDrift object from imported ragged array file.
+     times: indices of time steps to be imported, must be contineous range.
+     elements: indices of elements (trajectories) to be imported
+     load_history: if False, history is not imported. History is always
+        imported into memory (also if 'lazy')
+    """
+
+    logger.debug('Importing from ' + filename)
+    infile = Dataset(filename, 'r')
+    import_attributes(self, infile)
+    self.status_categories = infile.variables['status'].flag_meanings.split()
+
+    row_size = infile.variables['rowSize'][:]
+    ids = infile.variables['trajectory'][:]
+    time = infile.variables['time'][:]
+    units = infile.variables['time'].units
+    dt = self.time_step_output.total_seconds()
+    # Output steps are relative to start of simulation, which may be
+    # before first time with active elements
+    self.start_time = datetime.strptime(
+        infile.time_coverage_start[0:19], '%Y-%m-%d %H:%M:%S')
+    step = np.round((time - date2num(self.start_time, units)) /
+                    dt).astype(np.int64)
+    if hasattr(infile, 'steps_exported'):
+        num_steps = infile.steps_exported
+    else:
+        num_steps = step.max() + 1 if len(step) > 0 else 0
+    if times is None:
+        times = np.arange(num_steps)
+    times = np.atleast_1d(times)
+    self.steps_output = len(times)
+    if len(times) > 0:
+        self.start_time = self.start_time + times[0]*self.time_step_output
+    self.end_time = self.start_time + \
+        (max(self.steps_output, 1) - 1)*self.time_step_output
+    self.time = self.end_time  # Using end time as default
+
+    # Observations of requested trajectories and times
+    trajectory = np.repeat(np.arange(len(row_size)), row_size)
+    if elements is None:
+        elements = np.arange(len(row_size))
+    elements = np.atleast_1d(elements)
+    row = np.full(len(row_size), -1)
+    row[elements] = np.arange(len(elements))
+    selected = (row[trajectory] >= 0)
+    if len(times) > 0:
+        selected &= (step >= times[0]) & (step <= times[-1])
+        step = step - times[0]
+    obs = np.where(selected)[0]
+
+    history_dtype_fields = []
+    self.history_metadata = self.ElementType.variables.copy()
+    for var in infile.variables:
+        if infile.variables[var].dimensions != ('obs',) or var == 'time':
+            continue
+        history_dtype_fields.append((var, np.dtype('float32')))
+        self.history_metadata[var] = {}
+    history_dtype = np.dtype(history_dtype_fields)
+
+    if load_history is False:
+        self.history = None
+        logger.warning('Not importing history')
+    else:
+        self.history = History(history_dtype, len(elements), self.steps_output)
+        rows = row[trajectory[obs]]
+        steps = step[obs]
+        for var in history_dtype.names:
+            self.history.store(var, rows, steps, np.ma.filled(
+                infile.variables[var][:][obs], np.nan))
+        self.history.set_valid(rows, steps)
+
+        # Initialise elements from last state of each trajectory
+        active = self.history.last >= 0
+        if not np.all(active):
+            logger.warning('A subset is requested, and number of active '
+                           'elements is %d' % np.sum(active))
+        last = np.zeros(len(elements), dtype=np.int64)
+        np.maximum.at(last, rows, obs)  # obs are sorted by time
+        kwargs = {}
+        for var in history_dtype.names:
+            if var in self.ElementType.variables:
+                kwargs[var] = np.ma.filled(
+                    infile.variables[var][:][last[active]], np.nan)
+        kwargs['ID'] = ids[elements[active]]
+        self.elements = self.ElementType(**kwargs)
+        self.elements_deactivated = self.ElementType()
+        if not np.all(active):
+            self.history = self.history.subset(active)
+
+        # Remove elements which are scheduled for deactivation
+        self.remove_deactivated_elements()
+
+    infile.close()
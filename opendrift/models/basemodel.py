@@ -18,6 +18,7 @@
 import sys
 import os
 import types
+import hashlib
 import traceback
 import inspect
 import logging
@@ -50,9 +51,170 @@ except ImportError:
 import opendrift
 from opendrift.timer import Timeable
 from opendrift.errors import NotCoveredError
-from opendrift.readers.basereader import BaseReader, standard_names
+from opendrift.export.history import History
+from opendrift.readers.basereader import BaseReader, ContinuousReader, \
+    standard_names
+from opendrift.readers.basereader.coastline import CoastlineIndex, \
+    CoastDistance, OceanPoints, wrapped_polygons
 from opendrift.readers import reader_from_url, reader_global_landmask
-from opendrift.models.physics_methods import PhysicsMethods
+from opendrift.models.physics_methods import PhysicsMethods, \
+    displace_positions
+
+# Simulation inherited by forked worker processes of `run_parallel`
+_parallel_simulation = None
+
+
+def _mix64(z):
+    """SplitMix64 finalizer, mixing bits of uint64 array."""
+    with np.errstate(over='ignore'):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class _ElementRandom():
+    """
+    Random numbers drawn from one stream per element, in workers of
+    `run_parallel`.
+
+    While active, draws of one value per active element from the global
+    numpy random functions below (e.g. `np.random.normal(0, 1,
+    len(self.elements))`) are taken from counter-based streams. These are
+    keyed by the state of `seed` and the element ID, and counted by time
+    step and number of draws within the time step. Values of an element
+    are thus independent of the other elements of the chunk. Other draws
+    use the global random state.
+
+    Args:
+        simulation: simulation of a chunk, with elements numbered by ID.
+        seed: seed of `run_parallel`.
+        IDs: original ID of elements of the chunk, by ID in the chunk.
+    """
+
+    functions = ['random', 'rand', 'randn', 'standard_normal', 'uniform',
+                 'normal']
+
+    def __init__(self, simulation, seed, IDs):
+        self.simulation = simulation
+        key = np.random.SeedSequence(seed).generate_state(1, np.uint64)
+        self.keys = _mix64(key ^ _mix64(np.asarray(IDs, dtype=np.uint64)))
+        self.step = None
+        self.draws = 0
+        self.original = {}
+
+    def __enter__(self):
+        for name in self.functions:
+            self.original[name] = getattr(np.random, name)
+            setattr(np.random, name, getattr(self, name))
+        return self
+
+    def __exit__(self, *args):
+        for name, function in self.original.items():
+            setattr(np.random, name, function)
+
+    def _is_elements(self, shape):
+        """Return True if shape is one value per active element."""
+        num = len(self.simulation.elements)
+        return num > 0 and shape is not None and \
+            tuple(np.atleast_1d(shape)) == (num,)
+
+    def _uniform(self):
+        """Next value in [0, 1) of each active element."""
+        step = self.simulation.steps_calculation
+        if step != self.step:
+            self.step = step
+            self.draws = 0
+        counter = np.array([(step << 20) + self.draws], dtype=np.uint64)
+        self.draws += 1
+        z = _mix64(self.keys[np.asarray(self.simulation.elements.ID) - 1] ^
+                   _mix64(counter))
+        return (z >> np.uint64(11)) * 2.0**-53
+
+    def _normal(self):
+        """Next standard normal value of each active element."""
+        u1 = 1 - self._uniform()
+        u2 = self._uniform()
+        return np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
+
+    def random(self, size=None):
+        if self._is_elements(size):
+            return self._uniform()
+        return self.original['random'](size)
+
+    def rand(self, *dims):
+        if self._is_elements(dims):
+            return self._uniform()
+        return self.original['rand'](*dims)
+
+    def randn(self, *dims):
+        if self._is_elements(dims):
+            return self._normal()
+        return self.original['randn'](*dims)
+
+    def standard_normal(self, size=None):
+        if self._is_elements(size):
+            return self._normal()
+        return self.original['standard_normal'](size)
+
+    def uniform(self, low=0., high=1., size=None):
+        if self._is_elements(size if size is not None else
+                             np.broadcast(low, high).shape):
+            return low + (high - low) * self._uniform()
+        return self.original['uniform'](low, high, size)
+
+    def normal(self, loc=0., scale=1., size=None):
+        if self._is_elements(size if size is not None else
+                             np.broadcast(loc, scale).shape):
+            return loc + scale * self._normal()
+        return self.original['normal'](loc, scale, size)
+
+
+def _run_chunk(args):
+    """Run simulation of a chunk of scheduled elements, in a worker process."""
+    indices, seed, kwargs = args
+    o = _parallel_simulation
+    selected = np.zeros(o.num_elements_scheduled(), dtype=bool)
+    selected[indices] = True
+    IDs = o.elements_scheduled.ID[indices]
+    elements = o.ElementType()
+    o.elements_scheduled.move_elements(elements, selected)
+    elements.ID = np.arange(1, len(indices) + 1)
+    o.elements_scheduled = elements
+    o.elements_scheduled_time = o.elements_scheduled_time[indices]
+    np.random.seed(np.random.SeedSequence(seed).generate_state(1)[0])
+    # Thread and lock of background reading belong to the parent process
+    for reader in o.readers.values():
+        if hasattr(reader, '__init_prefetch__'):
+            reader.__init_prefetch__()
+
+    with _ElementRandom(o, seed, IDs):
+        o.run(**kwargs)
+
+    # History rows of elements which have been seeded
+    seeded = np.ones(len(indices), dtype=bool)
+    if o.num_elements_scheduled() > 0:
+        seeded[o.elements_scheduled.ID - 1] = False
+        o.elements_scheduled.ID = IDs[o.elements_scheduled.ID - 1]
+    for elements in (o.elements, o.elements_deactivated):
+        if len(elements) > 0:
+            elements.ID = IDs[np.atleast_1d(elements.ID) - 1]
+    if 'ID' in o.history.dtype.names:
+        o.history['ID'] = np.ma.array(
+            IDs[np.ma.filled(o.history['ID'], 1) - 1],
+            mask=np.ma.getmaskarray(o.history['ID']))
+    return {'IDs': IDs[seeded], 'history': o.history,
+            'elements': o.elements,
+            'elements_deactivated': o.elements_deactivated,
+            'elements_scheduled': o.elements_scheduled,
+            'elements_scheduled_time': o.elements_scheduled_time,
+            'status_categories': o.status_categories,
+            'minvals': o.minvals, 'maxvals': o.maxvals,
+            **{a: getattr(o, a) for a in
+               ['time', 'time_step', 'time_step_output', 'steps_output',
+                'steps_calculation', 'expected_steps_output',
+                'expected_steps_calculation', 'expected_end_time',
+                'export_variables', 'history_metadata', 'metadata_dict']}}
 
 
 class OpenDriftSimulation(PhysicsMethods, Timeable):
@@ -118,6 +280,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
     CONFIG_LEVEL_ADVANCED = 3
 
     max_speed = 1  # Assumed max average speed of any element
+    # Directory of distance to coast rasters shared between simulations,
+    # None (default) for no caching
+    coast_distance_cache_dir = None
     required_profiles_z_range = None  # [min_depth, max_depth]
     plot_comparison_colors = [
         'k', 'r', 'g', 'b', 'm', 'c', 'y', 'crimson', 'indigo', 'lightcoral',
@@ -245,6 +410,7 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
         self.io_import_file = types.MethodType(io_module.import_file, self)
         self.io_import_file_xarray = types.MethodType(
             io_module.import_file_xarray, self)
+        self.io_write_subset = types.MethodType(io_module.write_subset, self)
 
         # Set configuration options
         self._add_config({
@@ -274,6 +440,35 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 'previous means that objects will move back to the previous location '
                 'if they hit land'
             },
+            'general:coastline_crossing': {
+                'type':
+                'bool',
+                'default':
+                False,
+                'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description':
+                'If True, elements hitting land are found from crossings of '
+                'their paths with the coastline of the landmask reader '
+                '(shape or global_landmask), and are stranded at the '
+                'crossing point. The landmask is then only read for '
+                'newly seeded elements.'
+            },
+            'general:coast_distance': {
+                'type':
+                'bool',
+                'default':
+                False,
+                'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description':
+                'If True, a coarse raster of distance to the coastline of the '
+                'landmask reader (shape or global_landmask) is made for the '
+                'simulation extent, and kept on disk if the attribute '
+                'coast_distance_cache_dir is set. The landmask is '
+                'not read for elements farther from coast than max_speed '
+                'times the time step.'
+            },
             'general:time_step_minutes': {
                 'type':
                 'float',
@@ -349,6 +544,22 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 'description':
                 'Numerical advection scheme for ocean current advection'
             },
+            'drift:position_update': {
+                'type':
+                'enum',
+                'enum': ['geodesic', 'tangent_plane'],
+                'default':
+                'geodesic',
+                'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description':
+                'Method for moving elements: along geodesics on the WGS84 '
+                'ellipsoid, or in the local tangent plane, which is faster. '
+                'Displacements larger than 10 km, and positions polewards '
+                'of 80 degrees latitude, are moved along geodesics, and '
+                'other positions deviate from the geodesic by less than '
+                '0.2 m (less than 2 cm equatorwards of 60 degrees latitude).'
+            },
             'drift:current_uncertainty': {
                 'type': 'float',
                 'default': 0,
@@ -721,7 +932,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
     def store_present_positions(self, IDs=None, lons=None, lats=None):
         """Store present element positions, in case they shall be moved back"""
-        if self.get_config('general:coastline_action') == 'previous' or (
+        if self.get_config('general:coastline_action') == 'previous' or \
+                getattr(self, 'coastline', None) is not None or (
                 'general:seafloor_action' in self._config
                 and self.get_config('general:seafloor_action') == 'previous'):
             if not hasattr(self, 'previous_lon'):
@@ -786,12 +998,18 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                      self.elements.lon,
                                      self.elements.lat,
                                      self.elements.z,
-                                     None)
+                                     None,
+                                     self.coastline_known_values())
             self.environment.land_binary_mask = en.land_binary_mask
 
         if i == 'stranding':  # Deactivate elements on land
-            self.deactivate_elements(self.environment.land_binary_mask == 1,
-                                     reason='stranded')
+            stranded = self.environment.land_binary_mask == 1
+            if getattr(self, 'coastline_crossing', None) is not None:
+                # Strand at the crossing point of the coastline
+                crossed = stranded & ~np.isnan(self.coastline_crossing[0])
+                self.elements.lon[crossed] = self.coastline_crossing[0][crossed]
+                self.elements.lat[crossed] = self.coastline_crossing[1][crossed]
+            self.deactivate_elements(stranded, reason='stranded')
         elif i == 'previous':  # Go back to previous position (in water)
             if self.newly_seeded_IDs is not None:
                 self.deactivate_elements(
@@ -812,6 +1030,153 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     np.copy(self.previous_lat[on_land_ID - 1])
                 self.environment.land_binary_mask[on_land] = 0
 
+    def prepare_coastline(self):
+        """Prepare coastline index and distance to coast of landmask reader."""
+        self.coastline = None
+        self.coastline_crossing = None
+        self.coast_distance = None
+        crossing = self.get_config('general:coastline_crossing')
+        distance = self.get_config('general:coast_distance')
+        if (crossing is False and distance is False) or \
+                self.get_config('general:coastline_action') == 'none' or \
+                'land_binary_mask' not in self.priority_list:
+            return
+        reader = self.readers[self.priority_list['land_binary_mask'][0]]
+        if not hasattr(reader, 'coastline_polygons'):
+            logger.warning('Landmask reader %s does not provide coastline '
+                           'polygons, coastline crossings and distance to '
+                           'coast are not used' % reader.name)
+            return
+        self.coastline_reader = reader
+        lonmin, latmin, lonmax, latmax = self.simulation_extent
+        self.coastline_lon_center = None
+        if reader.proj.crs.is_geographic and lonmax - lonmin < 360:
+            # Longitudes are continuous across the extent, also if
+            # crossing the dateline of the reader
+            self.coastline_lon_center = reader.modulate_longitude(
+                np.atleast_1d((lonmin + lonmax) / 2.))[0]
+        lon, lat = np.meshgrid(np.linspace(lonmin, lonmax, 50),
+                               np.linspace(latmin, latmax, 50))
+        x, y = self.coastline_xy(reader, lon.ravel(), lat.ravel())
+        extent = (x.min(), y.min(), x.max(), y.max())
+
+        if distance is True and self.coast_distance_cache_dir is not None:
+            os.makedirs(self.coast_distance_cache_dir, exist_ok=True)
+            filename = os.path.join(
+                self.coast_distance_cache_dir, hashlib.sha1(repr(
+                    (reader.coastline_source,
+                     np.round(extent, 6).tolist())).encode()).hexdigest()
+                + '.npz')
+            if os.path.exists(filename):
+                logger.debug('Loading distance to coast from ' + filename)
+                self.coast_distance = CoastDistance.load(filename)
+
+        if crossing is True or self.coast_distance is None:
+            self.timer_start('preparing main loop:making coastline index')
+            if self.coastline_lon_center is not None:
+                polygons = wrapped_polygons(reader.coastline_polygons, extent)
+            else:
+                polygons = reader.coastline_polygons(extent)
+            index = CoastlineIndex(polygons, extent)
+            self.timer_end('preparing main loop:making coastline index')
+            if crossing is True:
+                self.coastline = index
+
+        if distance is True and self.coast_distance is None:
+            self.timer_start('preparing main loop:making distance to coast')
+            self.coast_distance = CoastDistance.from_coastline(
+                index, lambda x, y: reader.get_variables(
+                    ['land_binary_mask'], self.start_time,
+                    reader.modulate_longitude(x)
+                    if self.coastline_lon_center is not None else x, y,
+                    None)['land_binary_mask'],
+                reader.proj.crs.is_geographic)
+            if self.coast_distance_cache_dir is not None:
+                self.coast_distance.save(filename)
+            self.timer_end('preparing main loop:making distance to coast')
+
+    def coastline_xy(self, reader, lon, lat):
+        """Coordinates of positions in landmask reader projection.
+
+        Geographic longitudes are within +- 180 of the center of the
+        simulation extent, so that they are continuous across it."""
+        x, y = reader.lonlat2xy(lon, lat)
+        x = np.asarray(x, dtype=np.float64)
+        if getattr(self, 'coastline_lon_center', None) is not None:
+            center = self.coastline_lon_center
+            x = center + np.mod(x - center + 180, 360) - 180
+        elif reader.proj.crs.is_geographic:
+            x = reader.modulate_longitude(x)
+        return x, np.asarray(y, dtype=np.float64)
+
+    def coastline_known_values(self):
+        """Land mask of active elements, without reading the landmask.
+
+        Elements farther from the coast than they may move within a time
+        step (max_speed) are on land if their raster cell of the distance
+        to coast is land. Elements which were in water at their previous
+        position are on land if their path since then has crossed the
+        coastline an odd number of times. The first crossing point is
+        stored in coastline_crossing (lon and lat, NaN if not crossing).
+
+        Returns:
+            dictionary with land_binary_mask for use in get_environment,
+            NaN for elements to be checked by the landmask reader (e.g.
+            newly seeded near coast), or None if neither coastline
+            crossings nor distance to coast are used.
+        """
+        self.coastline_crossing = None
+        if getattr(self, 'coastline', None) is None and \
+                getattr(self, 'coast_distance', None) is None:
+            return None
+        self.timer_start('main loop:coastline crossings')
+        reader = self.coastline_reader
+        ID = self.elements.ID
+        x1, y1 = self.coastline_xy(reader, self.elements.lon,
+                                   self.elements.lat)
+        land = np.full(len(ID), np.nan)
+        unknown = np.ones(len(ID), dtype=bool)
+        if self.coast_distance is not None:
+            distance, cell_land = self.coast_distance.lookup(x1, y1)
+            far = distance > \
+                self.max_speed * np.abs(self.time_step.total_seconds())
+            land[far] = cell_land[far]
+            unknown = ~far
+            logger.debug('%i of %i elements far from coast' %
+                         (far.sum(), len(ID)))
+        if self.coastline is not None:
+            crossing_lon = np.full(len(ID), np.nan)
+            crossing_lat = np.full(len(ID), np.nan)
+            self.coastline_crossing = (crossing_lon, crossing_lat)
+            x0, y0 = self.coastline_xy(
+                reader, np.ma.filled(self.previous_lon[ID - 1], np.nan),
+                np.ma.filled(self.previous_lat[ID - 1], np.nan))
+            nocrossing = np.isnan(x0) | np.isnan(y0)
+            # Crossings are unknown for paths leaving extent of index
+            nocrossing |= ~(self.coastline.contains(x0, y0) &
+                            self.coastline.contains(x1, y1))
+            if reader.proj.crs.is_geographic:  # Crossing the dateline
+                nocrossing |= np.abs(x1 - x0) > 180
+            if getattr(self, 'newly_seeded_IDs', None) is not None:
+                nocrossing |= np.isin(ID, self.newly_seeded_IDs)
+            known = np.flatnonzero(unknown & ~nocrossing)
+            count, t = self.coastline.crossings(x0[known], y0[known],
+                                                x1[known], y1[known])
+            land[known] = count % 2
+            unknown[known] = False
+            crossed = known[~np.isnan(t)]
+            if len(crossed) > 0:
+                t = t[~np.isnan(t)]
+                crossing_lon[crossed], crossing_lat[crossed] = \
+                    reader.xy2lonlat(x0[crossed] + t * (x1 - x0)[crossed],
+                                     y0[crossed] + t * (y1 - y0)[crossed])
+            logger.debug('%i of %i elements crossing coastline' %
+                         (len(crossed), len(ID)))
+        logger.debug('%i elements to be checked with landmask' %
+                     unknown.sum())
+        self.timer_end('main loop:coastline crossings')
+        return {'land_binary_mask': land}
+
     def interact_with_seafloor(self):
         """Seafloor interaction according to configuration setting"""
         if self.num_elements_active() == 0:
@@ -1143,9 +1508,14 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
             if len(self.priority_list[var]) == 0:
                 del self.priority_list[var]
 
-    def get_environment(self, variables, time, lon, lat, z, profiles):
+    def get_environment(self, variables, time, lon, lat, z, profiles,
+                        known_values=None):
         '''Retrieve environmental variables at requested positions.
 
+        known_values may be a dictionary of variables with values already
+        known for some of the positions (NaN where unknown). Readers of
+        such variables are only called for the remaining positions.
+
         Updates:
             Buffer (raw data blocks) for each reader stored for performance:
                 [readers].var_block_before (last before requested time)
@@ -1223,6 +1593,17 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
             logger.debug('----------------------------------------')
             reader_group = reader_groups[i]
             missing_indices = np.array(range(len(lon)))
+            if known_values is not None and \
+                    all(var in known_values for var in variable_group):
+                unknown = np.zeros(len(lon), dtype=bool)
+                for var in variable_group:
+                    env[var] = np.ma.masked_invalid(
+                        known_values[var]).astype('float32')
+                    unknown |= np.isnan(known_values[var])
+                missing_indices = missing_indices[unknown]
+                if len(missing_indices) == 0:
+                    logger.debug('Values are known for all elements')
+                    continue
             # For each reader:
             for reader_name in reader_group:
                 logger.debug('Calling reader ' + reader_name)
@@ -1242,7 +1623,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                 'Missing variables: calling get_environment recursively'
                             )
                             return self.get_environment(
-                                variables, time, lon, lat, z, profiles)
+                                variables, time, lon, lat, z, profiles,
+                                known_values)
                     continue
                 # Fetch given variables at given positions from current reader
                 try:
@@ -1273,7 +1655,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                 'Missing variables: calling get_environment recursively'
                             )
                             return self.get_environment(
-                                variables, time, lon, lat, z, profiles)
+                                variables, time, lon, lat, z, profiles,
+                                known_values)
                     continue
 
                 except Exception as e:  # Unknown error
@@ -1293,7 +1676,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                 'Missing variables: calling get_environment recursively'
                             )
                             return self.get_environment(
-                                variables, time, lon, lat, z, profiles)
+                                variables, time, lon, lat, z, profiles,
+                                known_values)
                     continue
 
                 # Copy retrieved variables to env array, and mask nan-values
@@ -1381,7 +1765,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                 'Missing variables: calling get_environment recursively'
                             )
                             return self.get_environment(
-                                variables, time, lon, lat, z, profiles)
+                                variables, time, lon, lat, z, profiles,
+                                known_values)
 
         logger.debug('---------------------------------------')
         logger.debug('Finished processing all variable groups')
@@ -1665,75 +2050,69 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
         logger.debug('Released %i new elements.' % np.sum(indices))
 
     def closest_ocean_points(self, lon, lat):
-        """Return the closest ocean points for given lon, lat"""
-
-        deltalon = 0.01  # grid
-        deltalat = 0.01
-        numbuffer = 10
-        lonmin = lon.min() - deltalon * numbuffer
-        lonmax = lon.max() + deltalon * numbuffer
-        latmin = lat.min() - deltalat * numbuffer
-        latmax = lat.max() + deltalat * numbuffer
+        """Return the closest ocean points for given lon, lat
+
+        Points are moved only if ocean is found within 0.1 degrees. Ocean
+        points are cached per tile for each landmask reader, see
+        OceanPoints, so that repeated seeding in the same area is fast."""
+
         if not 'land_binary_mask' in self.priority_list:
             logger.info('No land reader added, '
-                        'making a temporary landmask reader')
-            from opendrift.models.oceandrift import OceanDrift
-            reader_landmask = reader_global_landmask.Reader()
-            seed_state = np.random.get_state()  # Do not alter current random number generator
-            o = OceanDrift(loglevel='custom')
-            np.random.set_state(seed_state)
-            if hasattr(self, 'simulation_extent'):
-                o.simulation_extent = self.simulation_extent
-            o.add_reader(reader_landmask)
-            land_reader = reader_landmask
+                        'using the global landmask reader')
+            land_reader = reader_global_landmask.Reader()
+            o = None  # Temporary simulation is made when needed
         else:
             logger.info('Using existing reader for land_binary_mask')
             land_reader_name = self.priority_list['land_binary_mask'][0]
             land_reader = self.readers[land_reader_name]
             o = self
 
-        land = o.get_environment(['land_binary_mask'],
-                                 lon=lon,
-                                 lat=lat,
-                                 z=0 * lon,
-                                 time=land_reader.start_time,
-                                 profiles=None)[0]['land_binary_mask']
+        def landmask(lon, lat):
+            nonlocal o
+            land = np.ones(len(lon))  # Points not covered are not ocean
+            covered = land_reader.covers_positions(lon, lat)[0]
+            if len(covered) == 0:
+                return land
+            lon = lon[covered]
+            lat = lat[covered]
+            if isinstance(land_reader, ContinuousReader):  # Direct query
+                x, y = land_reader.lonlat2xy(lon, lat)
+                land[covered] = land_reader.get_variables(
+                    ['land_binary_mask'], land_reader.start_time, x, y,
+                    None)['land_binary_mask']
+                return land
+            if o is None:
+                from opendrift.models.oceandrift import OceanDrift
+                seed_state = np.random.get_state()  # Do not alter current random number generator
+                o = OceanDrift(loglevel='custom')
+                np.random.set_state(seed_state)
+                if hasattr(self, 'simulation_extent'):
+                    o.simulation_extent = self.simulation_extent
+                o.add_reader(land_reader)
+            land[covered] = np.ma.filled(o.get_environment(
+                ['land_binary_mask'], lon=lon, lat=lat, z=0 * lon,
+                time=land_reader.start_time,
+                profiles=None)[0]['land_binary_mask'], 1)
+            return land
+
+        land = landmask(lon, lat)
         if land.max() == 0:
             logger.info('All points are in ocean')
             return lon, lat
         logger.info('Moving %i out of %i points from land to water' %
                     (np.sum(land != 0), len(lon)))
-        landlons = lon[land != 0]
-        landlats = lat[land != 0]
-        longrid = np.arange(lonmin, lonmax, deltalon)
-        latgrid = np.arange(latmin, latmax, deltalat)
-        longrid, latgrid = np.meshgrid(longrid, latgrid)
-        longrid = longrid.ravel()
-        latgrid = latgrid.ravel()
-        # Remove grid-points not covered by this reader
-        latgrid_covered = land_reader.covers_positions(longrid, latgrid)[0]
-        longrid = longrid[latgrid_covered]
-        latgrid = latgrid[latgrid_covered]
-        landgrid = o.get_environment(['land_binary_mask'],
-                                     lon=longrid,
-                                     lat=latgrid,
-                                     z=0 * longrid,
-                                     time=land_reader.start_time,
-                                     profiles=None)[0]['land_binary_mask']
-        if landgrid.min() == 1 or np.isnan(landgrid.min()):
+        if getattr(land_reader, 'ocean_points', None) is None:
+            land_reader.ocean_points = OceanPoints()
+        oceanlons, oceanlats = land_reader.ocean_points.closest(
+            lon[land != 0], lat[land != 0], landmask)
+        logger.debug('Ocean points cached for %i tiles' %
+                     len(land_reader.ocean_points))
+        if np.isnan(oceanlons).all():
             logger.warning('No ocean pixels nearby, cannot move elements.')
             return lon, lat
-
-        oceangridlons = longrid[landgrid == 0]
-        oceangridlats = latgrid[landgrid == 0]
-        from scipy import spatial
-        tree = scipy.spatial.cKDTree(
-            np.dstack([oceangridlons, oceangridlats])[0])
-        landpoints = np.dstack([landlons, landlats])
-        dist, indices = tree.query(landpoints)
-        indices = indices.ravel()
-        lon[land != 0] = oceangridlons[indices]
-        lat[land != 0] = oceangridlats[indices]
+        moved = np.flatnonzero(land != 0)[~np.isnan(oceanlons)]
+        lon[moved] = oceanlons[~np.isnan(oceanlons)]
+        lat[moved] = oceanlats[~np.isnan(oceanlats)]
 
         return lon, lat
 
@@ -2110,6 +2489,118 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
         self.seed_elements(lon=lon, lat=lat, time=time, **kwargs)
 
+    def seed_release_groups(self, groups, duration=None, **kwargs):
+        """Seed several independent releases, to be simulated in one run.
+
+        All groups share readers, landmask and environment interpolation,
+        which is much faster than running one simulation per release.
+        Each group gets its own origin_marker, and output may be split
+        per group with :meth:`export_release_groups`.
+
+        Arguments:
+            groups: list of dictionaries with keyword arguments to
+                :meth:`seed_elements` (lon, lat, time, number, ...),
+                overriding `kwargs` common to all groups. Optional keys:
+                'name' (origin_marker_name) and 'metadata' (dictionary
+                written as attributes to exported file of the group).
+            duration: timedelta, optional. If given, elements of these
+                groups are retired (deactivated) when reaching this age, so
+                that each group is simulated for the same duration from its
+                own release time. Other elements, and the config setting
+                `drift:max_age_seconds`, are not affected. The run must then
+                last until the end_time of the last group, available in
+                `release_groups`.
+            kwargs: keyword arguments to :meth:`seed_elements` common to all
+                groups.
+
+        Example:
+            >>> o.seed_release_groups([{'lon': 4, 'lat': 60, 'time': t1,
+            ...                         'metadata': {'station': 1}}, ...],
+            ...                        duration=timedelta(days=300),
+            ...                        number=1000, z=-93)
+            >>> o.run(end_time=max(g['end_time'] for g in
+            ...                    o.release_groups.values()))
+            >>> o.export_release_groups('larvae_{station}_{origin_marker}.nc')
+        """
+
+        if not hasattr(self, 'release_groups'):
+            self.release_groups = OrderedDict()
+
+        for group in groups:
+            seed_kwargs = kwargs.copy()
+            seed_kwargs.update(group)
+            metadata = seed_kwargs.pop('metadata', {})
+            if self.origin_marker is None:
+                self.origin_marker = {}
+            origin_marker = len(self.origin_marker)
+            name = seed_kwargs.pop('name', 'Group %d' % origin_marker)
+            self.seed_elements(origin_marker=origin_marker,
+                               origin_marker_name=name, **seed_kwargs)
+            time = np.atleast_1d(seed_kwargs['time'])
+            self.release_groups[origin_marker] = {
+                'name': name,
+                'metadata': metadata,
+                'start_time': np.min(time),
+                'duration': duration,
+                'end_time': np.max(time) + duration
+                            if duration is not None else None}
+
+        # Duration (seconds) of groups, indexed by origin_marker, and
+        # infinite for other elements (last item)
+        durations = np.full(max(self.release_groups) + 2, np.inf)
+        for origin_marker, group in self.release_groups.items():
+            if group['duration'] is not None:
+                durations[origin_marker] = group['duration'].total_seconds()
+        self.release_group_durations = durations \
+            if np.isfinite(durations).any() else None
+
+        logger.info('Seeded %i release groups' % len(groups))
+
+    def export_release_groups(self, filename):
+        """Write output of each release group to a separate netCDF file.
+
+        The output of each group is trimmed to the group elements, and to
+        the time steps where any of them are active.
+
+        Arguments:
+            filename: string which is formatted with keys `origin_marker`,
+                `name` and the metadata of each group, e.g.
+                'output_{name}_{origin_marker}.nc'
+
+        Returns:
+            list of written filenames
+        """
+
+        if not hasattr(self, 'release_groups'):
+            raise ValueError('No release groups, use seed_release_groups')
+        if getattr(self, 'history', None) is None:
+            raise ValueError('History is not available in memory')
+
+        filenames = [filename.format(origin_marker=om, name=g['name'],
+                                     **g['metadata'])
+                     for om, g in self.release_groups.items()]
+        if len(set(filenames)) < len(filenames):
+            raise ValueError('Filename %s is not unique for each release '
+                             'group, include e.g. {origin_marker}' % filename)
+
+        origin_marker = np.ma.max(self.history['origin_marker'], axis=1)
+        active = ~np.ma.getmaskarray(self.history['status'])
+        for (om, group), groupfile in zip(self.release_groups.items(),
+                                          filenames):
+            elements = np.where(origin_marker == om)[0]
+            if len(elements) == 0:
+                logger.warning('No elements of release group %s were '
+                               'seeded, not writing %s' % (om, groupfile))
+                continue
+            steps = np.where(active[elements, :].any(axis=0))[0]
+            times = np.arange(steps.min(), steps.max() + 1)
+            attributes = {'origin_marker': om,
+                          'origin_marker_name': group['name']}
+            attributes.update(group['metadata'])
+            self.io_write_subset(groupfile, elements, times, attributes)
+
+        return filenames
+
     def seed_within_polygon(self, lons, lats, number=None, **kwargs):
         """Seed a number of elements within given polygon.
 
@@ -2444,28 +2935,26 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
         # All particles scheduled for deletion
         indices = (self.elements.status != 0)
-        #try:
-        #    len(indices)
-        #except:
-        if len(indices) == 0 or np.sum(indices) == 0:
+        num_removed = np.count_nonzero(indices)
+        if num_removed == 0:
             logger.debug('No elements to deactivate')
             return  # No elements scheduled for deactivation
-        # Basic, but some more housekeeping will be required later
+        # Elements are compacted in place, and the environment of the
+        # remaining elements is selected with the same mask
+        keep = ~indices
         self.elements.move_elements(self.elements_deactivated, indices)
-        logger.debug('Removed %i elements.' % (np.sum(indices)))
+        logger.debug('Removed %i elements.' % num_removed)
         if hasattr(self, 'environment'):
-            self.environment = self.environment[~indices]
-            logger.debug('Removed %i values from environment.' %
-                         (np.sum(indices)))
+            self.environment = self.environment[keep]
+            logger.debug('Removed %i values from environment.' % num_removed)
         if hasattr(self, 'environment_profiles') and \
                 self.environment_profiles is not None:
             for varname, profiles in self.environment_profiles.items():
                 logger.debug('remove items from profile for ' + varname)
                 if varname != 'z':
-                    self.environment_profiles[varname] = \
-                        profiles[:, ~indices]
+                    self.environment_profiles[varname] = profiles[:, keep]
             logger.debug('Removed %i values from environment_profiles.' %
-                         (np.sum(indices)))
+                         num_removed)
             #if self.num_elements_active() == 0:
             #    raise ValueError('No more active elements.')  # End simulation
 
@@ -2490,7 +2979,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
             outfile=None,
             export_variables=None,
             export_buffer_length=100,
-            stop_on_error=False):
+            stop_on_error=False,
+            load_history=True,
+            export_dtypes=None):
         """Start a trajectory simulation, after initial configuration.
 
         Performs the main loop:
@@ -2524,6 +3015,16 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                 - end_time: datetime object defining the end of the simulation
             export_variables: list of variables and parameter names to be
                 saved to file. Default is None (all variables are saved)
+            export_dtypes: dictionary with reduced precision for storage
+                of variables, as numpy float dtype (e.g. 'float16'), or
+                tuple (integer dtype, scale_factor, add_offset) for packed
+                integers. Default is None (dtype of element and environment
+                variables is kept)
+            load_history: if output is written to file during the run
+                (export_buffer_length), history is finally imported
+                from file into memory. If 'lazy', history properties are
+                instead read from file when needed, e.g. for plotting,
+                and if False, history is not imported.
         """
 
         # Exporting software and hardware specification, for possible debugging
@@ -2746,6 +3247,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
             self.timer_end('preparing main loop:making dynamical landmask')
 
+        self.prepare_coastline()
+
         ####################################################################
         # Preparing history array for storage in memory and eventually file
         ####################################################################
@@ -2793,10 +3296,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     del self.history_metadata[m]
 
         history_dtype = np.dtype(history_dtype_fields)
-        self.history = np.ma.array(np.zeros(
-            (len(self.elements_scheduled), self.export_buffer_length)),
-                                   dtype=history_dtype)
-        self.history.mask = True
+        self.history = History(history_dtype, len(self.elements_scheduled),
+                               self.export_buffer_length,
+                               packing=export_dtypes)
         self.steps_exported = 0
 
         if outfile is not None:
@@ -2880,7 +3382,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                          self.elements.lon,
                                          self.elements.lat,
                                          self.elements.z,
-                                         self.required_profiles)
+                                         self.required_profiles,
+                                         self.coastline_known_values())
 
                 self.store_previous_variables()
 
@@ -2922,6 +3425,9 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
                 self.horizontal_diffusion()
 
+                # Move elements with velocities accumulated during update
+                self.move_accumulated_velocity()
+
                 if self.num_elements_active(
                 ) == 0 and self.num_elements_scheduled() == 0:
                     raise ValueError(
@@ -2935,6 +3441,7 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     self.time = self.time + self.time_step
 
             except Exception as e:
+                self.accumulated_velocity = None
                 message = ('The simulation stopped before requested '
                            'end time was reached.')
                 logger.warning(message)
@@ -3001,17 +3508,140 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                     self.num_elements_scheduled())
                 mask = np.ones(self.history.shape[0], dtype=bool)
                 mask[self.elements_scheduled.ID - 1] = False
-                self.history = self.history[mask, :]
+            else:
+                mask = None
 
             # Remove rows for unreached timsteps in history array
-            self.history = self.history[:, range(self.steps_output)]
+            self.history = self.history.subset(mask, self.steps_output)
         else:  # If output has been flushed to file during run, we
             # need to reimport from file to get all data in memory
             del self.environment
             if hasattr(self, 'environment_profiles'):
                 del self.environment_profiles
-            self.io_import_file(outfile)
+            self.io_import_file(outfile, load_history=load_history)
+
+        self.timer_end('cleaning up')
+        self.timer_end('total time')
+
+    def run_parallel(self, processes=None, chunk_size=None, seed=0,
+                     outfile=None, **kwargs):
+        """Start a simulation with elements divided among parallel processes.
+
+        Scheduled elements are divided into chunks of `chunk_size`
+        consecutive elements, and each chunk is simulated in a worker
+        process, using up to `processes` (default: number of CPUs) processes
+        at the time. As elements do not interact, each worker performs the
+        whole main loop (`get_environment` and `update`) for its elements.
+        Readers are opened once, before forking, and each worker process
+        keeps its own reader blocks. Random numbers drawn for all active
+        elements at once are taken from one stream per element, derived
+        from `seed` and element ID, so that results are reproducible for
+        given `seed`, independent of `chunk_size` and `processes`. Other
+        random numbers (e.g. for a subset of elements) are drawn from a
+        stream seeded by `seed`. The history of all chunks is merged in
+        memory, and written to `outfile` if given.
+
+        Requires the 'fork' start method of multiprocessing (i.e. not on
+        Windows), and forward simulations. Other arguments are passed to
+        `run`.
+        """
+        import multiprocessing
+        global _parallel_simulation
+
+        if self.num_elements_scheduled() == 0:
+            raise ValueError('Please seed elements before starting a run.')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError('Parallel run requires the fork start method')
+        time_step = kwargs.get('time_step')
+        if time_step is not None and np.sign(
+                time_step.total_seconds() if isinstance(time_step, timedelta)
+                else time_step) < 0:
+            raise ValueError('Parallel run is only available forwards in time')
+        kwargs.pop('export_buffer_length', None)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        num_elements = self.num_elements_scheduled()
+        if chunk_size is None:
+            chunk_size = int(np.ceil(num_elements / processes))
+        chunks = [np.arange(i, min(i + chunk_size, num_elements))
+                  for i in range(0, num_elements, chunk_size)]
+        logger.info('Running %i elements in %i chunks with %i processes' %
+                    (num_elements, len(chunks), processes))
 
+        self.timer_end('configuration')
+        self.timer_start('main loop')
+        _parallel_simulation = self
+        try:
+            # New worker for each chunk, to start from state before run
+            with multiprocessing.get_context('fork').Pool(
+                    processes, maxtasksperchild=1) as pool:
+                results = pool.map(
+                    _run_chunk,
+                    [(c, seed, dict(kwargs, export_buffer_length=None))
+                     for c in chunks], chunksize=1)
+        finally:
+            _parallel_simulation = None
+        self.timer_end('main loop')
+        self.timer_start('cleaning up')
+
+        # Merging status categories, which may differ between chunks
+        self.status_categories = ['active']
+        for r in results:
+            for category in r['status_categories']:
+                if category not in self.status_categories:
+                    self.status_categories.append(category)
+
+        # Merging history, ordered by element ID
+        last = max(results, key=lambda r: r['steps_output'])
+        for attr in ['time', 'time_step', 'time_step_output', 'steps_output',
+                     'steps_calculation', 'expected_steps_output',
+                     'expected_steps_calculation', 'expected_end_time',
+                     'export_variables', 'history_metadata',
+                     'metadata_dict']:
+            setattr(self, attr, last[attr])
+        IDs = np.concatenate([r['IDs'] for r in results])
+        row = np.empty(IDs.max() + 1, dtype=int)
+        row[np.sort(IDs)] = np.arange(len(IDs))
+        self.history = History(last['history'].dtype, len(IDs),
+                               self.steps_output,
+                               packing=last['history'].packing)
+        self.minvals = {}
+        self.maxvals = {}
+        self.elements = self.ElementType()
+        self.elements_deactivated = self.ElementType()
+        self.elements_scheduled = self.ElementType()
+        self.elements_scheduled_time = np.array([])
+        for r in results:
+            status = np.array([self.status_categories.index(c)
+                               for c in r['status_categories']])
+            history = r['history']
+            rows = row[r['IDs']]
+            self.history.assign(rows, history)
+            self.history.store('status', rows[:, np.newaxis],
+                               np.arange(history.shape[1]),
+                               status[history.columns['status']])
+            for name, elements in [
+                    ('elements', self.elements),
+                    ('elements_deactivated', self.elements_deactivated),
+                    ('elements_scheduled', self.elements_scheduled)]:
+                if len(r[name]) > 0:
+                    if name != 'elements_scheduled':
+                        r[name].status = status[
+                            np.atleast_1d(r[name].status).astype(int)]
+                    elements.extend(r[name])
+            self.elements_scheduled_time = np.append(
+                self.elements_scheduled_time, r['elements_scheduled_time'])
+            for var in r['minvals']:
+                self.minvals[var] = np.minimum(
+                    self.minvals.get(var, r['minvals'][var]),
+                    r['minvals'][var])
+                self.maxvals[var] = np.maximum(
+                    self.maxvals.get(var, r['maxvals'][var]),
+                    r['maxvals'][var])
+
+        if outfile is not None:
+            self.io_write_subset(outfile, np.arange(self.history.shape[0]),
+                                 np.arange(self.history.shape[1]))
         self.timer_end('cleaning up')
         self.timer_end('total time')
 
@@ -3026,6 +3656,18 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
                                      self.get_config('drift:max_age_seconds'),
                                      reason='retired')
 
+        # Deactivate elements of release groups exceeding group duration
+        durations = getattr(self, 'release_group_durations', None)
+        if durations is not None:
+            origin_marker = np.asarray(self.elements.origin_marker,
+                                       dtype=np.int64)
+            index = np.where((origin_marker >= 0) &
+                             (origin_marker < len(durations) - 1),
+                             origin_marker, -1)
+            self.deactivate_elements(
+                self.elements.age_seconds >= durations[index],
+                reason='retired')
+
         # Deacticate any elements outside validity domain set by user
         if self.validity_domain is not None:
             W, E, S, N = self.validity_domain
@@ -3074,43 +3716,27 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
             element_ind = deactivated
             time_ind = np.minimum(time_ind + 1, self.history.shape[1] - 1)
 
-        # TODO: storing of variables and environment below should be collected in a single loop
-        # Store present state in history recarray
-        for i, var in enumerate(self.elements.variables):
-            if self.export_variables is not None and \
-                    var not in self.export_variables:
+        # Store present state (elements and environment) in history
+        variables = [(var, self.elements) for var in self.elements.variables]
+        if hasattr(self, 'environment'):  # Not before first active elements
+            variables += [(var, self.environment)
+                          for var in self.environment.dtype.names]
+        for var, source in variables:
+            if var not in self.history.dtype.names:
                 continue
-            # Temporarily assuming elements numbered
-            # from 0 to num_elements_active()
-            # Does not hold when importing ID from a saved file, where
-            # some elements have been deactivated
-            self.history[var][ID_ind, time_ind] = \
-                getattr(self.elements, var)[element_ind]
+            values = np.asarray(getattr(source, var)[element_ind],
+                                dtype=self.history.dtype[var])
+            self.history.store(var, ID_ind, time_ind, values)
             if len(ID_ind) > 0:
-                newmin = np.min(self.history[var][ID_ind, time_ind])
-                newmax = np.max(self.history[var][ID_ind, time_ind])
-                if var not in self.minvals:
-                    self.minvals[var] = newmin
-                    self.maxvals[var] = newmax
-                else:
-                    self.minvals[var] = np.minimum(self.minvals[var], newmin)
-                    self.maxvals[var] = np.maximum(self.maxvals[var], newmax)
-        # Copy environment data to history array
-        for i, var in enumerate(self.environment.dtype.names):
-            if self.export_variables is not None and \
-                    var not in self.export_variables:
-                continue
-            self.history[var][ID_ind, time_ind] = \
-                getattr(self.environment, var)[element_ind]
-            if len(ID_ind) > 0:
-                newmin = np.min(self.history[var][ID_ind, time_ind])
-                newmax = np.max(self.history[var][ID_ind, time_ind])
+                newmin = np.min(values)
+                newmax = np.max(values)
                 if var not in self.minvals:
                     self.minvals[var] = newmin
                     self.maxvals[var] = newmax
                 else:
                     self.minvals[var] = np.minimum(self.minvals[var], newmin)
                     self.maxvals[var] = np.maximum(self.maxvals[var], newmax)
+        self.history.set_valid(ID_ind, time_ind)
 
         # Call writer if buffer is full
         if (self.outfile is not None) and \
@@ -5198,18 +5824,31 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
         Arguments:
             x_vel and v_vel: floats, velocities in m/s of particle along
                              x- and y-axes of the inherit SRS (proj4).
+                             May also be lists of several velocity
+                             contributions, which are summed and applied
+                             as a single displacement.
         """
 
-        geod = pyproj.Geod(ellps='WGS84')
+        if isinstance(x_vel, (list, tuple)):
+            x_vel = np.sum(np.broadcast_arrays(*x_vel), axis=0)
+        if isinstance(y_vel, (list, tuple)):
+            y_vel = np.sum(np.broadcast_arrays(*y_vel), axis=0)
+
+        if self.accumulate_velocity(x_vel, y_vel):
+            return  # Elements are moved at end of time step
+
+        # Do not move frozen elements
+        seconds = self.time_step.total_seconds() * self.elements.moving
+
+        self.displace_elements(x_vel * seconds, y_vel * seconds)
 
-        azimuth = np.degrees(np.arctan2(x_vel, y_vel))  # Direction of motion
-        velocity = np.sqrt(x_vel**2 + y_vel**2)  # Velocity in m/s
-        velocity = velocity * self.elements.moving  # Do not move frosen elements
+    def displace_elements(self, x_dist, y_dist):
+        """Move elements given distances (m) east- and northwards."""
 
         # Calculate new positions
-        self.elements.lon, self.elements.lat, back_az = geod.fwd(
-            self.elements.lon, self.elements.lat, azimuth,
-            velocity * self.time_step.total_seconds())
+        self.elements.lon, self.elements.lat = displace_positions(
+            self.elements.lon, self.elements.lat, x_dist, y_dist,
+            method=self.get_config('drift:position_update'))
 
         # Check that new positions are valid
         if (self.elements.lon.min() < -180) or (
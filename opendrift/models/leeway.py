@@ -292,6 +292,9 @@ class Leeway(OpenDriftSimulation):
     def update(self):
         """Update positions and properties of leeway particles."""
 
+        # Drift terms are summed, and elements moved at end of time step
+        self.start_velocity_accumulation()
+
         windspeed = np.sqrt(self.environment.x_wind**2 +
                             self.environment.y_wind**2)
         # CCC update wind direction
@@ -21,7 +21,9 @@ from scipy.interpolate import interp1d
 import logging; logger = logging.getLogger(__name__)
 from opendrift.models.basemodel import OpenDriftSimulation
 from opendrift.elements import LagrangianArray
-from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, gls_tke, skillscore_liu_weissberg
+from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, gls_tke, skillscore_liu_weissberg, \
+    vertical_random_walk, vertical_random_walk_adaptive, \
+    vertical_random_walk_timesteps
 
 # Defining the oil element properties
 class Lagrangian3DArray(LagrangianArray):
@@ -133,6 +135,12 @@ class OceanDrift(OpenDriftSimulation):
             'vertical_mixing:TSprofiles': {'type': 'bool', 'default': False, 'level':
                 self.CONFIG_LEVEL_ADVANCED,
                 'description': 'Update T and S profiles within inner loop of vertical mixing. This takes more time, but may be slightly more accurate.'},
+            'vertical_mixing:compiled_kernel': {'type': 'bool', 'default': False, 'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description': 'Run inner loop of vertical mixing as one kernel call for all elements (compiled if numba is installed). Terminal velocity is then updated once per time step. Not used with TSprofiles, or for models with own surface or seafloor interaction within the inner loop.'},
+            'vertical_mixing:adaptive_timestep': {'type': 'bool', 'default': False, 'level':
+                self.CONFIG_LEVEL_ADVANCED,
+                'description': 'With compiled_kernel, each element is mixed with the longest time step (up to the model time step) allowed by the curvature of the diffusivity profile around its depth, i.e. dt*|d2K/dz2| < 0.1. vertical_mixing:timestep is then the shortest time step.'},
             'drift:wind_drift_depth': {'type': 'float', 'default': 0.1,
                 'min': 0, 'max': 10, 'units': 'meters',
                 'description': 'The direct wind drift (windage) is linearly decreasing from the surface value (wind_drift_factor) until 0 at this depth.',
@@ -166,6 +174,9 @@ class OceanDrift(OpenDriftSimulation):
     def update(self):
         """Update positions and properties of elements."""
 
+        # Drift terms are summed, and elements moved at end of time step
+        self.start_velocity_accumulation()
+
         # Simply move particles with ambient current
         self.advect_ocean_current()
 
@@ -535,6 +546,44 @@ class OceanDrift(OpenDriftSimulation):
         gradK = -np.gradient(Kprofiles, self.environment_profiles['z'], axis=0)
         gradK[np.abs(gradK)<1e-10] = 0
 
+        if (store_depths is False and Tprofiles is None and ntimes_mix > 0 and
+                self.get_config('vertical_mixing:compiled_kernel') is True
+                and self.vertical_mixing_kernel_applicable()):
+            logger.debug('Using vertical mixing kernel')
+            self.update_terminal_velocity(z_index=z_index)
+            seafloor_action = self.get_config('general:seafloor_action')
+            has_seafloor = 'sea_floor_depth_below_sea_level' in self.priority_list
+            profile_z = np.asarray(self.environment_profiles['z'],
+                                   dtype=np.float64)
+            num = self.num_elements_active()
+            z = self.elements.z.astype(np.float64)
+            moving = np.broadcast_to(self.elements.moving, num).astype(np.float64)
+            Zmin = np.broadcast_to(Zmin, num).astype(np.float64)
+            Kprofiles = np.asarray(Kprofiles, dtype=np.float64)
+            gradK = np.asarray(gradK, dtype=np.float64)
+            w = np.broadcast_to(self.elements.terminal_velocity,
+                                num).astype(np.float64)
+            lift = has_seafloor and seafloor_action in ['lift_to_seafloor',
+                                                        'deactivate']
+            if self.get_config('vertical_mixing:adaptive_timestep') is True:
+                dt_profiles = vertical_random_walk_timesteps(
+                    Kprofiles, gradK, profile_z, w, dt_mix, ntimes_mix)
+                logger.debug('Adaptive mixing time steps from %ss to %ss' %
+                             (dt_profiles.min(), dt_profiles.max()))
+                z, seafloor = vertical_random_walk_adaptive(
+                    z, moving, Zmin, Kprofiles, gradK, profile_z, w,
+                    dt_profiles, float(dt_mix*ntimes_mix), lift)
+            else:
+                z, seafloor = vertical_random_walk(
+                    z, moving, Zmin, Kprofiles, gradK, profile_z, w,
+                    float(dt_mix), ntimes_mix, lift)
+            self.elements.z = z
+            if has_seafloor and seafloor_action == 'deactivate' and \
+                    np.any(seafloor):
+                self.deactivate_elements(seafloor, reason='seafloor')
+            self.timer_end('main loop:updating elements:vertical mixing')
+            return None
+
         for i in range(0, ntimes_mix):
             #remember which particles belong to the exact surface
             surface = self.elements.z == 0
@@ -601,6 +650,23 @@ class OceanDrift(OpenDriftSimulation):
         else:
             return None
 
+    def vertical_mixing_kernel_applicable(self):
+        """True if inner loop of vertical mixing can be run as one kernel
+
+        Models with own surface or seafloor interaction within the inner loop
+        of vertical mixing are mixed with the Python loop, unless they
+        override this method.
+        """
+        if self.get_config('general:seafloor_action') == 'previous':
+            return False
+        for hook in ['surface_stick', 'surface_wave_mixing',
+                     'bottom_interaction', 'interact_with_seafloor']:
+            if getattr(type(self), hook) is not getattr(OceanDrift, hook):
+                logger.debug('%s is overridden, not using vertical mixing '
+                             'kernel' % hook)
+                return False
+        return True
+
     def animate_vertical_distribution(self, depths=None, maxdepth=None, bins=50, filename=None, subsamplingstep=1):
         """Function to animate vertical distribution of particles
             bins:            number of bins in the histogram
@@ -1092,6 +1092,9 @@ class OpenOil(OceanDrift):
             k_ice = 0
             factor_stokes = 1
 
+        # Drift terms are summed, and elements moved at end of time step
+        self.start_velocity_accumulation()
+
         # Simply move particles with ambient current
         self.advect_ocean_current(factor=1 - k_ice)
 
@@ -21,6 +21,70 @@ from math import sqrt
 import matplotlib.pyplot as plt
 import pyproj
 import cmocean
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # Kernels are run as vectorised numpy code
+
+# WGS84 ellipsoid, created once
+geod = pyproj.Geod(ellps='WGS84')
+
+
+def displace_positions(lon, lat, x_dist, y_dist, method='geodesic',
+                       max_tangent_plane_distance=10000):
+    '''Return positions moved given distances [m] east- and northwards
+
+    method 'geodesic' moves along geodesics on the WGS84 ellipsoid.
+    method 'tangent_plane' moves in the plane tangent to the ellipsoid
+    at the midpoint of the displacement, which is several times faster.
+    Displacements larger than max_tangent_plane_distance (10 km), and
+    positions polewards of 80 degrees latitude, are moved along geodesics.
+    Other positions deviate from the geodesic by less than 0.2 m (less
+    than 2 cm equatorwards of 60 degrees latitude).
+    '''
+
+    lon, lat, x_dist, y_dist = np.broadcast_arrays(
+        np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64),
+        np.asarray(x_dist, dtype=np.float64), y_dist)
+    if method == 'tangent_plane':
+        a = geod.a
+        e2 = geod.es
+        lat_rad = np.radians(lat)
+        sin2 = np.sin(lat_rad)**2
+        # Geodesics are not lines of constant bearing: the mean bearing
+        # is turned from the initial azimuth by convergence of meridians
+        turn = x_dist*np.tan(lat_rad)*np.sqrt(1 - e2*sin2)/(2*a)
+        x_mean = x_dist*np.cos(turn) + y_dist*np.sin(turn)
+        y_mean = y_dist*np.cos(turn) - x_dist*np.sin(turn)
+        # Meridional radius of curvature at midpoint latitude
+        dlat = y_mean*(1 - e2*sin2)**1.5/(a*(1 - e2))
+        mid_lat = lat_rad + dlat/2
+        dlat = y_mean*(1 - e2*np.sin(mid_lat)**2)**1.5/(a*(1 - e2))
+        mid_lat = lat_rad + dlat/2
+        # Prime vertical radius of curvature at midpoint latitude
+        dlon = x_mean*np.sqrt(1 - e2*np.sin(mid_lat)**2)/(a*np.cos(mid_lat))
+        new_lon = np.mod(lon + np.degrees(dlon) + 180, 360) - 180
+        new_lat = lat + np.degrees(dlat)
+        geodesic = (x_dist*x_dist + y_dist*y_dist >
+                    max_tangent_plane_distance**2) | \
+            (np.abs(new_lat) > 80) | (np.abs(lat) > 80)
+        if np.any(geodesic):
+            geo_lon, geo_lat = displace_positions(
+                lon[geodesic], lat[geodesic], x_dist[geodesic],
+                y_dist[geodesic], method='geodesic')
+            new_lon = np.array(new_lon)
+            new_lat = np.array(new_lat)
+            new_lon[geodesic] = geo_lon
+            new_lat[geodesic] = geo_lat
+        return new_lon, new_lat
+    elif method == 'geodesic':
+        azimuth = np.degrees(np.arctan2(x_dist, y_dist))
+        distance = np.sqrt(x_dist*x_dist + y_dist*y_dist)
+        new_lon, new_lat, back_az = geod.fwd(lon, lat, azimuth, distance,
+                                             radians=False)
+        return new_lon, new_lat
+    else:
+        raise ValueError('Unknown method for moving positions: %s' % method)
 
 
 def wind_drift_factor_from_trajectory(trajectory_dict, min_period=None):
@@ -32,7 +96,6 @@ def wind_drift_factor_from_trajectory(trajectory_dict, min_period=None):
     Returns array of same length minus one of the fitted wind_drift_factor
     '''
 
-    geod = pyproj.Geod(ellps='WGS84')
     time = trajectory_dict['time']
     try:
         import pandas as pd
@@ -81,7 +144,6 @@ def distance_between_trajectories(lon1, lat1, lon2, lat2):
     '''Calculate the distances [m] between two trajectories'''
 
     assert len(lon1) == len(lat1) == len(lat1) == len(lat2)
-    geod = pyproj.Geod(ellps='WGS84')
     azimuth_forward, a2, distance = geod.inv(lon1, lat1, lon2, lat2)
  
     return distance
@@ -89,7 +151,6 @@ def distance_between_trajectories(lon1, lat1, lon2, lat2):
 def distance_along_trajectory(lon, lat):
     '''Calculate the distances [m] between points along a trajectory'''
 
-    geod = pyproj.Geod(ellps='WGS84')
     azimuth_forward, a2, distance = geod.inv(lon[1:], lat[1:], lon[0:-1], lat[0:-1])
 
     return distance
@@ -351,6 +412,155 @@ def stokes_drift_profile_breivik(stokes_u_surface, stokes_v_surface,
     return stokes_u, stokes_v, stokes_speed
 
 
+def _random_walk_step(z, moving, Zmin, Kz, dKdz, terminal_velocity, dt,
+                      lift_to_seafloor):
+    """One step of vertical_random_walk, dt may be scalar or per element."""
+    surface = z == 0
+    R = 2*np.random.random(z.shape[0]) - 1
+    r = 1.0/3
+    z = z - moving*(dKdz*dt - R*np.sqrt(Kz*dt*2/r))
+    # Reflect from surface and seafloor
+    z = np.where(z >= 0, -z, z)
+    z = np.where((z < Zmin) & (moving == 1), 2*Zmin - z, z)
+    # Buoyancy
+    z = z + terminal_velocity*dt*moving
+    # Surface slick is kept just below surface
+    z[surface] = 0.
+    z = np.where(z >= 0, -0.01, z)
+    below = z < Zmin
+    if lift_to_seafloor:
+        z = np.where(below, Zmin, z)
+    return z, below
+
+
+def vertical_random_walk(z, moving, Zmin, Kprofiles, gradK, profile_z,
+                         terminal_velocity, dt_mix, ntimes_mix,
+                         lift_to_seafloor):
+    """Visser et al. (1997) random walk of ntimes_mix steps of dt_mix seconds
+
+    Kernel of the inner loop of OceanDrift.vertical_mixing, with
+    reflection at surface and seafloor, buoyancy and the default surface
+    and seafloor interaction, for all elements in one call. Kprofiles and
+    gradK (dK/dz) have shape (len(profile_z), len(z)), with profile_z
+    decreasing from the surface.
+
+    Returns the new depths, and a boolean array which is True for elements
+    which have reached the seafloor (lifted to Zmin if lift_to_seafloor).
+    """
+    num = z.shape[0]
+    columns = np.arange(num)
+    z_i = np.arange(profile_z.shape[0]).astype(np.float64)
+    K_flat = Kprofiles.ravel()
+    gradK_flat = gradK.ravel()
+    seafloor = np.zeros(num, dtype=np.bool_)
+    for i in range(ntimes_mix):
+        # Diffusivity and its gradient at z
+        zi = np.round(np.interp(-z, -profile_z, z_i)).astype(np.int64)
+        z, below = _random_walk_step(
+            z, moving, Zmin, K_flat[zi*num + columns],
+            gradK_flat[zi*num + columns], terminal_velocity, dt_mix,
+            lift_to_seafloor)
+        seafloor = seafloor | below
+    return z, seafloor
+
+
+def vertical_random_walk_adaptive(z, moving, Zmin, Kprofiles, gradK,
+                                  profile_z, terminal_velocity, dt_profiles,
+                                  duration, lift_to_seafloor):
+    """As vertical_random_walk, but with time step varying along trajectory
+
+    Each element is moved with the time step of dt_profiles (same shape as
+    Kprofiles) at its present depth, until it has been mixed for duration
+    seconds. Only elements not yet finished are processed at each step.
+    """
+    num = z.shape[0]
+    z_i = np.arange(profile_z.shape[0]).astype(np.float64)
+    K_flat = Kprofiles.ravel()
+    gradK_flat = gradK.ravel()
+    dt_flat = dt_profiles.ravel()
+    z = z.copy()
+    seafloor = np.zeros(num, dtype=np.bool_)
+    # Arrays of elements not yet finished
+    active = np.arange(num)
+    z_a = z.copy()
+    moving_a = moving.copy()
+    Zmin_a = Zmin.copy()
+    w_a = terminal_velocity.copy()
+    seafloor_a = seafloor.copy()
+    remaining = np.full(num, float(duration))
+    while active.shape[0] > 0:
+        zi = np.round(np.interp(-z_a, -profile_z, z_i)).astype(np.int64)
+        flat = zi*num + active
+        dt = np.minimum(dt_flat[flat], remaining)
+        z_a, below = _random_walk_step(
+            z_a, moving_a, Zmin_a, K_flat[flat], gradK_flat[flat], w_a, dt,
+            lift_to_seafloor)
+        seafloor_a = seafloor_a | below
+        remaining = remaining - dt
+        finished = remaining < 1e-3
+        if np.any(finished):
+            z[active[finished]] = z_a[finished]
+            seafloor[active[finished]] = seafloor_a[finished]
+            keep = ~finished
+            active = active[keep]
+            z_a = z_a[keep]
+            moving_a = moving_a[keep]
+            Zmin_a = Zmin_a[keep]
+            w_a = w_a[keep]
+            seafloor_a = seafloor_a[keep]
+            remaining = remaining[keep]
+    return z, seafloor
+
+
+if njit is not None:
+    # Note that numba uses a random generator separate from numpy
+    _random_walk_step = njit(cache=True)(_random_walk_step)
+    vertical_random_walk = njit(cache=True)(vertical_random_walk)
+    vertical_random_walk_adaptive = \
+        njit(cache=True)(vertical_random_walk_adaptive)
+
+
+def _window_maximum(a, width, function=np.maximum):
+    """Maximum (or other function) of a within +- width along first axis."""
+    for i in range(width):
+        widened = a.copy()
+        function(widened[1:], a[:-1], out=widened[1:])
+        function(widened[:-1], a[1:], out=widened[:-1])
+        a = widened
+    return a
+
+
+def vertical_random_walk_timesteps(Kprofiles, gradK, profile_z,
+                                   terminal_velocity, dt_mix, max_steps,
+                                   stability=0.1, width=2):
+    """Longest random walk time step for elements at each level of profiles
+
+    The Visser et al. (1997) random walk requires a time step
+    dt << (d2K/dz2)^-1. Time steps are chosen such that
+    dt*|d2K/dz2| <= stability within +- width levels, and such that
+    elements can not move outside these levels within one step.
+    Time steps are at least dt_mix, and at most dt_mix*max_steps.
+    """
+    if len(profile_z) < 3:
+        return np.full(Kprofiles.shape, float(dt_mix))
+    curvature = _window_maximum(
+        np.abs(np.gradient(gradK, profile_z, axis=0)), width)
+    K = _window_maximum(Kprofiles, width)
+    drift = _window_maximum(np.abs(gradK), width) + \
+        np.abs(terminal_velocity)
+    spacing = np.abs(np.diff(profile_z))
+    spacing = np.minimum(np.append(spacing, spacing[-1]),
+                         np.insert(spacing, 0, spacing[0]))
+    # Smallest distance from an element to the levels outside window
+    distance = width*_window_maximum(spacing, width, np.minimum)/2
+    distance = distance[:, np.newaxis]
+    with np.errstate(divide='ignore'):
+        # Random displacement is at most sqrt(6*K*dt)
+        dt = np.minimum(stability/curvature, (distance/2)**2/(6*K))
+        dt = np.minimum(dt, distance/2/drift)
+    return np.clip(dt, dt_mix, dt_mix*max_steps)
+
+
 def ftle(X, Y, delta, duration):
     """Calculate Finite Time Lyapunov Exponents from flow map"""
     # From Johannes Rohrs
@@ -414,6 +624,12 @@ def cg_eigenvectors(X, Y, delta, duration):
 class PhysicsMethods:
     """Physics methods to be inherited by OpenDriftSimulation class"""
 
+    # Sum of velocities of drift terms, while accumulating (see
+    # start_velocity_accumulation), and the velocity of the last
+    # accumulated move, for diagnostics
+    accumulated_velocity = None
+    drift_velocity = None
+
     @staticmethod
     def sea_water_density(T=10., S=35.):
         '''The function gives the density of seawater at one atmosphere
@@ -524,6 +740,40 @@ class PhysicsMethods:
 
         
 
+    def start_velocity_accumulation(self):
+        """Accumulate drift velocities, to move elements once per time step
+
+        Subsequent calls to update_positions add the velocities of drift
+        terms (ocean current, wind, Stokes drift, diffusion...) to an
+        accumulator instead of moving the elements. The elements are moved
+        with the sum of velocities by move_accumulated_velocity, which is
+        called by the main loop at the end of each time step.
+        """
+        num = self.num_elements_active()
+        self.accumulated_velocity = (np.zeros(num), np.zeros(num))
+
+    def accumulate_velocity(self, x_vel, y_vel):
+        """Add velocities to accumulator, returning False if not accumulating"""
+        if self.accumulated_velocity is None:
+            return False
+        # Elements not moving are not moved by this contribution, even if
+        # they are moving again when moved at the end of the time step
+        x_sum, y_sum = self.accumulated_velocity
+        x_sum += x_vel * self.elements.moving
+        y_sum += y_vel * self.elements.moving
+        return True
+
+    def move_accumulated_velocity(self):
+        """Move elements with the sum of accumulated velocities"""
+        if self.accumulated_velocity is None:
+            return
+        x_vel, y_vel = self.accumulated_velocity
+        self.accumulated_velocity = None
+        self.drift_velocity = (x_vel, y_vel)
+        if np.any(x_vel) or np.any(y_vel):
+            self.displace_elements(x_vel * self.time_step.total_seconds(),
+                                   y_vel * self.time_step.total_seconds())
+
     def advect_ocean_current(self, factor=1):
 
         cdf = self.elements.current_drift_factor
@@ -541,14 +791,12 @@ class PhysicsMethods:
             x_vel = self.environment.x_sea_water_velocity
             y_vel = self.environment.y_sea_water_velocity
 
+            method = self.get_config('drift:position_update')
+            half_step = self.time_step.total_seconds()*.5
             # Find midpoint
-            az = np.degrees(np.arctan2(x_vel, y_vel))
-            speed = np.sqrt(x_vel*x_vel + y_vel*y_vel)
-            dist = speed*self.time_step.total_seconds()*.5
-            geod = pyproj.Geod(ellps='WGS84')
-            mid_lon, mid_lat, dummy = geod.fwd(self.elements.lon,
-                                               self.elements.lat,
-                                               az, dist, radians=False)
+            mid_lon, mid_lat = displace_positions(
+                self.elements.lon, self.elements.lat,
+                x_vel*half_step, y_vel*half_step, method=method)
             # Find current at midpoint, a half timestep later
             logger.debug('Runge-kutta, fetching half time-step later...')
             mid_env, profiles, missing = self.get_environment(
@@ -559,13 +807,9 @@ class PhysicsMethods:
                 logger.debug('Runge-kutta 4th order...')
                 x_vel2 = mid_env['x_sea_water_velocity']
                 y_vel2 = mid_env['y_sea_water_velocity']
-                az2 = np.degrees(np.arctan2(x_vel2, y_vel2))
-                speed2 = np.sqrt(x_vel2*x_vel2 + y_vel2*y_vel2)
-                dist2 = speed2*self.time_step.total_seconds()*.5
-                lon2, lat2, dummy = \
-                    geod.fwd(self.elements.lon,
-                             self.elements.lat,
-                             az2, dist2, radians=False)
+                lon2, lat2 = displace_positions(
+                    self.elements.lon, self.elements.lat,
+                    x_vel2*half_step, y_vel2*half_step, method=method)
                 env2, profiles, missing = self.get_environment(
                     ['x_sea_water_velocity', 'y_sea_water_velocity'],
                     self.time + self.time_step/2,
@@ -573,13 +817,9 @@ class PhysicsMethods:
                 # Third step
                 x_vel3 = env2['x_sea_water_velocity']
                 y_vel3 = env2['y_sea_water_velocity']
-                az3 = np.degrees(np.arctan2(x_vel3, y_vel3))
-                speed3 = np.sqrt(x_vel3*x_vel3 + y_vel3*y_vel3)
-                dist3 = speed3*self.time_step.total_seconds()*.5
-                lon3, lat3, dummy = \
-                    geod.fwd(self.elements.lon,
-                             self.elements.lat,
-                             az3, dist3, radians=False)
+                lon3, lat3 = displace_positions(
+                    self.elements.lon, self.elements.lat,
+                    x_vel3*half_step, y_vel3*half_step, method=method)
                 env3, profiles, missing = self.get_environment(
                     ['x_sea_water_velocity', 'y_sea_water_velocity'],
                     self.time + self.time_step,
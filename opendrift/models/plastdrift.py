@@ -78,6 +78,9 @@ class PlastDrift(OceanDrift):
     def update(self):
         """Update positions and properties of elements."""
 
+        # Drift terms are summed, and elements moved at end of time step
+        self.start_velocity_accumulation()
+
         # Simply move particles with ambient current
         self.advect_ocean_current()
 
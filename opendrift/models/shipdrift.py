@@ -25,6 +25,7 @@ import scipy
 import logging; logger = logging.getLogger(__name__)
 
 from opendrift.models.basemodel import OpenDriftSimulation
+from opendrift.export.history import History
 from opendrift.elements import LagrangianArray
 
 
@@ -364,9 +365,7 @@ class ShipDrift(OpenDriftSimulation):
             self.history_metadata[env_var] = {}
         history_dtype = np.dtype(history_dtype_fields)
 
-        self.history = np.ma.array(
-	        np.zeros([num_elements, num_timesteps]),
-            dtype=history_dtype, mask=[True])
+        self.history = History(history_dtype, num_elements, num_timesteps)
 
         self.steps_output = num_timesteps
         self.steps = num_timesteps
@@ -380,5 +379,6 @@ class ShipDrift(OpenDriftSimulation):
             l = line.split()
             lon = float(l[2])
             lat = float(l[3])
-            self.history['lon'][0, i] = lon
-            self.history['lat'][0, i] = lat
+            self.history.store('lon', 0, i, lon)
+            self.history.store('lat', 0, i, lat)
+            self.history.set_valid(0, i)
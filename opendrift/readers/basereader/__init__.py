@@ -220,6 +220,9 @@ class BaseReader(Variables, Combine, Filter):
             for cat, time in self.timing.items():
                 time = str(time)[0:str(time).find('.') + 2]
                 outStr += '%10s  %s\n' % (time, cat)
+        if hasattr(self, 'counters'):
+            for cat, count in self.counters.items():
+                outStr += '%10s  %s\n' % (count, cat)
         return outStr
 
     def clip_boundary_pixels(self, numpix):
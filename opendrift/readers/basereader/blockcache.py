@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def block_nbytes(block):
+    """Approximate memory (bytes) used by the data arrays of a reader block."""
+    nbytes = 0
+    for data in list(block.data_dict.values()) + [block.x, block.y, block.z]:
+        if isinstance(data, list):  # Ensemble data
+            nbytes += sum(np.asarray(d).nbytes for d in data)
+        elif data is not None:
+            nbytes += np.asarray(data).nbytes
+    return nbytes
+
+
+class BlockCache():
+    """
+    Least-recently-used cache of reader blocks within a memory budget.
+
+    Blocks are stored with key (variable group, time, spatial window), where
+    the window is the extent of the block in reader coordinates. Lookups
+    return the most recently used block of the given variable group and time
+    which covers the requested positions.
+
+    Args:
+        max_bytes: memory budget in bytes. Least recently used blocks are
+            evicted when the total size exceeds this. 0 disables caching.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.blocks = OrderedDict()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    @staticmethod
+    def window(block):
+        return (np.min(block.x), np.max(block.x),
+                np.min(block.y), np.max(block.y))
+
+    def get(self, blockvars, time, covers):
+        """
+        Return cached block for variable group and time, or None.
+
+        Args:
+            covers: function taking a block and returning True if block
+                covers the present positions.
+        """
+        if self.max_bytes <= 0:
+            return None
+        for key in reversed(self.blocks):
+            if key[0] == blockvars and key[1] == time:
+                block = self.blocks[key][0]
+                if covers(block):
+                    self.blocks.move_to_end(key)
+                    return block
+        return None
+
+    def put(self, blockvars, time, block):
+        """Store block, evicting least recently used blocks if needed."""
+        if self.max_bytes <= 0:
+            return
+        nbytes = block_nbytes(block)
+        if nbytes > self.max_bytes:
+            logger.debug('Block of %i bytes larger than cache size (%i), '
+                         'not caching' % (nbytes, self.max_bytes))
+            return
+        key = (blockvars, time, self.window(block))
+        if key in self.blocks:
+            self.nbytes -= self.blocks.pop(key)[1]
+        self.blocks[key] = (block, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            oldkey, (oldblock, oldbytes) = self.blocks.popitem(last=False)
+            self.nbytes -= oldbytes
+            logger.debug('Evicting block %s %s from cache' % oldkey[0:2])
+
+    def clear(self):
+        self.blocks = OrderedDict()
+        self.nbytes = 0
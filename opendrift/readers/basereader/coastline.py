@@ -0,0 +1,402 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import shapely
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def polygon_segments(polygons):
+    """Return coordinates (x0, y0, x1, y1) of all polygon boundary segments."""
+    rings = shapely.get_parts(shapely.boundary(
+        np.asarray(list(polygons), dtype=object)))
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    same_ring = index[1:] == index[:-1]
+    start = coords[:-1][same_ring]
+    end = coords[1:][same_ring]
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1]
+
+
+def wrapped_polygons(coastline_polygons, extent):
+    """
+    Polygons intersecting a geographic extent, which may extend beyond the
+    longitude range (e.g. -180 to 180) of the polygons.
+
+    Polygons found 360 degrees east or west of the extent are shifted, so
+    that longitudes are continuous across the extent.
+
+    Args:
+        coastline_polygons: function returning polygons intersecting an
+            extent, e.g. `coastline_polygons` of a landmask reader.
+        extent: (lonmin, latmin, lonmax, latmax)
+    """
+    lonmin, latmin, lonmax, latmax = extent
+    polygons = [np.asarray(coastline_polygons(extent), dtype=object)]
+    for shift in (-360, 360):
+        shifted = np.asarray(coastline_polygons(
+            (lonmin - shift, latmin, lonmax - shift, latmax)), dtype=object)
+        if len(shifted) > 0:
+            polygons.append(shapely.transform(
+                shifted, lambda c: c + [shift, 0]))
+    return np.concatenate(polygons)
+
+
+class CoastlineIndex():
+    """
+    Spatial index of coastline segments, for exact coastline crossings.
+
+    The boundaries of land polygons (in reader coordinates) are split into
+    segments, which are stored in a STRtree. Additionally a coarse raster
+    marks cells containing (or neighbouring) coastline, so that elements
+    moving less than a cell away from coastline are found with a lookup,
+    without querying the tree.
+
+    Elements which were in water at the start of a path are on land at
+    the end if the path crosses the coastline an odd number of times.
+    This is only known for paths within the extent, see `contains`, as
+    segments outside are not indexed.
+
+    Args:
+        polygons: iterable of shapely (Multi)Polygons of land.
+        extent: (xmin, ymin, xmax, ymax) of the raster of coastline cells.
+        max_cells: maximum number of raster cells along each axis.
+    """
+
+    def __init__(self, polygons, extent, max_cells=512):
+        xmin, ymin, xmax, ymax = extent
+        self.extent = extent
+        x0, y0, x1, y1 = polygon_segments(polygons)
+        # Only segments within extent are kept
+        inside = (np.maximum(x0, x1) >= xmin) & (np.minimum(x0, x1) <= xmax) & \
+                 (np.maximum(y0, y1) >= ymin) & (np.minimum(y0, y1) <= ymax)
+        self.segments = np.stack((x0, y0, x1, y1))[:, inside]
+        logger.debug('Indexing %i coastline segments' % self.segments.shape[1])
+        self.tree = shapely.STRtree(shapely.linestrings(
+            self.segments.T.reshape(-1, 2, 2)))
+
+        self.cell_size = max(xmax - xmin, ymax - ymin) / max_cells
+        self.xmin = xmin
+        self.ymin = ymin
+        self.shape = (int(np.ceil((ymax - ymin) / self.cell_size)) + 1,
+                      int(np.ceil((xmax - xmin) / self.cell_size)) + 1)
+        coast = self.coast_cells()
+        # Cells neighbouring coastline
+        self.near = coast.copy()
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                self.near[max(di, 0):self.shape[0] + min(di, 0),
+                          max(dj, 0):self.shape[1] + min(dj, 0)] |= \
+                    coast[max(-di, 0):self.shape[0] + min(-di, 0),
+                          max(-dj, 0):self.shape[1] + min(-dj, 0)]
+
+    def coast_cells(self):
+        """Return raster with True for cells containing coastline."""
+        # Mark cells along segments, sampled at half cell size
+        x0, y0, x1, y1 = self.segments
+        num = np.ceil(2 * np.maximum(np.abs(x1 - x0), np.abs(y1 - y0)) /
+                      self.cell_size).astype(np.int64) + 1
+        segment = np.repeat(np.arange(len(num)), num)
+        f = (np.arange(len(segment)) - np.repeat(np.cumsum(num) - num, num)) \
+            / np.repeat(np.maximum(num - 1, 1), num)
+        coast = np.zeros(self.shape, dtype=bool)
+        i, j, valid = self.cell(x0[segment] + f * (x1 - x0)[segment],
+                                y0[segment] + f * (y1 - y0)[segment])
+        coast[i[valid], j[valid]] = True
+        return coast
+
+    def cell(self, x, y):
+        """Return raster indices of positions, and whether within raster."""
+        j = np.floor((x - self.xmin) / self.cell_size).astype(np.int64)
+        i = np.floor((y - self.ymin) / self.cell_size).astype(np.int64)
+        valid = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+        return i, j, valid
+
+    def contains(self, x, y):
+        """Return True for positions within extent of index."""
+        xmin, ymin, xmax, ymax = self.extent
+        return (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+
+    def near_coast(self, x0, y0, x1, y1):
+        """Return True for paths which may cross the coastline.
+
+        Paths shorter than a cell, starting in a cell not neighbouring
+        coastline, can not reach coastline."""
+        i, j, valid = self.cell(x0, y0)
+        short = (np.abs(x1 - x0) <= self.cell_size) & \
+                (np.abs(y1 - y0) <= self.cell_size)
+        near = ~(valid & short)
+        near[valid & short] = self.near[i[valid & short], j[valid & short]]
+        return near
+
+    def crossings(self, x0, y0, x1, y1):
+        """
+        Find coastline crossings of straight paths from (x0, y0) to (x1, y1).
+
+        Returns:
+            count: number of coastline segments crossed by each path.
+            t: fraction of path where the coastline is first crossed,
+                NaN if not crossed.
+        """
+        x0, y0, x1, y1 = [np.asarray(c, dtype=np.float64)
+                          for c in (x0, y0, x1, y1)]
+        count = np.zeros(len(x0), dtype=np.int64)
+        t = np.full(len(x0), np.nan)
+        candidates = np.flatnonzero(self.near_coast(x0, y0, x1, y1))
+        if len(candidates) == 0 or self.segments.shape[1] == 0:
+            return count, t
+        paths = shapely.linestrings(np.stack(
+            (x0[candidates], y0[candidates], x1[candidates], y1[candidates]),
+            axis=1).reshape(-1, 2, 2))
+        path, segment = self.tree.query(paths)
+        if len(path) == 0:
+            return count, t
+        element = candidates[path]
+        px, py = x0[element], y0[element]
+        rx, ry = x1[element] - px, y1[element] - py
+        sx0, sy0, sx1, sy1 = self.segments[:, segment]
+        qx, qy = sx1 - sx0, sy1 - sy0
+        denom = rx * qy - ry * qx
+        dx, dy = sx0 - px, sy0 - py
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tp = (dx * qy - dy * qx) / denom
+            u = (dx * ry - dy * rx) / denom
+        # Segments are half open, so that shared vertices are counted once
+        crossed = (denom != 0) & (tp >= 0) & (tp <= 1) & (u >= 0) & (u < 1)
+        count += np.bincount(element[crossed], minlength=len(x0))
+        first = np.full(len(x0), np.inf)
+        np.minimum.at(first, element[crossed], tp[crossed])
+        t[np.isfinite(first)] = first[np.isfinite(first)]
+        return count, t
+
+
+class CoastDistance():
+    """
+    Coarse raster of distance to coastline, with land mask of cells.
+
+    The distance is a lower bound (in meters) of the distance from any
+    position within a cell to the coastline. Cells with positive distance
+    contain no coastline, and are thus entirely land or water, as given
+    by the land mask. Positions outside the raster have distance 0.
+
+    Args:
+        extent: (xmin, ymin, xmax, ymax) of raster.
+        cell_size: size of (square) cells in reader coordinates.
+        distance: 2D array (y, x) with distance in meters.
+        land: 2D array (y, x) with True for land cells.
+    """
+
+    def __init__(self, extent, cell_size, distance, land):
+        self.extent = tuple(extent)
+        self.cell_size = cell_size
+        self.distance = distance
+        self.land = land
+
+    @classmethod
+    def from_coastline(cls, index, landmask, geographic):
+        """
+        Make raster from the coastline cells of a CoastlineIndex.
+
+        Args:
+            index: CoastlineIndex.
+            landmask: function returning land mask at given x, y, for
+                cell centres.
+            geographic: True if coordinates are longitude and latitude,
+                otherwise they are assumed to be in meters.
+        """
+        from scipy.ndimage import distance_transform_edt
+        coast = index.coast_cells()
+        ny, nx = index.shape
+        dx = dy = index.cell_size
+        if geographic:  # Meters, conservatively at highest latitude
+            latmax = np.abs([index.ymin, index.ymin + ny * dy]).max()
+            dy = dy * 111000.
+            dx = dx * 111000. * np.cos(np.radians(np.minimum(latmax, 90)))
+        if coast.any():
+            distance = distance_transform_edt(~coast, sampling=(dy, dx))
+            # From cell centre distance to bound for any point in the cells
+            distance = np.maximum(distance - np.hypot(dx, dy), 0)
+        else:
+            distance = np.full(coast.shape, np.inf)
+        y, x = np.mgrid[0:ny, 0:nx]
+        x = index.xmin + (x + .5) * index.cell_size
+        y = index.ymin + (y + .5) * index.cell_size
+        land = np.zeros(coast.shape, dtype=bool)
+        land[~coast] = np.asarray(landmask(x[~coast], y[~coast])) == 1
+        extent = (index.xmin, index.ymin, index.xmin + nx * index.cell_size,
+                  index.ymin + ny * index.cell_size)
+        return cls(extent, index.cell_size, distance.astype(np.float32), land)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as f:
+            return cls(f['extent'], float(f['cell_size']), f['distance'],
+                       f['land'])
+
+    def save(self, filename):
+        """Save raster, atomically replacing any existing file."""
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp',
+                                       dir=os.path.dirname(filename))
+        os.close(fd)
+        try:
+            with open(tmpname, 'wb') as f:
+                np.savez(f, extent=self.extent, cell_size=self.cell_size,
+                         distance=self.distance, land=self.land)
+            os.replace(tmpname, filename)
+        except OSError as e:
+            logger.warning('Could not save distance to coast: %s' % e)
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def lookup(self, x, y):
+        """Return distance to coast (m) and land mask at positions."""
+        j = np.floor((x - self.extent[0]) / self.cell_size)
+        i = np.floor((y - self.extent[1]) / self.cell_size)
+        valid = (i >= 0) & (i < self.distance.shape[0]) & \
+                (j >= 0) & (j < self.distance.shape[1])
+        i = i[valid].astype(np.int64)
+        j = j[valid].astype(np.int64)
+        distance = np.zeros(len(x), dtype=np.float32)
+        land = np.zeros(len(x), dtype=bool)
+        distance[valid] = self.distance[i, j]
+        land[valid] = self.land[i, j]
+        return distance, land
+
+
+class OceanPoints():
+    """
+    Cached ocean points of a landmask, for finding closest ocean points.
+
+    Ocean points are found on square tiles of longitude and latitude,
+    aligned with a fixed global grid, so that tiles are reused by later
+    requests in the same area. The landmask is evaluated on a grid of
+    spacing `resolution` (degrees), which is refined by `refinement` near
+    the coast, i.e. in grid cells with both land and ocean in their 3x3
+    neighbourhood. A KD-tree of the ocean points is kept for each tile,
+    and the least recently used tiles are discarded when there are more
+    than `max_tiles`.
+
+    Args:
+        resolution: grid spacing (degrees).
+        refinement: ratio of grid spacing and spacing near the coast.
+        tile_cells: number of grid cells along each side of tiles.
+        max_tiles: maximum number of cached tiles.
+    """
+
+    def __init__(self, resolution=.01, refinement=4, tile_cells=16,
+                 max_tiles=1024):
+        self.resolution = resolution
+        self.refinement = refinement
+        self.tile_cells = tile_cells
+        self.tile_size = resolution * tile_cells
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def tile(self, key, landmask):
+        """
+        Return KD-tree of ocean points of tile, or None if no ocean points.
+
+        Args:
+            key: (i, j) index of tile along longitude and latitude.
+            landmask: function returning land mask (1 for land, 0 for
+                ocean, NaN or 1 where not covered) at given lon, lat.
+        """
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+        from scipy.spatial import cKDTree
+        n = self.tile_cells
+        # Grid cell centers, with one extra cell around to detect coast
+        # at edges
+        k = (np.arange(-1, n + 1) + .5) * self.resolution
+        lon, lat = np.meshgrid(key[0] * self.tile_size + k,
+                               key[1] * self.tile_size + k)
+        ocean = np.asarray(landmask(lon.ravel(), lat.ravel())) == 0
+        ocean = ocean.reshape(lon.shape)
+        window = np.stack([ocean[1 + di:n + 1 + di, 1 + dj:n + 1 + dj]
+                           for di in (-1, 0, 1) for dj in (-1, 0, 1)])
+        coast = window.any(axis=0) & ~window.all(axis=0)
+        lon = lon[1:-1, 1:-1]
+        lat = lat[1:-1, 1:-1]
+        ocean = ocean[1:-1, 1:-1]
+        points = [np.stack((lon[ocean & ~coast], lat[ocean & ~coast]),
+                           axis=-1)]
+        if coast.any():
+            m = (np.arange(self.refinement) + .5) * \
+                self.resolution / self.refinement - self.resolution / 2
+            flon = (lon[coast][:, np.newaxis, np.newaxis] +
+                    m[np.newaxis, np.newaxis, :]).ravel()
+            flat = (lat[coast][:, np.newaxis, np.newaxis] +
+                    m[np.newaxis, :, np.newaxis]).ravel()
+            focean = np.asarray(landmask(flon, flat)) == 0
+            points.append(np.stack((flon[focean], flat[focean]), axis=-1))
+        points = np.concatenate(points)
+        logger.debug('%i ocean points in tile %s' % (len(points), key))
+        tree = cKDTree(points) if len(points) > 0 else None
+        with self.lock:
+            self.tiles[key] = tree
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return tree
+
+    def closest(self, lon, lat, landmask, max_distance=.1):
+        """
+        Return closest ocean points (lon, lat) of given positions.
+
+        Ocean points are searched within `max_distance` (degrees) of each
+        position. Positions without ocean points nearby are returned as NaN.
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        closest_lon = np.full(len(lon), np.nan)
+        closest_lat = np.full(len(lon), np.nan)
+        dist = np.full(len(lon), np.inf)
+        ti = np.floor(lon / self.tile_size).astype(np.int64)
+        tj = np.floor(lat / self.tile_size).astype(np.int64)
+        keys, inverse = np.unique(np.stack((ti, tj)), axis=1,
+                                  return_inverse=True)
+        inverse = inverse.ravel()
+        reach = int(np.ceil(max_distance / self.tile_size))
+        for n, (i, j) in enumerate(keys.T):
+            members = np.flatnonzero(inverse == n)
+            for di in range(-reach, reach + 1):
+                for dj in range(-reach, reach + 1):
+                    # Distance from positions to tile
+                    dlon = np.maximum.reduce([
+                        (i + di) * self.tile_size - lon[members],
+                        lon[members] - (i + di + 1) * self.tile_size,
+                        np.zeros(len(members))])
+                    dlat = np.maximum.reduce([
+                        (j + dj) * self.tile_size - lat[members],
+                        lat[members] - (j + dj + 1) * self.tile_size,
+                        np.zeros(len(members))])
+                    near = members[np.hypot(dlon, dlat) <= max_distance]
+                    if len(near) == 0:
+                        continue
+                    tree = self.tile((i + di, j + dj), landmask)
+                    if tree is None:
+                        continue
+                    d, index = tree.query(
+                        np.stack((lon[near], lat[near]), axis=-1),
+                        distance_upper_bound=max_distance)
+                    closer = d < dist[near]
+                    dist[near[closer]] = d[closer]
+                    closest_lon[near[closer]] = tree.data[index[closer], 0]
+                    closest_lat[near[closer]] = tree.data[index[closer], 1]
+        return closest_lon, closest_lat
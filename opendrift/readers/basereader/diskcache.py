@@ -0,0 +1,219 @@
+import os
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class DiskBlockCache():
+    """
+    Persistent cache of data read from (typically remote) readers.
+
+    Each variable of a data block is stored as a compressed netCDF file
+    in `cache_dir`, with filename given by a hash of the key (source,
+    variable, time, index window). The cache may be shared by several
+    processes (e.g. jobs of an array job): files are written to a temporary
+    file and atomically renamed, and eviction is serialised with a lock
+    file. When the total size exceeds `max_bytes`, the least
+    recently used files are deleted, down to `low_water` times `max_bytes`.
+
+    The directory is only scanned when the total size at the last scan plus
+    the size of files stored since by this process exceeds `max_bytes`.
+    Files stored by other processes are counted at their next scan.
+
+    Args:
+        cache_dir: directory for cache files, created if not existing.
+        max_bytes: maximum total size of cache files, None for no limit.
+    """
+
+    suffix = '.nc'
+    low_water = .8  # Fraction of max_bytes kept after eviction
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.nbytes = None  # Estimated total size, None if not yet scanned
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.lockfile = os.path.join(self.cache_dir, '.lock')
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock of cache directory, shared between processes."""
+        with open(self.lockfile, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self, key):
+        """Return dictionary with variable and coordinates, or None if not cached."""
+        from netCDF4 import Dataset
+        filename = self.filename(key)
+        try:
+            with Dataset(filename, 'r') as d:
+                data = {}
+                for var in d.variables:
+                    data[var] = d.variables[var][:]
+                    if var in ['x', 'y', 'z']:
+                        data[var] = np.ma.getdata(data[var])
+                if 'z' in d.variables and d.variables['z'].ndim == 0:
+                    data['z'] = data['z'].item()
+            os.utime(filename)  # Mark as recently used
+        except (OSError, RuntimeError, KeyError):
+            return None
+        return data
+
+    def store(self, key, variable, data):
+        """Store a variable with coordinates from a data dictionary."""
+        from netCDF4 import Dataset
+        value = data[variable]
+        if isinstance(value, list):
+            return False  # Ensemble data not cached
+        value = np.ma.asarray(value)
+        if value.ndim < 2 or value.dtype.kind not in 'fiu':
+            return False
+
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            with Dataset(tmpname, 'w') as d:
+                dims = ['y', 'x'] if value.ndim == 2 else ['layer', 'y', 'x']
+                for dim, size in zip(dims, value.shape):
+                    d.createDimension(dim, size)
+                for coord in ['x', 'y']:
+                    d.createVariable(coord, 'f8', (coord,))[:] = data[coord]
+                z = data.get('z')
+                if z is not None:
+                    z = np.asarray(z)
+                    if z.ndim == 1:
+                        d.createDimension('z', len(z))
+                        d.createVariable('z', 'f8', ('z',))[:] = z
+                    elif z.ndim == 0:
+                        d.createVariable('z', 'f8', ())[:] = z
+                var = d.createVariable(
+                    variable, value.dtype, dims, zlib=True, complevel=4,
+                    fill_value=np.ma.default_fill_value(value.dtype))
+                var[:] = value
+            os.replace(tmpname, self.filename(key))
+            if self.nbytes is not None:
+                self.nbytes += os.path.getsize(self.filename(key))
+        except Exception as e:
+            logger.warning('Could not write %s to disk cache: %s' %
+                           (variable, e))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            return False
+        return True
+
+    def files(self):
+        """List of (filename, size, last access) of cached files."""
+        files = []
+        for f in os.scandir(self.cache_dir):
+            if f.name.endswith(self.suffix):
+                try:
+                    stat = f.stat()
+                except OSError:  # Removed by other process
+                    continue
+                files.append((f.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def evict(self):
+        """Delete least recently used files if exceeding size limit."""
+        if self.max_bytes is None or (self.nbytes is not None and
+                                      self.nbytes <= self.max_bytes):
+            return
+        with self.lock():
+            files = sorted(self.files(), key=lambda f: f[2])
+            total = sum(f[1] for f in files)
+            if total > self.max_bytes:
+                while total > self.low_water * self.max_bytes and \
+                        len(files) > 0:
+                    filename, size, _ = files.pop(0)
+                    logger.debug('Evicting %s from disk cache' % filename)
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+                    total -= size
+            self.nbytes = total
+
+
+class ArrayCache(DiskBlockCache):
+    """
+    Persistent cache of arrays which are expensive to compute, e.g.
+    coefficients depending only on the grid of a reader.
+
+    Arrays are stored as .npy files in `cache_dir`, with filename given by a
+    hash of the key and the array name, and loaded memory-mapped (read only).
+    Processes sharing the cache (e.g. jobs of an array job) thus compute
+    the arrays only once, and share the pages in memory. Files are written
+    to a temporary file and atomically renamed, and computing is serialised
+    with the lock file.
+    """
+
+    suffix = '.npy'
+
+    def filename(self, key, name=None):
+        if name is not None:
+            key = '%s_%s' % (key, name)
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def load(self, key, names):
+        """Return dictionary of memory-mapped arrays, or None if not cached."""
+        try:
+            return {name: np.load(self.filename(key, name), mmap_mode='r')
+                    for name in names}
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, arrays):
+        """Store a dictionary of arrays."""
+        for name, array in arrays.items():
+            fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.asarray(array))
+                os.replace(tmpname, self.filename(key, name))
+            except Exception as e:
+                logger.warning('Could not write %s to array cache: %s' %
+                               (name, e))
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                return False
+        return True
+
+    def get(self, key, names, compute):
+        """
+        Return dictionary of cached arrays with given names, calculating
+        and storing them with `compute()` (returning a dictionary) if not
+        cached.
+        """
+        arrays = self.load(key, names)
+        if arrays is not None:
+            return arrays
+        with self.lock():
+            arrays = self.load(key, names)  # Stored by other process?
+            if arrays is not None:
+                return arrays
+            arrays = compute()
+            if self.store(key, arrays) is True:
+                return self.load(key, names) or arrays
+        return arrays
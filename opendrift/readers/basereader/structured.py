@@ -1,3 +1,5 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pyproj
 from scipy.ndimage import map_coordinates
@@ -5,6 +7,7 @@ from abc import abstractmethod
 
 from opendrift.readers.interpolation.structured import ReaderBlock
 from .variables import Variables
+from .blockcache import BlockCache, block_nbytes
 
 import logging
 logger = logging.getLogger(__name__)
@@ -32,6 +35,14 @@ class StructuredReader(Variables):
     y = None
     interpolation = 'linearNDFast'
     convolve = None  # Convolution kernel or kernel size
+    prefetch = False  # Read next time block in background, see `set_prefetch`
+    block_cache_size = 0  # Memory budget (bytes) of block cache, 0 disables
+    disk_cache = None  # Persistent cache of read data, see `set_disk_cache`
+    disk_cache_tile = 32  # Horizontal windows of disk cache snapped to pixels
+    disk_cache_z_step = 50  # Vertical windows of disk cache snapped to meters
+    adaptive_buffer = False  # Buffer from spreading of elements, see `set_adaptive_buffer`
+    adaptive_buffer_window = 10  # Number of recent times used for spreading speed
+    adaptive_buffer_retries = 3  # Maximum times to read again a block not covering
 
     # Used to enable and track status of parallel coordinate transformations.
     __lonlat2xy_parallel__ = None
@@ -87,8 +98,16 @@ class StructuredReader(Variables):
         super().__init__()
 
         # Dictionaries to store blocks of data for reuse (buffering)
-        self.var_block_before = {}  # Data for last timestep before present
-        self.var_block_after = {}  # Data for first timestep after present
+        self.var_block_before = {}  # Block of each variable before present
+        self.var_block_after = {}  # Block of each variable after present
+        # Least recently used blocks, kept also between simulations
+        self.block_cache = BlockCache(self.block_cache_size)
+
+        self.__init_prefetch__()
+
+        # Spreading of requested positions, for adaptive buffer
+        self.__buffer_extent__ = None
+        self.__buffer_rates__ = []
 
     @abstractmethod
     def get_variables(self, variables, time=None, x=None, y=None, z=None):
@@ -119,6 +138,9 @@ class StructuredReader(Variables):
         logger.debug('Clearing cache for reader %s before starting new simulation' % self.name)
         self.var_block_before = {}
         self.var_block_after = {}
+        self.__clear_prefetch__()
+        self.__buffer_extent__ = None
+        self.__buffer_rates__ = []
         if self.time_step is None:  # Set buffer large nough for whole simulation
                 logger.debug('Time step is None for %s, setting buffer size large nough for whole simulation' % self.name)
                 self.set_buffer_size(max_speed, end_time-start_time)
@@ -127,6 +149,330 @@ class StructuredReader(Variables):
     def set_convolution_kernel(self, convolve):
         """Set a convolution kernel or kernel size (of array of ones) used by `get_variables` on read variables."""
         self.convolve = convolve
+        self.block_cache.clear()
+
+    def set_block_cache_size(self, max_bytes):
+        """
+        Set memory budget (bytes) for cache of previously read data blocks.
+
+        Blocks are cached with key (variables, time, spatial window), and the
+        least recently used blocks are evicted when exceeding the budget.
+        The cache is kept between simulations, so that e.g. repeated or
+        backwards runs do not read the same data again. Number of cache
+        hits and misses are reported by `performance()`.
+        """
+        self.block_cache_size = max_bytes
+        self.block_cache.max_bytes = max_bytes
+        if max_bytes <= 0:
+            self.block_cache.clear()
+
+    def set_prefetch(self, prefetch=True):
+        """
+        Enable or disable reading of the next reader time step in a background thread.
+
+        When enabled, the block for the reader time following the present
+        `time_after` (or preceding `time_before` for backwards runs) is read
+        while the simulation is stepping, covering the bounding box of the
+        latest requested positions plus `buffer`. Reads from the same reader
+        are serialised with a lock, as netCDF libraries are not thread safe.
+        """
+        self.prefetch = prefetch
+        if prefetch is True and self.__prefetch_executor__ is None:
+            self.__prefetch_executor__ = ThreadPoolExecutor(max_workers=1)
+        elif prefetch is False:
+            self.__clear_prefetch__()
+            if self.__prefetch_executor__ is not None:
+                self.__prefetch_executor__.shutdown(wait=False)
+                self.__prefetch_executor__ = None
+
+    def set_adaptive_buffer(self, adaptive=True):
+        """
+        Adapt buffer size to the observed spreading of elements.
+
+        The buffer from `set_buffer_size` assumes the maximum anticipated
+        speed of any element, and may give much larger blocks than needed,
+        e.g. for slow deep particles. When enabled, the buffer is instead
+        calculated from the fastest outwards movement of the bounding box of
+        requested positions over the last `adaptive_buffer_window` times,
+        covering two reader time steps, as the after-block is reused as
+        before-block. Blocks which are found to not cover the positions are
+        read again, and the buffer is doubled, instead of extrapolating.
+        Number of bytes read, blocks read again and buffer changes are
+        reported by `performance()`.
+        """
+        if adaptive is True and (self.delta_x is None or self.delta_y is None):
+            raise ValueError('Adaptive buffer is only available for readers '
+                             'with regular grid spacing')
+        self.adaptive_buffer = adaptive
+        self.__buffer_extent__ = None
+        self.__buffer_rates__ = []
+
+    def __max_buffer__(self):
+        """Buffer (pixels) large enough to cover the whole grid."""
+        return int(np.ceil(max((self.xmax - self.xmin) / self.delta_x,
+                               (self.ymax - self.ymin) / self.delta_y))) + 1
+
+    def __set_adapted_buffer__(self, buffer):
+        buffer = min(buffer, self.__max_buffer__())
+        if buffer == self.buffer:
+            return
+        logger.debug('Changing buffer size of %s from %s to %i' %
+                     (self.name, self.buffer, buffer))
+        if buffer > self.buffer:
+            self.counter_increment('buffer increases')
+        else:
+            self.counter_increment('buffer decreases')
+        self.buffer = buffer
+
+    def __adapt_buffer__(self, time, x, y):
+        """Set buffer from outwards speed of bounding box of positions."""
+        if len(x) == 0:
+            return
+        ix = np.asarray(x) / self.delta_x
+        iy = np.asarray(y) / self.delta_y
+        # Negative minimum, so that outwards is positive for all sides
+        extent = np.array([-np.nanmin(ix), np.nanmax(ix),
+                           -np.nanmin(iy), np.nanmax(iy)])
+        previous = self.__buffer_extent__
+        if previous is not None and previous[0] == time:
+            # Union of positions requested for same time
+            self.__buffer_extent__ = (time, np.maximum(previous[1], extent))
+            return
+        self.__buffer_extent__ = (time, extent)
+        if previous is None or self.time_step is None:
+            return
+        seconds = abs((time - previous[0]).total_seconds())
+        # Largest outwards movement (pixels) of any side of bounding box
+        growth = max(np.nanmax(extent - previous[1]), 0)
+        self.__buffer_rates__ = (self.__buffer_rates__ + [growth / seconds]
+                                 )[-self.adaptive_buffer_window:]
+        span = 2 * self.time_step.total_seconds()
+        self.__set_adapted_buffer__(
+            int(np.ceil(max(self.__buffer_rates__) * span)) + 2)
+
+    def __uncovered_variables__(self, blocks, x, y):
+        """Variables with block not covering the positions within grid."""
+        dx = self.clipped * self.delta_x
+        dy = self.clipped * self.delta_y
+        inside = (x >= self.xmin + dx) & (x <= self.xmax - dx) & \
+                 (y >= self.ymin + dy) & (y <= self.ymax - dy)
+        x, y = x[inside], y[inside]
+        return [v for v in blocks if blocks[v].covers_positions(x, y) is False]
+
+    def set_disk_cache(self, cache_dir, max_bytes=None, source=None):
+        """
+        Store data read from this reader in a persistent cache on disk.
+
+        Mainly intended for remote datasets (OPeNDAP/thredds), where later
+        simulations, or other processes using the same cache directory,
+        will read from local disk instead of from the server. To increase
+        reuse, requested windows are expanded to multiples of
+        `disk_cache_tile` pixels horizontally and `disk_cache_z_step`
+        meters vertically.
+
+        Args:
+            cache_dir: directory of cache, may be shared between processes.
+            max_bytes: maximum total size of cache, None for no limit.
+            source: identifier of dataset (e.g. URL), default is reader name.
+        """
+        from .diskcache import DiskBlockCache
+        if cache_dir is None:
+            self.disk_cache = None
+            return
+        if self.delta_x is None or self.delta_y is None:
+            raise ValueError('Disk cache is only available for readers '
+                             'with regular grid spacing')
+        if source is None:
+            source = self.name
+        self.disk_cache_source = (type(self).__module__, source,
+                                  str(self.start_time), str(self.end_time))
+        self.disk_cache = DiskBlockCache(cache_dir, max_bytes)
+
+    def __disk_cache_window__(self, x, y, z):
+        """Expand request to tile-aligned window, returning new corners and key."""
+        tile = self.disk_cache_tile
+        ixmax = int(np.round((self.xmax - self.xmin) / self.delta_x))
+        iymax = int(np.round((self.ymax - self.ymin) / self.delta_y))
+        ix = (np.asarray(x) - self.xmin) / self.delta_x
+        iy = (np.asarray(y) - self.ymin) / self.delta_y
+        ix0 = int(np.clip(np.floor(np.nanmin(ix) / tile) * tile, 0, ixmax))
+        ix1 = int(np.clip(np.ceil(np.nanmax(ix) / tile) * tile, 0, ixmax))
+        iy0 = int(np.clip(np.floor(np.nanmin(iy) / tile) * tile, 0, iymax))
+        iy1 = int(np.clip(np.ceil(np.nanmax(iy) / tile) * tile, 0, iymax))
+        # Requesting all pixels of window, as some readers (e.g. ROMS)
+        # select vertical layers from the requested positions
+        x, y = np.meshgrid(self.xmin + np.arange(ix0, ix1 + 1) * self.delta_x,
+                           self.ymin + np.arange(iy0, iy1 + 1) * self.delta_y)
+        x, y = x.ravel(), y.ravel()
+        zwindow = None
+        if z is not None:
+            step = self.disk_cache_z_step
+            z = np.atleast_1d(z)
+            zwindow = (np.floor(np.nanmin(z) / step) * step,
+                       np.ceil(np.nanmax(z) / step) * step)
+            z = np.repeat(zwindow, len(x))
+            x, y = np.tile(x, 2), np.tile(y, 2)
+        window = (ix0, ix1, iy0, iy1, zwindow, self.buffer, self.clipped)
+        return x, y, z, window
+
+    def __read_disk_cached__(self, variables, time, x, y, z):
+        """Read variables from disk cache, and the missing ones from reader."""
+        x, y, z, window = self.__disk_cache_window__(x, y, z)
+        data = {}
+        keys = {}
+        missing = []
+        for var in variables:
+            keys[var] = self.disk_cache.key(self.disk_cache_source, var,
+                                            str(time), window)
+            cached = self.disk_cache.load(keys[var])
+            if cached is None:
+                missing.append(var)
+            else:
+                data.update(cached)
+        if len(missing) < len(variables):
+            self.counter_increment('disk cache hits',
+                                   len(variables) - len(missing))
+        if len(missing) > 0:
+            self.counter_increment('disk cache misses', len(missing))
+            logger.debug('Reading %s from %s, storing to disk cache' %
+                         (missing, self.name))
+            read = self.get_variables(missing, time, x, y, z)
+            for var in missing:
+                self.disk_cache.store(keys[var], var, read)
+            self.disk_cache.evict()
+            data.update(read)
+        data['time'] = time
+        return data
+
+    def __clear_prefetch__(self):
+        """Cancel and forget any blocks being read in background."""
+        for future in self.__prefetch_futures__.values():
+            future.cancel()
+        self.__prefetch_futures__ = {}
+        self.__prefetch_last_time__ = None
+
+    def __init_prefetch__(self):
+        """Initialise state of background reading, without any thread."""
+        # Blocks being read in background, keyed by (blockvars, time)
+        self.__prefetch_futures__ = {}
+        # Thread is started by set_prefetch
+        self.__prefetch_executor__ = None
+        self.__prefetch_last_time__ = None
+        # Serialising reads from prefetch thread and main thread
+        self.__fetch_lock__ = threading.Lock()
+
+    def __getstate__(self):
+        # Thread and lock can not be copied or pickled
+        state = self.__dict__.copy()
+        for key in ['__prefetch_futures__', '__prefetch_executor__',
+                    '__prefetch_last_time__', '__fetch_lock__']:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__init_prefetch__()
+
+    def __read_block__(self, variables, time, x, y, z):
+        """Read and convolve data from reader, and store in a ReaderBlock."""
+        with self.__fetch_lock__:
+            if self.disk_cache is not None:
+                reader_data_dict = self.__read_disk_cached__(
+                    list(variables), time, x, y, z)
+            else:
+                reader_data_dict = self.get_variables(variables, time, x, y, z)
+        reader_data_dict = self.__convolve_block__(reader_data_dict)
+        block = ReaderBlock(reader_data_dict,
+                            interpolation_horizontal=self.interpolation)
+        self.counter_increment('bytes read', block_nbytes(block))
+        return block
+
+    def __get_block__(self, blockvars, variables, time, x, y, z):
+        """Return block from background read if available, else read now."""
+        future = self.__prefetch_futures__.pop((blockvars, time), None)
+        if future is not None and not future.cancelled():
+            self.timer_start('reading prefetched')
+            try:
+                block = future.result()
+            except Exception as e:
+                logger.warning('Prefetching of %s at %s failed, reading '
+                               'again: %s' % (blockvars, time, e))
+                block = None
+            self.timer_end('reading prefetched')
+            if block is not None:
+                logger.debug('Using prefetched block for time %s' % time)
+                self.block_cache.put(blockvars, time, block)
+                return block
+
+        if self.block_cache.max_bytes > 0:
+            block = self.block_cache.get(
+                blockvars, time,
+                lambda b: self.__block_covers__(b, x, y, z))
+            if block is not None:
+                logger.debug('Using cached block for time %s' % time)
+                self.counter_increment('block cache hits')
+                return block
+            self.counter_increment('block cache misses')
+
+        block = self.__read_block__(variables, time, x, y, z)
+        self.block_cache.put(blockvars, time, block)
+        return block
+
+    def __block_covers__(self, block, x, y, z):
+        """Check if block covers positions, also vertically if several layers."""
+        if block.covers_positions(x, y) is False:
+            return False
+        if z is None or block.z is None or np.ndim(block.z) != 1 or \
+                len(block.z) < 2:
+            return True
+        # Layers at the end of reader vertical range covers everything beyond
+        reader_z = np.atleast_1d(self.z) if getattr(self, 'z', None) \
+            is not None else block.z
+        z = np.atleast_1d(z)
+        if z.min() < block.z.min() and block.z.min() > np.min(reader_z):
+            return False
+        if z.max() > block.z.max() and block.z.max() < np.max(reader_z):
+            return False
+        return True
+
+    def __neighbour_time__(self, time, forward=True):
+        """Return reader time after (or before) the given reader time, or None."""
+        if self.times is not None:
+            try:
+                indx = list(self.times).index(time)
+            except ValueError:
+                return None
+            indx = indx + 1 if forward is True else indx - 1
+            if indx < 0 or indx >= len(self.times):
+                return None
+            return self.times[indx]
+        if self.time_step is None:
+            return None
+        if forward is True:
+            neighbour = time + self.time_step
+            if self.end_time is not None and neighbour > self.end_time:
+                return None
+        else:
+            neighbour = time - self.time_step
+            if self.start_time is not None and neighbour < self.start_time:
+                return None
+        return neighbour
+
+    def __submit_prefetch__(self, blockvars, variables, time, x, y, z):
+        """Start background reading of block for given time."""
+        if time is None or (blockvars, time) in self.__prefetch_futures__:
+            return
+        # Forget blocks for other times, which will not be needed
+        for key in list(self.__prefetch_futures__):
+            if key[0] == blockvars:
+                self.__prefetch_futures__.pop(key).cancel()
+        logger.debug('Prefetching %s for time %s' % (blockvars, time))
+        if self.__prefetch_executor__ is None:
+            self.set_prefetch(True)
+        self.__prefetch_futures__[(blockvars, time)] = \
+            self.__prefetch_executor__.submit(
+                self.__read_block__, list(variables), time,
+                np.copy(x), np.copy(y), np.copy(z))
 
     def __convolve_block__(self, env):
         """
@@ -192,6 +538,10 @@ class StructuredReader(Variables):
                                       for v in variables):
             time_after = None
 
+        if self.adaptive_buffer is True and not all(v in static_variables
+                                                    for v in variables):
+            self.__adapt_buffer__(time, reader_x, reader_y)
+
         if profiles is not None:
             # If profiles are requested for any parameters, we
             # add two fake points at the end of array to make sure that the
@@ -204,105 +554,123 @@ class StructuredReader(Variables):
             my = reader_y
             mz = z
 
-        block_before = block_after = None
-        blockvariables_before = variables
-        blockvars_before = str(variables)
-        blockvariables_after = variables
-        blockvars_after = str(variables)
-        for blockvars in self.var_block_before:
-            if all(v in blockvars for v in variables):
-                block_before = self.var_block_before[blockvars]
-                blockvariables_before = block_before.data_dict.keys()
-                blockvars_before = blockvars
-                break
-            blockvariables_before = variables
-            blockvars_before = str(variables)
-        for blockvars in self.var_block_after:
-            if all(v in blockvars for v in variables):
-                block_after = self.var_block_after[blockvars]
-                blockvariables_after = block_after.data_dict.keys()
-                blockvars_after = blockvars
-                break
-
-        # Swap before- and after-blocks if matching times
-        if block_before is not None and block_after is not None:
-            if block_before.time != time_before:
-                if block_after.time == time_before:
-                    block_before = block_after
-                    self.var_block_before[blockvars_before] = block_before
-            if block_after.time != time_after:
-                if block_before.time == time_before:
-                    block_after = block_before
-                    self.var_block_after[blockvars_after] = block_after
+        # Blocks are stored per variable, and only the variables which are
+        # not already available for the actual times are read from reader
+        blocks_before = {}
+        blocks_after = {}
+        for var in variables:
+            block_before = self.var_block_before.get(var)
+            block_after = self.var_block_after.get(var)
+            # Swap before- and after-blocks if matching times
+            if block_before is not None and block_after is not None:
+                if block_before.time != time_before:
+                    if block_after.time == time_before:
+                        block_before = block_after
+                        self.var_block_before[var] = block_before
+                if block_after.time != time_after:
+                    if block_before.time == time_before:
+                        block_after = block_before
+                        self.var_block_after[var] = block_after
+                    elif time_after is not None and \
+                            block_before.time == time_after:
+                        # Backwards in time
+                        block_after = block_before
+                        self.var_block_after[var] = block_after
+            if block_before is not None and block_before.time != time_before:
+                block_before = None
+            if block_after is not None and block_after.time != time_after:
+                block_after = None
+            if profiles is not None and var in profiles:
+                # Blocks must cover the depth range of profiles
+                if block_before is not None and not self.__block_covers__(
+                        block_before, mx, my, mz):
+                    block_before = None
+                if block_after is not None and not self.__block_covers__(
+                        block_after, mx, my, mz):
+                    block_after = None
+            blocks_before[var] = block_before
+            blocks_after[var] = block_after
 
         # Fetch data, if no buffer is available
-        if block_before is None or \
-                block_before.time != time_before:
-            reader_data_dict = \
-                    self.__convolve_block__(
-                self.get_variables(blockvariables_before, time_before,
-                                    mx, my, mz)
-                )
-            self.var_block_before[blockvars_before] = \
-                ReaderBlock(reader_data_dict,
-                            interpolation_horizontal=self.interpolation)
-            try:
-                len_z = len(self.var_block_before[blockvars_before].z)
-            except:
-                len_z = 1
-            logger.debug(
-                ('Fetched env-block (size %ix%ix%i) ' + 'for time before (%s)')
-                % (len(self.var_block_before[blockvars_before].x),
-                   len(self.var_block_before[blockvars_before].y), len_z,
-                   time_before))
-            block_before = self.var_block_before[blockvars_before]
-        if block_after is None or block_after.time != time_after:
+        blocks_before = self.__fetch_missing_blocks__(
+            blocks_before, self.var_block_before, profiles, time_before,
+            mx, my, mz, 'before')
+        if time_after is None:
+            blocks_after = blocks_before
+            self.var_block_after.update(blocks_before)
+        else:
+            blocks_after = self.__fetch_missing_blocks__(
+                blocks_after, self.var_block_after, profiles, time_after,
+                mx, my, mz, 'after')
+
+        # Read again blocks not covering elements, with larger buffer
+        for attempt in range(self.adaptive_buffer_retries
+                             if self.adaptive_buffer is True else 0):
+            uncovered_before = self.__uncovered_variables__(
+                blocks_before, reader_x, reader_y)
+            uncovered_after = self.__uncovered_variables__(
+                blocks_after, reader_x, reader_y)
+            if len(uncovered_before) + len(uncovered_after) == 0:
+                break
+            self.counter_increment('blocks re-read', len(
+                set(id(blocks_before[v]) for v in uncovered_before) |
+                set(id(blocks_after[v]) for v in uncovered_after)))
+            self.__set_adapted_buffer__(
+                max(2 * self.buffer, self.buffer + 2))
+            for v in uncovered_before:
+                blocks_before[v] = None
+            blocks_before = self.__fetch_missing_blocks__(
+                blocks_before, self.var_block_before, profiles,
+                time_before, mx, my, mz, 'before')
             if time_after is None:
-                self.var_block_after[blockvars_after] = block_before
+                blocks_after = blocks_before
+                self.var_block_after.update(blocks_before)
+            else:
+                for v in uncovered_after:
+                    blocks_after[v] = None
+                blocks_after = self.__fetch_missing_blocks__(
+                    blocks_after, self.var_block_after, profiles,
+                    time_after, mx, my, mz, 'after')
+
+        # Start reading the next block in background
+        if self.prefetch is True and not all(v in static_variables
+                                             for v in variables):
+            forward = self.__prefetch_last_time__ is None or \
+                time >= self.__prefetch_last_time__
+            self.__prefetch_last_time__ = time
+            if forward is True:
+                next_time = self.__neighbour_time__(time_after or time_before)
             else:
-                reader_data_dict = self.__convolve_block__(
-                    self.get_variables(blockvariables_after, time_after, mx,
-                                       my, mz))
-                self.var_block_after[blockvars_after] = \
-                    ReaderBlock(
-                        reader_data_dict,
-                        interpolation_horizontal=self.interpolation)
-                try:
-                    len_z = len(self.var_block_after[blockvars_after].z)
-                except:
-                    len_z = 1
-
-                logger.debug(('Fetched env-block (size %ix%ix%i) ' +
-                              'for time after (%s)') %
-                             (len(self.var_block_after[blockvars_after].x),
-                              len(self.var_block_after[blockvars_after].y),
-                              len_z, time_after))
-                block_after = self.var_block_after[blockvars_after]
-
-        if (block_before is not None and block_before.covers_positions(
-            reader_x, reader_y) is False) or (\
-            block_after is not None and block_after.covers_positions(
-                reader_x, reader_y) is False):
-            logger.warning('Data block from %s not large enough to '
-                           'cover element positions within timestep. '
-                           'Buffer size (%s) must be increased. See `Variables.set_buffer_size`.' %
-                           (self.name, str(self.buffer)))
-            # TODO; could add dynamic incraes of buffer size here
+                next_time = self.__neighbour_time__(time_before, forward=False)
+            self.__submit_prefetch__(tuple(sorted(variables)), variables,
+                                     next_time, mx, my, mz)
+
+        for block in set(blocks_before.values()) | set(blocks_after.values()):
+            if block.covers_positions(reader_x, reader_y) is False:
+                logger.warning('Data block from %s not large enough to '
+                               'cover element positions within timestep. '
+                               'Buffer size (%s) must be increased. See `Variables.set_buffer_size` '
+                               'and `StructuredReader.set_adaptive_buffer`.' %
+                               (self.name, str(self.buffer)))
+                break
 
         ############################################################
         # Interpolate before/after blocks onto particles in space
         ############################################################
         self.timer_start('interpolation')
         logger.debug('Interpolating before (%s) in space  (%s)' %
-                     (block_before.time, self.interpolation))
-        env_before, env_profiles_before = block_before.interpolate(
-            reader_x, reader_y, z, variables, profiles, profiles_depth)
+                     (time_before, self.interpolation))
+        env_before, env_profiles_before, interpolated = \
+            self.__interpolate_blocks__(blocks_before, reader_x, reader_y, z,
+                                        variables, profiles, profiles_depth)
 
         if (time_after is not None) and (time_before != time):
             logger.debug('Interpolating after (%s) in space  (%s)' %
-                         (block_after.time, self.interpolation))
-            env_after, env_profiles_after = block_after.interpolate(
-                reader_x, reader_y, z, variables, profiles, profiles_depth)
+                         (time_after, self.interpolation))
+            env_after, env_profiles_after, interpolated = \
+                self.__interpolate_blocks__(
+                    blocks_after, reader_x, reader_y, z, variables,
+                    profiles, profiles_depth, interpolated)
 
         self.timer_end('interpolation')
 
@@ -316,8 +684,8 @@ class StructuredReader(Variables):
                             (time_after - time_before).total_seconds())
             logger.debug(('Interpolating before (%s, weight %.2f) and'
                           '\n\t\t      after (%s, weight %.2f) in time') %
-                         (block_before.time, 1 - weight_after,
-                          block_after.time, weight_after))
+                         (time_before, 1 - weight_after,
+                          time_after, weight_after))
             env = {}
             for var in variables:
                 # Weighting together, and masking invalid entries
@@ -361,6 +729,76 @@ class StructuredReader(Variables):
 
         return env, env_profiles
 
+    def __fetch_missing_blocks__(self, blocks, var_blocks, profiles, time,
+                                 x, y, z, label):
+        """
+        Read the variables without a valid block, as one block.
+
+        Variables of vertical profiles are read together if found in
+        different blocks, to ensure same vertical levels.
+        """
+        if profiles is not None:
+            profile_blocks = set(id(blocks[v]) for v in blocks
+                                 if v in profiles)
+            if len(profile_blocks) > 1:
+                for v in blocks:
+                    if v in profiles:
+                        blocks[v] = None
+        missing = [v for v in blocks if blocks[v] is None]
+        if len(missing) == 0:
+            return blocks
+
+        block = self.__get_block__(tuple(sorted(missing)), missing,
+                                   time, x, y, z)
+        try:
+            len_z = len(block.z)
+        except:
+            len_z = 1
+        logger.debug(('Fetched env-block (size %ix%ix%i) ' +
+                      'for time %s (%s) with %s') %
+                     (len(block.x), len(block.y), len_z, label, time,
+                      missing))
+        for v in block.data_dict:
+            var_blocks[v] = block
+        for v in missing:
+            blocks[v] = block
+        return blocks
+
+    def __interpolate_blocks__(self, blocks, x, y, z, variables, profiles,
+                               profiles_depth, interpolated=()):
+        """
+        Interpolate variables from their respective blocks.
+
+        Interpolators are reused between blocks with same grid, also from
+        the `interpolated` blocks, which must be interpolated onto the same
+        positions.
+        """
+        interpolated = list(interpolated)
+        env = {}
+        env_profiles = None
+        unique_blocks = []
+        for var in variables:
+            if not any(blocks[var] is b for b in unique_blocks):
+                unique_blocks.append(blocks[var])
+        for block in unique_blocks:
+            blockvars = [v for v in variables if blocks[v] is block]
+            reuse_from = None
+            for other in interpolated:
+                if block.same_grid(other) and \
+                        hasattr(other, 'interpolator2d'):
+                    reuse_from = other
+                    break
+            # Copy, as vertical interpolators truncate z to block range
+            env_block, env_profiles_block = block.interpolate(
+                x, y, None if z is None else np.copy(z), blockvars, profiles, profiles_depth,
+                reuse_from=reuse_from)
+            interpolated.append(block)
+            env.update(env_block)
+            if env_profiles is None or (profiles is not None and any(
+                    v in profiles for v in blockvars)):
+                env_profiles = env_profiles_block
+        return env, env_profiles, interpolated
+
     def __check_env_arrays__(self, env):
         """
         For the StructuredReader the variables are checked before entered into
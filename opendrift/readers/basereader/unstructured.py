@@ -40,9 +40,30 @@ class UnstructuredReader(Variables):
     face_variables = None # list of std-name variables defined at center of faces
     faces_idx = None
 
+    # triangles, for interpolation within faces
+    interpolator = None
+
+    # Fraction of requested range of columns (nodes or faces) which is
+    # read in addition on each side of blocks
+    block_margin = .1
+
+    # Only the requested columns are read, if their range is larger than
+    # this times their number (e.g. for meshes with scattered numbering)
+    block_sparse_ratio = 4
+
+    # Whether values are interpolated linearly in time between values from
+    # get_variables at times before and after. Readers using _get_block_,
+    # which keeps data of both times, may set this to True.
+    interpolate_time = False
+
     def __init__(self):
         super().__init__()
 
+        # Blocks of each variable before and after present time, see
+        # _get_block_
+        self.var_block_before = {}
+        self.var_block_after = {}
+
     @abstractmethod
     def get_variables(self, variables, time=None, x=None, y=None, z=None):
         """
@@ -58,12 +79,41 @@ class UnstructuredReader(Variables):
                                    profiles_depth, time,
                                    reader_x, reader_y, z):
 
-        env = self.get_variables(variables, time, reader_x, reader_y, z)
+        time_nearest, time_before, time_after, i1, i2, i3 = \
+            self.nearest_time(time)
+
+        # For variables which are not time dependent, we do not care about time
+        static_variables = [
+            'sea_floor_depth_below_sea_level', 'land_binary_mask'
+        ]
+        if self.interpolate_time is False or time == time_before or \
+                time_before is None or all(v in static_variables
+                                           for v in variables):
+            time_after = None
+
+        if time_after is None:
+            env = self.get_variables(variables, time, reader_x, reader_y, z)
+            logger.debug('Fetched env-before')
+        else:
+            # Data of nearest times are kept in blocks, see _get_block_
+            env_before = self.get_variables(variables, time_before,
+                                            reader_x, reader_y, z)
+            logger.debug('Fetched env-before')
+            env_after = self.get_variables(variables, time_after,
+                                           reader_x, reader_y, z)
+            logger.debug('Fetched env-after')
+            weight_after = ((time - time_before).total_seconds() /
+                            (time_after - time_before).total_seconds())
+            logger.debug(('Interpolating before (%s, weight %.2f) and'
+                          '\n\t\t      after (%s, weight %.2f) in time') %
+                         (time_before, 1 - weight_after,
+                          time_after, weight_after))
+            env = {}
+            for var in variables:
+                env[var] = np.ma.masked_invalid(
+                    env_before[var] * (1 - weight_after) +
+                    env_after[var] * weight_after)
 
-        # We probably have to use an UnstructuredBlock to store closest time-steps, and thus avoid fetching
-        # more data on every call.
-
-        logger.debug('Fetched env-before')
         env_profiles = None
         if profiles is not None:
             # Copying data from environment to vertical profiles
@@ -73,6 +123,66 @@ class UnstructuredReader(Variables):
 
         return env, env_profiles
 
+    def _get_block_(self, var, time, columns, read):
+        """
+        Return an UnstructuredBlock of variable at time, covering given columns
+        (nodes or faces).
+
+        The blocks of the two most recent times are kept for each variable
+        (as var_block_before and var_block_after), and reused if covering the
+        columns. Otherwise the range of columns, extended by `block_margin`, is
+        read with `read(slice(start, stop))`, and the block of the time
+        nearest to the new block is kept. If the range is larger than
+        `block_sparse_ratio` times the number of columns, only the columns
+        are read, with `read(columns)`.
+
+        Arguments:
+            var: name of variable
+            time: time of data, or None for variables not depending on time.
+            columns: ndarray of columns (ids) needed
+            read: function returning data of columns given by a slice or
+                sorted array, with columns along last dimension.
+        """
+        from opendrift.readers.interpolation.unstructured import \
+            UnstructuredBlock
+        before = self.var_block_before.get(var)
+        after = self.var_block_after.get(var)
+        for block in (before, after):
+            if block is not None and block.time == time and \
+                    block.covers(columns):
+                return block
+
+        unique = np.unique(columns)
+        if unique[-1] - unique[0] + 1 > self.block_sparse_ratio * len(unique):
+            block = UnstructuredBlock(time, read(unique), columns=unique)
+        else:
+            margin = int(self.block_margin * (unique[-1] - unique[0]))
+            start = max(unique[0] - margin, 0)
+            block = UnstructuredBlock(
+                time, read(slice(start, unique[-1] + 1 + margin)), start)
+        logger.debug('Read block of %s with %i columns' %
+                     (var, block.data.shape[-1]))
+        self.counter_increment('blocks read')
+
+        # Keeping the other block with time nearest to the new block
+        keep = None
+        if time is not None:
+            others = [b for b in (before, after)
+                      if b is not None and b.time is not None and
+                      b.time != time]
+            if len(others) > 0:
+                keep = min(others, key=lambda b: abs(b.time - time))
+        if keep is None:
+            self.var_block_before[var] = block
+            self.var_block_after[var] = block
+        elif keep.time < time:
+            self.var_block_before[var] = keep
+            self.var_block_after[var] = block
+        else:
+            self.var_block_before[var] = block
+            self.var_block_after[var] = keep
+        return block
+
     def _build_boundary_polygon_(self, x, y):
         """
         Build a polygon of the boundary of the mesh.
@@ -173,6 +283,23 @@ class UnstructuredReader(Variables):
         """
         return [idx.nearest((x, y, x, y), objects = False) for x, y in zip(x, y)]
 
+    def _build_interpolator_(self, triangles, neighbours=None):
+        """
+        Prepare barycentric interpolation within the triangles (faces) of
+        the mesh, see :class:`opendrift.readers.interpolation.unstructured.TriangleInterpolator`.
+        """
+        from opendrift.readers.interpolation.unstructured import \
+            TriangleInterpolator
+        self.interpolator = TriangleInterpolator(self.x, self.y, triangles,
+                                                 neighbours)
+
+    def _locate_(self, x, y):
+        """
+        Return containing face (id), surrounding nodes (ids) and their
+        barycentric weights for x and y
+        """
+        return self.interpolator.locate(x, y)
+
     def _nearest_node_(self, x, y):
         """
         Return nearest node (id) for x and y
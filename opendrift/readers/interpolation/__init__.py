@@ -1,3 +1,4 @@
 from .interpolators import *
 from .structured import ReaderBlock
+from .unstructured import TriangleInterpolator, UnstructuredBlock
 
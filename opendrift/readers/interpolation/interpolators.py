@@ -25,6 +25,8 @@ def expand_numpy_array(data):
 
 class Nearest2DInterpolator():
 
+    multilayer = True  # May interpolate 3D arrays with all layers at once
+
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
         self.y = y
@@ -36,7 +38,7 @@ class Nearest2DInterpolator():
         self.yi[self.yi >= len(ygrid)] = len(ygrid)-1
 
     def __call__(self, array2d):
-        return array2d[self.yi, self.xi]
+        return array2d[..., self.yi, self.xi]
 
 
 class NDImage2DInterpolator():
@@ -107,6 +109,7 @@ class LinearND2DInterpolator():
 class Linear2DInterpolator():
 
     logger = logging.getLogger('opendrift')
+    multilayer = True  # May interpolate 3D arrays with all layers at once
 
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
@@ -114,17 +117,55 @@ class Linear2DInterpolator():
         self.xi = (x - xgrid[0])/(xgrid[-1]-xgrid[0])*(len(xgrid)-1)
         self.yi = (y - ygrid[0])/(ygrid[-1]-ygrid[0])*(len(ygrid)-1)
 
+        # Indices of lower left grid point, and bilinear weights, which
+        # are reused for all variables and layers. Positions outside grid
+        # are given NaN, as with map_coordinates(cval=np.nan, order=1)
+        self.outside = ~((self.xi >= 0) & (self.xi <= len(xgrid) - 1) &
+                         (self.yi >= 0) & (self.yi <= len(ygrid) - 1))
+        self.i0 = np.clip(np.floor(np.nan_to_num(self.xi)).astype(np.intp),
+                          0, np.maximum(len(xgrid) - 2, 0))
+        self.j0 = np.clip(np.floor(np.nan_to_num(self.yi)).astype(np.intp),
+                          0, np.maximum(len(ygrid) - 2, 0))
+        self.i1 = np.minimum(self.i0 + 1, len(xgrid) - 1)
+        self.j1 = np.minimum(self.j0 + 1, len(ygrid) - 1)
+        wx = self.xi - self.i0
+        wy = self.yi - self.j0
+        self.w00 = (1 - wx)*(1 - wy)
+        self.w01 = wx*(1 - wy)
+        self.w10 = (1 - wx)*wy
+        self.w11 = wx*wy
+
+    def _bilinear(self, array):
+        """Bilinear interpolation of last two dimensions, for all layers at once."""
+        interp = (array[..., self.j0, self.i0]*self.w00 +
+                  array[..., self.j0, self.i1]*self.w01 +
+                  array[..., self.j1, self.i0]*self.w10 +
+                  array[..., self.j1, self.i1]*self.w11)
+        interp[..., self.outside] = np.nan
+        if array.dtype.kind == 'f':
+            interp = interp.astype(array.dtype, copy=False)  # as map_coordinates
+        return interp
+
     def __call__(self, array2d):
         if isinstance(array2d,np.ma.MaskedArray):
             logger.debug('Converting masked array to numpy array for interpolation')
             array2d = np.ma.filled(array2d, fill_value=np.nan)
+        if array2d.ndim == 3:
+            # All layers are interpolated in one operation, and layers
+            # with missing values are afterwards filled one by one
+            interp = self._bilinear(array2d)
+            for layer in np.where(~np.isfinite(interp).all(axis=1))[0]:
+                interp[layer, :] = self._fill_missing(array2d[layer, :, :],
+                                                      interp[layer, :])
+            return interp
+
+        return self._fill_missing(array2d, self._bilinear(array2d))
+
+    def _fill_missing(self, array2d, interp):
+        """Fill NaN-values with nearby real values"""
         if not np.isfinite(array2d).any():
             logger.warning('Only NaNs input to linearNDFast - returning')
             return np.nan*np.ones(len(self.xi))
-
-        # Fill NaN-values with nearby real values
-        interp = map_coordinates(array2d, [self.yi, self.xi],
-                                 cval=np.nan, order=1)
         missing = np.where(~np.isfinite(interp))[0]
         i=0
         while len(missing) > 0:
@@ -81,20 +81,57 @@ class ReaderBlock():
         self.interpolator2d = self.Interpolator2DClass(self.x, self.y, x, y)
         if self.z is not None and len(np.atleast_1d(self.z)) > 1:
             self.interpolator1d = self.Interpolator1DClass(self.z, z)
+        self.interpolator2d_nearest = None
+
+    def same_grid(self, other):
+        """Check if other block has same grid and interpolation methods."""
+        if other is None or other is self:
+            return other is self
+        if self.Interpolator2DClass is not other.Interpolator2DClass or \
+                self.Interpolator1DClass is not other.Interpolator1DClass:
+            return False
+        if self.z is None or other.z is None:
+            if self.z is not other.z:
+                return False
+        elif not np.array_equal(np.atleast_1d(self.z), np.atleast_1d(other.z)):
+            return False
+        return np.array_equal(self.x, other.x) and \
+            np.array_equal(self.y, other.y)
 
     def interpolate(self, x, y, z=None, variables=None,
-                    profiles=[], profiles_depth=None):
-
-        self._initialize_interpolator(x, y, z)
+                    profiles=[], profiles_depth=None, reuse_from=None):
+        """
+        Interpolate block data onto given positions.
+
+        If `reuse_from` is another block (e.g. at another time) with the same
+        grid, which has already interpolated onto the same positions, the
+        indices and weights of its interpolators are reused.
+        """
+
+        if reuse_from is not None and self.same_grid(reuse_from) and \
+                hasattr(reuse_from, 'interpolator2d'):
+            logger.debug('Reusing interpolator of block at %s' %
+                         reuse_from.time)
+            self.interpolator2d = reuse_from.interpolator2d
+            self.interpolator2d_nearest = reuse_from.interpolator2d_nearest
+            if hasattr(reuse_from, 'interpolator1d'):
+                self.interpolator1d = reuse_from.interpolator1d
+        else:
+            self._initialize_interpolator(x, y, z)
 
         env_dict = {}
         if profiles is not []:
             profiles_dict = {'z': self.z}
         for varname, data in self.data_dict.items():
+            if variables is not None and varname not in variables and \
+                    (profiles is None or varname not in profiles):
+                continue  # Not requested
             nearest = False
             if varname == 'land_binary_mask':
                 nearest = True
-                self.interpolator2d_nearest = Nearest2DInterpolator(self.x, self.y, x, y)
+                if self.interpolator2d_nearest is None:
+                    self.interpolator2d_nearest = Nearest2DInterpolator(
+                        self.x, self.y, x, y)
             if type(data) is list:
                 num_ensembles = len(data)
                 logger.debug('Interpolating %i ensembles for %s' % (num_ensembles, varname))
@@ -133,6 +170,8 @@ class ReaderBlock():
         if data.ndim == 2:
             return interpolator2d(data)
         if data.ndim == 3:
+            if getattr(interpolator2d, 'multilayer', False) is True:
+                return interpolator2d(data)
             num_layers = data.shape[0]
             # Allocate output array
             result = np.ma.empty((num_layers, len(interpolator2d.x)))
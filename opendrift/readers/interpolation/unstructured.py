@@ -0,0 +1,205 @@
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def triangle_neighbours(triangles):
+    """
+    Neighbouring triangles of each triangle in a mesh.
+
+    Args:
+        triangles: (E, 3) array with node indices of each triangle.
+
+    Returns:
+        (E, 3) array where column k is the triangle sharing the edge
+        opposite of node k, or -1 at the boundary of the mesh.
+    """
+    triangles = np.asarray(triangles, dtype=np.int64)
+    a = triangles[:, [1, 2, 0]].ravel()
+    b = triangles[:, [2, 0, 1]].ravel()
+    key = np.minimum(a, b) * (triangles.max() + 1) + np.maximum(a, b)
+    order = np.argsort(key, kind='stable')
+    shared = key[order[1:]] == key[order[:-1]]
+    first = order[:-1][shared]
+    second = order[1:][shared]
+    neighbours = np.full(key.shape, -1, dtype=np.int64)
+    neighbours[first] = second // 3
+    neighbours[second] = first // 3
+    return neighbours.reshape(triangles.shape)
+
+
+class TriangleInterpolator():
+    """
+    Locate positions in a triangular mesh, and interpolate linearly within
+    triangles with barycentric weights.
+
+    Positions are located by walking from a first guess towards the
+    triangle containing the position, stepping to the neighbour across the
+    edge opposite of the most negative barycentric coordinate. The
+    triangles found are kept, and used as first guess for the next call
+    with the same number of positions, so that elements which have moved
+    little are located in a few steps. Other positions start from the
+    triangle with closest centroid (KD-tree), and if not found, the
+    triangles with the closest centroids are checked.
+
+    Positions outside the mesh are given the weights of the nearest node.
+
+    Args:
+        x, y: node positions.
+        triangles: (E, 3) array with node indices of each triangle.
+        neighbours: (E, 3) array with neighbouring triangles, as from
+            `triangle_neighbours`, which is used if not given.
+    """
+
+    max_walk = 20  # Maximum number of steps when walking in mesh
+
+    def __init__(self, x, y, triangles, neighbours=None):
+        from scipy.spatial import cKDTree
+        self.x = np.asarray(np.ma.getdata(x), dtype=np.float64)
+        self.y = np.asarray(np.ma.getdata(y), dtype=np.float64)
+        self.triangles = np.asarray(triangles, dtype=np.int64)
+        if neighbours is None:
+            neighbours = triangle_neighbours(self.triangles)
+        self.neighbours = neighbours
+        self.centroids = cKDTree(np.stack(
+            (self.x[self.triangles].mean(axis=1),
+             self.y[self.triangles].mean(axis=1)), axis=-1))
+        self.nodes = cKDTree(np.stack((self.x, self.y), axis=-1))
+        self.last = None  # Triangles from previous call
+
+    def barycentric(self, x, y, triangles):
+        """Barycentric coordinates (n, 3) of positions within triangles."""
+        nodes = self.triangles[triangles]
+        x1, x2, x3 = self.x[nodes].T
+        y1, y2, y3 = self.y[nodes].T
+        det = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
+        w1 = ((y2 - y3) * (x - x3) + (x3 - x2) * (y - y3)) / det
+        w2 = ((y3 - y1) * (x - x3) + (x1 - x3) * (y - y3)) / det
+        return np.stack((w1, w2, 1 - w1 - w2), axis=-1)
+
+    def walk(self, x, y, triangles):
+        """
+        Walk from given triangles towards the triangles containing x, y.
+
+        Returns triangles and barycentric weights, with triangle -1 for
+        positions not found within `max_walk` steps.
+        """
+        triangles = triangles.copy()
+        weights = np.zeros((len(x), 3))
+        found = np.zeros(len(x), dtype=bool)
+        active = np.arange(len(x))
+        for step in range(self.max_walk):
+            w = self.barycentric(x[active], y[active], triangles[active])
+            k = np.argmin(w, axis=1)
+            inside = w[np.arange(len(active)), k] >= -1e-9
+            found[active[inside]] = True
+            weights[active[inside]] = w[inside]
+            active = active[~inside]
+            if len(active) == 0:
+                break
+            triangles[active] = self.neighbours[triangles[active],
+                                                k[~inside]]
+            active = active[triangles[active] >= 0]  # Boundary reached
+        triangles[~found] = -1
+        return triangles, weights
+
+    def locate(self, x, y):
+        """
+        Return triangles (n,), nodes (n, 3) and weights (n, 3) for
+        interpolation at positions x, y.
+
+        Values of node variables at the positions are then given by
+        `interpolate`, and values of face variables by the triangles.
+        """
+        x = np.asarray(np.ma.getdata(x), dtype=np.float64)
+        y = np.asarray(np.ma.getdata(y), dtype=np.float64)
+        if self.last is not None and len(self.last) == len(x):
+            guess = self.last
+        else:
+            guess = self.centroids.query(np.stack((x, y), axis=-1))[1]
+        triangles, weights = self.walk(x, y, guess)
+
+        lost = np.flatnonzero(triangles < 0)
+        if len(lost) > 0:
+            xy = np.stack((x[lost], y[lost]), axis=-1)
+            candidates = self.centroids.query(
+                xy, k=min(8, len(self.triangles)))[1].reshape(len(lost), -1)
+            if guess is self.last:  # Retry from closest centroid
+                triangles[lost], weights[lost] = self.walk(
+                    x[lost], y[lost], candidates[:, 0])
+                candidates = candidates[triangles[lost] < 0]
+                lost = lost[triangles[lost] < 0]
+            for c in candidates.T:  # Triangles with closest centroids
+                if len(lost) == 0:
+                    break
+                w = self.barycentric(x[lost], y[lost], c)
+                inside = w.min(axis=1) >= -1e-9
+                triangles[lost[inside]] = c[inside]
+                weights[lost[inside]] = w[inside]
+                candidates = candidates[~inside]
+                lost = lost[~inside]
+        if len(lost) > 0:
+            logger.debug('%i positions outside mesh, using nearest node'
+                         % len(lost))
+            xy = np.stack((x[lost], y[lost]), axis=-1)
+            nearest_node = self.nodes.query(xy)[1]
+
+        self.last = triangles.copy()
+        nodes = self.triangles[np.maximum(triangles, 0)]
+        if len(lost) > 0:
+            triangles[lost] = self.centroids.query(xy)[1]
+            nodes[lost] = nearest_node[:, np.newaxis]
+            weights[lost] = [1, 0, 0]
+            self.last[lost] = triangles[lost]
+        return triangles, nodes, weights
+
+    @staticmethod
+    def interpolate(values, weights):
+        """
+        Weighted sum of values (..., n, 3) at the nodes of triangles.
+        """
+        return np.ma.sum(values * weights, axis=-1)
+
+
+class UnstructuredBlock():
+    """
+    Data of a variable at one time, for a contiguous range of nodes or
+    faces (columns) of an unstructured mesh, or for given columns.
+
+    Args:
+        time: time of data, or None for variables not depending on time.
+        data: array with columns along last dimension (e.g. (levels, columns)).
+        start: index of first column in data, for a contiguous range.
+        columns: sorted array of columns in data, if not a contiguous range.
+    """
+
+    def __init__(self, time, data, start=None, columns=None):
+        self.time = time
+        self.data = data
+        self.columns = columns
+        if columns is not None:
+            start = columns[0]
+        self.start = start
+        self.stop = start + data.shape[-1] if columns is None \
+            else columns[-1] + 1
+
+    def _index(self, columns):
+        """Index of given columns in data."""
+        if self.columns is None:
+            return columns - self.start
+        return np.searchsorted(self.columns, columns)
+
+    def covers(self, columns):
+        """Return True if block contains all given columns."""
+        if columns.min() < self.start or columns.max() >= self.stop:
+            return False
+        if self.columns is None:
+            return True
+        return bool(np.all(self.columns[self._index(columns)] == columns))
+
+    def values(self, columns, levels=None):
+        """Values at given columns, and levels if data has several levels."""
+        if levels is None:
+            return self.data[..., self._index(columns)]
+        return self.data[levels, self._index(columns)]
@@ -16,6 +16,7 @@
 
 from bisect import bisect_left, bisect_right
 from datetime import datetime
+import hashlib
 import logging
 logger = logging.getLogger(__name__)
 
@@ -25,10 +26,58 @@ import xarray as xr
 
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, StructuredReader
 from opendrift.readers.roppy import depth
+from opendrift.readers.basereader.diskcache import ArrayCache
+
+
+def load_s2z_coefficients(reader):
+    """
+    Set sigma-to-z coefficients for the whole domain of a ROMS reader.
+
+    The coefficients depend only on the grid (h, hc, Cs_r, Vtransform) and
+    the z-levels. If `reader.s2z_cache_dir` is set (default None), they are
+    stored there, to be memory-mapped by later readers and other processes
+    with the same grid, instead of being calculated again.
+    """
+    H = np.ma.filled(reader.sea_floor_depth_below_sea_level, np.nan)
+    M, N = H.shape
+
+    def compute():
+        logger.debug('Calculating sigma2z-coefficients for whole domain')
+        starttime = datetime.now()
+        z_rho_tot = depth.sdepth(reader.sea_floor_depth_below_sea_level,
+                                 reader.hc, reader.Cs_r,
+                                 Vtransform=reader.Vtransform)
+        dummyvar = np.ones((len(z_rho_tot), M, N))
+        dummy, s2z_total = depth.multi_zslice(dummyvar, z_rho_tot,
+                                              reader.zlevels)
+        logger.info('Time: ' + str(datetime.now() - starttime))
+        return {'z_rho_tot': np.ma.filled(z_rho_tot, np.nan),
+                'A': s2z_total[0].reshape(len(reader.zlevels), M, N),
+                'C': s2z_total[1].reshape(len(reader.zlevels), M, N),
+                'kmax': np.asarray(s2z_total[3])}
+
+    if reader.s2z_cache_dir is None:
+        s2z = compute()
+    else:
+        key = ArrayCache.key(
+            's2z', hashlib.sha1(H.tobytes()).hexdigest(), H.shape,
+            np.asarray(reader.hc).tolist(), np.asarray(reader.Cs_r).tolist(),
+            np.asarray(reader.Vtransform).tolist(),
+            np.asarray(reader.zlevels).tolist())
+        s2z = ArrayCache(reader.s2z_cache_dir).get(
+            key, ['z_rho_tot', 'A', 'C', 'kmax'], compute)
+    reader.z_rho_tot = s2z['z_rho_tot']
+    reader.s2z_A = s2z['A']
+    reader.s2z_C = s2z['C']
+    reader.s2z_kmax = s2z['kmax']
 
 
 class Reader(BaseReader, StructuredReader):
 
+    # Directory of sigma-to-z coefficients shared between readers and
+    # processes with the same grid, None (default) for no caching
+    s2z_cache_dir = None
+
     def __init__(self, filename=None, name=None, gridfile=None, standard_name_mapping={}):
 
         if filename is None:
@@ -284,10 +333,6 @@ class Reader(BaseReader, StructuredReader):
                 self.sea_floor_depth_below_sea_level = \
                     self.Dataset.variables['h'][:]
 
-            if not hasattr(self, 'z_rho_tot'):
-                Htot = self.sea_floor_depth_below_sea_level
-                self.z_rho_tot = depth.sdepth(Htot, self.hc, self.Cs_r,
-                                              Vtransform=self.Vtransform)
 
             H = self.sea_floor_depth_below_sea_level[indy, indx]
             z_rho = depth.sdepth(H, self.hc, self.Cs_r,
@@ -386,33 +431,14 @@ class Reader(BaseReader, StructuredReader):
                 if len(np.atleast_1d(indz)) > 1:
                     logger.debug('sigma to z for ' + varname[0])
                     if self.precalculate_s2z_coefficients is True:
-                        M = self.sea_floor_depth_below_sea_level.shape[0]
-                        N = self.sea_floor_depth_below_sea_level.shape[1]
-                        O = len(self.z_rho_tot)
                         if not hasattr(self, 's2z_A'):
-                            logger.debug('Calculating sigma2z-coefficients for whole domain')
-                            starttime = datetime.now()
-                            dummyvar = np.ones((O, M, N))
-                            dummy, self.s2z_total = depth.multi_zslice(dummyvar, self.z_rho_tot, self.zlevels)
-                            # Store arrays/coefficients
-                            self.s2z_A = self.s2z_total[0].reshape(len(self.zlevels), M, N)
-                            self.s2z_C = self.s2z_total[1].reshape(len(self.zlevels), M, N)
-                            #self.s2z_I = self.s2z_total[2].reshape(M, N)
-                            self.s2z_kmax = self.s2z_total[3]
-                            del self.s2z_total  # Free memory
-                            logger.info('Time: ' + str(datetime.now() - starttime))
+                            load_s2z_coefficients(self)
                         if 'A' not in locals():
                             logger.debug('Re-using sigma2z-coefficients')
-                            # Select relevant subset of full arrays
+                            # Select relevant subset of full (memory-mapped) arrays
                             zle = np.arange(zi1, zi2)  # The relevant depth levels
-                            A = self.s2z_A.copy()  # Awkward subsetting to prevent losing one dimension
-                            A = A[:,:,indx]
-                            A = A[:,indy,:]
-                            A = A[zle,:,:]
-                            C = self.s2z_C.copy()
-                            C = C[:,:,indx]
-                            C = C[:,indy,:]
-                            C = C[zle,:,:]
+                            A = self.s2z_A[np.ix_(zle, indy, indx)]
+                            C = self.s2z_C[np.ix_(zle, indy, indx)]
                             C = C - C.max() + variables[par].shape[0] - 1
                             C[C<1] = 1
                             A = A.reshape(len(zle), len(indx)*len(indy))
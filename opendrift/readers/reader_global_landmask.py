@@ -15,10 +15,14 @@
 # Copyright 2020, Gaute Hope, MET Norway
 
 from opendrift.readers.basereader import BaseReader, ContinuousReader
+from opendrift.readers.basereader.coastline import OceanPoints
 
+import os
 import warnings
+from importlib.metadata import version
 import pyproj
 import numpy as np
+import shapely
 import shapely.vectorized
 import shapely.prepared
 from shapely.geometry import box
@@ -31,6 +35,7 @@ logger = logging.getLogger(__name__)
 
 # TODO: replace this with weakref + thread-safety
 __roaring_mask__ = None
+__roaring_mask_pid__ = None  # Process where mask (and thread pool) was made
 __polys__ = None
 
 def get_mask():
@@ -38,14 +43,31 @@ def get_mask():
     Returns an instance of the landmask type and landmask. The mask data is
     usually shared between threads.
     """
-    global __roaring_mask__
+    global __roaring_mask__, __roaring_mask_pid__
 
     if __roaring_mask__ is None:
         from roaring_landmask import RoaringLandmask
         __roaring_mask__ = RoaringLandmask.new()
+        __roaring_mask_pid__ = os.getpid()
 
     return __roaring_mask__
 
+def get_polygons():
+    """
+    Returns the full resolution GSHHG polygons of the landmask, and a
+    STRtree of the polygons. These are loaded once, and shared.
+    """
+    global __polys__
+
+    if __polys__ is None:
+        from roaring_landmask import LandmaskProvider, Shapes
+        logger.debug('Loading full GSHHG shapes from roaring-landmask')
+        polys = wkb.loads(Shapes.wkb(LandmaskProvider.Gshhg)).geoms
+        polys = np.asarray(list(polys), dtype=object)
+        __polys__ = (polys, shapely.STRtree(polys))
+
+    return __polys__
+
 class LandmaskFeature(cfeature.GSHHSFeature):
     def __init__(self, scale='auto', globe=None, **kwargs):
         super().__init__(scale, **kwargs)
@@ -124,6 +146,9 @@ class Reader(BaseReader, ContinuousReader):
     """
     name = 'global_landmask'
     variables = ['land_binary_mask']
+    # Shared by all instances, as the landmask is shared. OceanPoints is
+    # guarded by a lock, and discards least recently used tiles
+    ocean_points = OceanPoints()
     proj4 = None
     crs = None
 
@@ -141,13 +166,22 @@ class Reader(BaseReader, ContinuousReader):
 
         # setup landmask
         self.mask = get_mask()
+        self.coastline_source = ('GSHHG', version('roaring-landmask'))
 
     def __on_land__(self, x, y):
         x = self.modulate_longitude(x)
         x = x.astype(np.float64)
         y = y.astype(np.float64)
+        if os.getpid() != __roaring_mask_pid__:
+            # Thread pool of parent is not available in forked process
+            return self.mask.contains_many(x, y)
         return self.mask.contains_many_par(x, y)
 
+    def coastline_polygons(self, extent):
+        """Return polygons intersecting extent (xmin, ymin, xmax, ymax)."""
+        polys, tree = get_polygons()
+        return polys[tree.query(box(*extent))]
+
     def get_variables(self,
                       requestedVariables,
                       time=None,
@@ -74,6 +74,9 @@ class Reader(BaseReader, UnstructuredReader):
 
     dataset = None
 
+    # Blocks of times before and after are kept, see _get_block_
+    interpolate_time = True
+
     # For in-memory caching of Sigma-coordinates and ocean depth
     siglay = None
     siglev = None
@@ -176,6 +179,15 @@ class Reader(BaseReader, UnstructuredReader):
         logger.debug("building index of faces..")
         self.faces_idx = self._build_ckdtree_(self.xc, self.yc)
 
+        logger.debug("building triangle interpolator..")
+        # Node and element indices are 1-based, with 0 at the boundary
+        if 'nbe' in self.dataset.variables:
+            neighbours = np.asarray(self.dataset['nbe'][:].T,
+                                    dtype=np.int64) - 1
+        else:
+            neighbours = None  # Calculated from triangles
+        self._build_interpolator_(self.dataset['nv'][:].T - 1, neighbours)
+
         self.timer_end("build index")
 
         self.timer_end("open dataset")
@@ -219,12 +231,20 @@ class Reader(BaseReader, UnstructuredReader):
 
         .. note::
 
-            Currently this reader does not really interpolate. It looks up the
-            closest point in time and space.
+            Node variables are interpolated linearly within the element
+            (triangle) containing the position, and face variables are taken
+            from the containing element. Vertically, the closest point is
+            used. Data at the closest time is read in blocks covering the
+            elements, which are kept for reuse by the next calls. Values at
+            times before and after are interpolated in time by
+            `UnstructuredReader._get_variables_interpolated_`.
 
         Each element has a lookup-table of its surrounding elements, this list can be
         used when looking up elements for the interpolator of an arbitrary
-        point on the grid. The same goes for the nodes.
+        point on the grid. The same goes for the nodes. The containing
+        element is found by walking between neighbouring elements, starting
+        from the element found in the previous call, see
+        :class:`opendrift.readers.interpolation.unstructured.TriangleInterpolator`.
 
         Let E be number of elements and N be number of nodes.
 
@@ -275,64 +295,67 @@ class Reader(BaseReader, UnstructuredReader):
 
         variables = {}
 
+        fcs, nodes, weights = self._locate_(x, y)
+
         if node_variables:
             logger.debug("Interpolating node-variables..")
 
-            nodes = self._nearest_node_(x, y)
             assert len(nodes) == len(x)
 
             for var in node_variables:
                 dvar = self.variable_mapping.get(var)
                 logger.debug("Interpolating: %s (%s)" % (var, dvar))
                 dvar = self.dataset[dvar]
+                block = self.__get_block__(var, dvar, nearest_time,
+                                           indx_nearest, nodes)
 
                 # sigma ind depends on whether variable is defined on sigma layer og sigma level
-                if 'siglev' in dvar.dimensions:
-                    sigma_ind = self.__nearest_node_sigma__(dvar, nodes, z)
-                    assert len(sigma_ind) == len(z)
-
-                    # Reading the smallest block covering the actual data
-                    block = dvar[indx_nearest,
-                                 slice(sigma_ind.min(),
-                                       sigma_ind.max() + 1),
-                                 slice(nodes.min(),
-                                       nodes.max() + 1)]
-                    # Picking the nearest value
-                    variables[var] = block[sigma_ind - sigma_ind.min(),
-                                           nodes - nodes.min()]
+                if 'siglay' in dvar.dimensions or 'siglev' in dvar.dimensions:
+                    # Nearest sigma at each of the surrounding nodes
+                    sigma_ind = self.__nearest_node_sigma__(
+                        dvar, nodes.ravel(),
+                        np.repeat(z, nodes.shape[1])).reshape(nodes.shape)
+                    values = block.values(nodes, sigma_ind)
                 else:  # no depth dimension
-                    variables[var] = dvar[slice(nodes.min(), nodes.max() + 1)]
+                    values = block.values(nodes)
+                variables[var] = self.interpolator.interpolate(values,
+                                                               weights)
 
         if face_variables:
             logger.debug("Interpolating face-variables..")
 
-            fcs = self._nearest_face_(x, y)
             assert len(fcs) == len(x)
 
             for var in face_variables:
                 dvar = self.variable_mapping.get(var)
                 logger.debug("Interpolating: %s (%s)" % (var, dvar))
                 dvar = self.dataset[dvar]
+                block = self.__get_block__(var, dvar, nearest_time,
+                                           indx_nearest, fcs)
 
                 # sigma ind depends on whether variable is defined on sigma layer og sigma level
                 if 'siglay' in dvar.dimensions:
                     sigma_ind = self.__nearest_face_sigma__(dvar, fcs, z)
                     assert len(sigma_ind) == len(z)
 
-                    # Reading the smallest profile slice covering the actual data
-                    block = dvar[indx_nearest,
-                                 slice(sigma_ind.min(),
-                                       sigma_ind.max() + 1),
-                                 slice(fcs.min(),
-                                       fcs.max() + 1)]
-                    # Picking the nearest value
-                    variables[var] = block[sigma_ind - sigma_ind.min(),
-                                           fcs - fcs.min()]
+                    # Value of the containing element
+                    variables[var] = block.values(fcs, sigma_ind)
                 else:  # no depth dimension
-                    variables[var] = dvar[slice(fcs.min(), fcs.max() + 1)]
+                    variables[var] = block.values(fcs)
 
         return variables
 
+    def __get_block__(self, var, dvar, time, indx, columns):
+        """
+        Block of variable at time index covering columns (nodes or faces),
+        with all sigma levels, see `UnstructuredReader._get_block_`.
+        """
+        if 'time' not in dvar.dimensions:
+            return self._get_block_(var, None, columns,
+                                    lambda index: dvar[index])
+        return self._get_block_(var, time, columns,
+                                lambda index: dvar[indx, ..., index])
+
     @staticmethod
     def _vector_nearest_(X, xp):
         """
@@ -18,7 +18,8 @@
 # handle interpolation of current velocities and other variables
 # in 2D and 3D.
 # The interpolation is done using a cKDtree-approach defined
-# form the 2D or 3D mesh nodes
+# from the 2D mesh nodes around the particles, and linearly
+# in the vertical within the node columns
 #
 # Author: Simon Weppe. MetOcean Solution, MetService New Zealand
 ##########################################################################
@@ -72,6 +73,10 @@ class Reader(BaseReader,UnstructuredReader):
 
         py:mod:`opendrift.readers.basereader.unstructured`.
     """
+
+    max_speed = None  # Maximum speed of particles, given by prepare()
+    node_spacing = None  # Largest distance between neighbour nodes
+
     def __init__(self, filename=None, name=None, proj4=None, use_3d = None):
 
         if filename is None:
@@ -243,14 +248,8 @@ class Reader(BaseReader,UnstructuredReader):
         self.x = x
         self.y = y
 
-        if not (self.x>360.).any() and self.use_3d :
-            logger.debug('Native (x,y) coordinates are lon/lat - cannot use 3D data, setting use_3d = False')
-            self.use_3d = False
-            import pdb;pdb.set_trace()
-            # the 3D interpolation currently doesnt work if the x,y coordinates in native netcdf files
-            # are not cartesian but geographic. If that is the case, when doing 3D interpolation and tree search,
-            # the vertical distance unit is meter, while the horizontal distance unit is degrees, which will return
-            # erroneous "closest" nodes in ReaderBlockUnstruct,interpolate()
+        # Vertical interpolation is done within node columns (see ReaderBlockUnstruct),
+        # so 3D data can be used also when native (x,y) coordinates are lon/lat
 
         # Run constructor of parent Reader class
         super(Reader, self).__init__()
@@ -307,6 +306,42 @@ class Reader(BaseReader,UnstructuredReader):
         self.var_block_before = {}  # Data for last timestep before present
         self.var_block_after = {}   # Data for first timestep after present
 
+    def prepare(self, extent, start_time, end_time, max_speed):
+        """Prepare reader for given simulation coverage in time and space."""
+        self.max_speed = max_speed  # for size of node subsets, see __subset_nodes__
+        super().prepare(extent, start_time, end_time, max_speed)
+
+    def __subset_nodes__(self, x, y):
+        """
+        Return indices of the nodes within reach of the particles at x, y
+        until next reader time, and the covered window (xmin, xmax, ymin, ymax).
+
+        The window is the bounding box of the particles, extended by the
+        distance travelled at maximum speed within a reader time step.
+        The subset contains the nodes within the window, extended by the
+        largest distance between neighbour nodes, so that the nearest
+        nodes of any position within the window are included.
+        """
+        if self.max_speed is None or self.time_step is None:
+            return np.arange(len(self.x)), None
+        buffer = self.max_speed * self.time_step.total_seconds()
+        if self.proj.crs.is_geographic:
+            buffer = buffer / 111000.
+        if self.node_spacing is None:
+            # distance to the second closest other node
+            self.node_spacing = self.reader_KDtree.query(
+                np.vstack((self.x, self.y)).T, 3, workers=-1)[0][:, -1].max()
+        window = (x.min() - buffer, x.max() + buffer,
+                  y.min() - buffer, y.max() + buffer)
+        margin = 2 * self.node_spacing
+        nodes = np.where((self.x >= window[0] - margin) &
+                         (self.x <= window[1] + margin) &
+                         (self.y >= window[2] - margin) &
+                         (self.y <= window[3] + margin))[0]
+        logger.debug('Using %i of %i nodes around particles' %
+                     (len(nodes), len(self.x)))
+        return nodes, window
+
     def get_variables(self, requested_variables, time=None,
                       x=None, y=None, z=None, block=False):
 
@@ -314,11 +349,13 @@ class Reader(BaseReader,UnstructuredReader):
             which will then be used in _get_variables_interpolated_() to initialise the ReaderBlockUnstruct objects
             used to interpolate data in space and time
 
-            For now the function will extract the entire slice of data of 'requested_variables' at given 'time'
+            Data are extracted only for the subset of nodes within reach of
+            the particles (x, y) until the next reader time, see
+            __subset_nodes__. The full mesh is used if the reader has not been
+            prepared with a maximum speed (e.g. when used outside a simulation).
 
-            There is an option to extract only a subset of data around particles clouds to have less data but
-            it means we need to recompute the KDtree of the subset nodes every time in ReaderBlockUnstruct.
-            (Speed gain to be tested)
+            3D data are returned with dimensions [node, vertical_levels], together
+            with the vertical level positions 'zcor' of these nodes.
 
         """
         requested_variables, time, x, y, z, outside = \
@@ -330,26 +367,34 @@ class Reader(BaseReader,UnstructuredReader):
         x = np.atleast_1d(x)
         y = np.atleast_1d(y)
 
-        variables = {'x': self.x, 'y': self.y, 'z': 0.*self.y,
-                     'time': nearestTime}
+        nodes, window = self.__subset_nodes__(x, y)
+        # Reading the smallest slice of nodes covering the subset
+        first = nodes.min()
+        last = nodes.max() + 1
 
-        # extracts the full slices of requested_variables at time indxTime
+        def read(var, id_time, *index):
+            return np.asarray(var[(id_time, slice(first, last)) +
+                                  index])[nodes - first]
+
+        variables = {'x': self.x[nodes], 'y': self.y[nodes],
+                     'z': 0.*self.y[nodes], 'time': nearestTime,
+                     'window': window}
+
+        # extracts the slices of requested_variables at time indxTime
         for par in requested_variables:
             if par not in ['x_sea_water_velocity','y_sea_water_velocity'] :
                 # standard case - for all variables except current velocities
                 var = self.dataset.variables[self.variable_mapping[par]]
                 if var.ndim == 1:
-                    data = var[:] # e.g. depth
+                    data = np.asarray(var[first:last])[nodes - first] # e.g. depth
                     logger.debug('reading constant data from unstructured reader %s' % (par))
                 elif var.ndim == 2:
-                    data = var[indxTime,:] # e.g. 2D temperature
+                    data = read(var, indxTime) # e.g. 2D temperature
                     logger.debug('reading 2D data from unstructured reader %s' % (par))
                 elif var.ndim == 3:
-                    data = var[indxTime,:,:] # e.g. 3D salt [time,node,lev]
+                    data = read(var, indxTime) # e.g. 3D salt [time,node,lev]
                     logger.debug('reading 3D data from unstructured reader %s' % (par))
-                    # convert 3D data matrix to one column array and define corresponding data coordinates [x,y,z]
-                    # (+ update variables dictionary with 3d coords if needed)
-                    data,variables = self.convert_3d_to_array(indxTime,data,variables)
+                    self.add_vertical_levels(indxTime, nodes, variables)
                 else:
                     raise ValueError('Wrong dimension of %s: %i' %
                                      (self.variable_mapping[par], var.ndim))
@@ -358,84 +403,42 @@ class Reader(BaseReader,UnstructuredReader):
                 # In SCHISM netcdf filesboth [u,v] components are saved
                 # as two different dimensions of the same variable.
                 var = self.dataset.variables[self.variable_mapping[par]]
+                component = 0 if par == 'x_sea_water_velocity' else 1
                 if var.ndim == 3: # depth-averaged current data 'dahv' defined at each node and time [time,node,2]
-                    if par == 'x_sea_water_velocity':
-                       data = var[indxTime,:,0]
-                    elif par == 'y_sea_water_velocity':
-                       data = var[indxTime,:,1]
+                    data = read(var, indxTime, component)
                     logger.debug('reading 2D velocity data from unstructured reader %s' % (par))
 
                 elif var.ndim == 4: # #3D current data 'hvel' defined at each node, level, and time [time,node,zcor,2]
-                    if par == 'x_sea_water_velocity':
-                       data = var[indxTime,:,:,0]   #hvel dimensions : [time,node,lev,2]
-                    elif par == 'y_sea_water_velocity':
-                       data = var[indxTime,:,:,1] #hvel dimensions : [time,node,lev,2]
+                    data = read(var, indxTime, slice(None), component)  #hvel dimensions : [time,node,lev,2]
                     logger.debug('reading 3D velocity data from unstructured reader %s' % (par))
+                    self.add_vertical_levels(indxTime, nodes, variables)
 
-                    # convert 3D data matrix to one column array and define corresponding data coordinates [x,y,z]
-                    # (+ update variables dictionary with 3d coords if needed)
-                    data,variables = self.convert_3d_to_array(indxTime,data,variables)
-
-            variables[par] = data # save all data slice to dictionary with key 'par'
+            variables[par] = data # save data of subset to dictionary with key 'par'
             variables[par] = np.asarray(variables[par])
 
         return variables
 
-    def convert_3d_to_array(self,id_time,data,variable_dict):
-        '''
-        The function reshapes a data matrix of dimensions = [node,vertical_levels] (i.e. data at vertical levels, at given time step)
-        into a one-column array and works out corresponding 3d coordinates [lon,lat,z] using the time-varying
-        'zcor' variable in SCHISM files (i.e. vertical level positions).
-
-        These 3D coordinates will be used to build the 3D KDtree for data interpolation and will be added to the 'variable_dict'
-        which is eventually passed to get_variables_interpolated().
-
-        args:
-            -id_time
-            -data
-            -variable_dict
-        out :
-            -flattened 'data' array
-            -addition of ['x_3d','y_3d','z_3d'] items to variable_dict if needed.
+    def add_vertical_levels(self, id_time, nodes, variable_dict):
         '''
+        Add the time-varying vertical level positions 'zcor' of the given nodes
+        to 'variable_dict', with dimensions [node,vertical_levels], if not
+        already present.
 
-        try:
-            vertical_levels = self.dataset.variables['zcor'][id_time,:,:]
-            # depth are negative down consistent with convention used in OpenDrift
-            # if using the netCDF4 library, vertical_levels is masked array where "masked" levels are those below seabed  (= 9.9692100e+36)
-            # if using the xarray library, vertical_levels is nan for levels are those below seabed
-            # convert to masked array to be consistent with what netCDF4 lib returns
-            vertical_levels = np.ma.array(vertical_levels, mask = np.isnan(vertical_levels.data))
-            data = np.asarray(data)
-            # vertical_levels.mask = np.isnan(vertical_levels.data) # masked using nan's when using xarray
-        except:
+        These are used for vertical interpolation within the column of each
+        node in ReaderBlockUnstruct.
+        '''
+        if 'zcor' in variable_dict:
+            return
+        if 'zcor' not in self.dataset.variables:
             logger.debug('no vertical level information present in file ''zcor'' ... stopping')
             raise ValueError('variable ''zcor'' must be present in netcdf file to be able to use 3D currents')
-        # flatten 3D data
-        data = np.ravel(data[~vertical_levels.mask])
-
-        # add corresponding 3D coordinates to the 'variable_dict' which is eventually passed to get_variables_interpolated()
-        # Note: these 3d coordinates will be the same for all 3d data (current,salt/temp etc..), and will change at each reader time step
-        # They are saved as ['x_3d','y_3d','z_3d'] rather than ['x','y','z'] as it would break things when both 2d and 3d data are requested.
-        if 'z_3d' not in variable_dict.keys():
-            # now make a long 3-column array [lon,lat,z] [n_nodes x  3] at which 'data' is defined
-            # tile lon/lat data so that array shape match vertical_levels shape
-            x_tiled = np.tile(self.x,(self.nb_levels,1)).T # dimensions [node,vertical_levels]
-            y_tiled = np.tile(self.y,(self.nb_levels,1)).T
-            # lon_tiled = np.tile(self.lon,(self.nb_levels,1)).T # dimensions [node,vertical_levels]
-            # lat_tiled = np.tile(self.lat,(self.nb_levels,1)).T
-            # arrays are tiled so that lon_tiled[0,:] = return same value i.e. same lon/lat for all z levels
-            if x_tiled.shape != vertical_levels.shape:
-                import pdb;pdb.set_trace()
-            # convert to masked array consistent with vertical_levels
-            x_tiled_ma = np.ma.array(x_tiled, mask = vertical_levels.mask)
-            y_tiled_ma = np.ma.array(y_tiled, mask = vertical_levels.mask)
-            # flatten arrays and add to dictionary
-            variable_dict['x_3d'] = np.ravel(x_tiled_ma[~vertical_levels.mask])
-            variable_dict['y_3d'] = np.ravel(y_tiled_ma[~vertical_levels.mask])
-            variable_dict['z_3d'] = np.ravel(vertical_levels[~vertical_levels.mask])
-
-        return data,variable_dict
+        first = nodes.min()
+        vertical_levels = np.asarray(self.dataset.variables['zcor'][
+            id_time, first:nodes.max() + 1, :], dtype=np.float64)[nodes - first]
+        # depth are negative down consistent with convention used in OpenDrift
+        # levels below seabed are nan (xarray) or very large (netCDF4 fill value)
+        vertical_levels[np.abs(vertical_levels) > 1e10] = np.nan
+        variable_dict['zcor'] = vertical_levels
 
     def _get_variables_interpolated_(self, variables, profiles,
                                    profiles_depth, time,
@@ -532,7 +535,8 @@ class Reader(BaseReader,UnstructuredReader):
 
         # Fetch data, if no buffer is available
         if block_before is None or \
-                block_before.time != time_before:
+                block_before.time != time_before or \
+                block_before.covers_positions(reader_x, reader_y) is False:
             reader_data_dict = \
                  self.__convolve_block__(
                  self.get_variables(blockvariables_before, time_before,
@@ -554,7 +558,8 @@ class Reader(BaseReader,UnstructuredReader):
                            len(self.var_block_before[blockvars_before].y),
                            len_z, time_before))
             block_before = self.var_block_before[blockvars_before]
-        if block_after is None or block_after.time != time_after:
+        if block_after is None or block_after.time != time_after or \
+                block_after.covers_positions(reader_x, reader_y) is False:
             if time_after is None:
                 self.var_block_after[blockvars_after] = \
                     block_before
@@ -585,7 +590,6 @@ class Reader(BaseReader,UnstructuredReader):
             reader_x, reader_y) is False) or (\
             block_after is not None and block_after.covers_positions(
                 reader_x, reader_y) is False):
-            import pdb;pdb.set_trace()
             logger.warning('Data block from %s not large enough to '
                             'cover element positions within timestep. '
                             'Buffer size (%s) must be increased.' %
@@ -695,7 +699,7 @@ class Reader(BaseReader,UnstructuredReader):
                 kernel = N
             logger.debug('Convolving variables with kernel: %s' % kernel)
             for variable in env:
-                if variable in ['x', 'y', 'z', 'time']:
+                if variable in ['x', 'y', 'z', 'time', 'window', 'zcor']:
                     pass
                 else:
                     if env[variable].ndim == 2:
@@ -909,44 +913,21 @@ class ReaderBlockUnstruct():
             del self.data_dict['z']
         except:
             self.z = None
-        # if some 3d data is provided, save additional dict entries
-        if 'z_3d' in data_dict.keys():
-            self.x_3d = data_dict['x_3d']
-            self.y_3d = data_dict['y_3d']
-            self.z_3d = data_dict['z_3d']
-            del self.data_dict['x_3d']
-            del self.data_dict['y_3d']
-            del self.data_dict['z_3d']
-
-        # Initialize KDtree(s)
-        # > save the 2D one by default (initizalied during reader __init__()
-        # > compute and save the time-varying 3D KDtree if relevant
-
-        logger.debug('saving reader''s 2D (horizontal) KDtree to ReaderBlockUnstruct')
-        self.block_KDtree = KDtree # KDtree input to function = one computed during reader's __init__()
-
-        # If we eventually use subset of nodes rather than full mesh, we'll need to re-compute the 2D KDtree
-        # as well, instead of re-using the "full" one available from reader's init
-        # logger.debug('Compute time-varying KDtree for 2D nearest-neighbor search')
-        # self.block_KDtree = cKDTree(np.vstack((self.x,self.y)).T)  # KDtree input to function = one computed during reader's __init__()
-
-        if hasattr(self,'z_3d'):
-            # we need to compute a new KDtree for that time step using vertical coordinates at that time step
-            logger.debug('Compute time-varying KDtree for 3D nearest-neighbor search (i.e using ''zcor'') ')
-            # clean arrays if needed, especially z_3d (get rid of nan's) - keep only non-nan
-            #
-            # check for nan's
-            # if (self.z_3d != self.z_3d).any(): # not required
-            #     self.x_3d = self.x_3d[np.where(self.z_3d == self.z_3d)]
-            #     self.y_3d = self.y_3d[np.where(self.z_3d == self.z_3d)]
-            #     self.z_3d = self.z_3d[np.where(self.z_3d == self.z_3d)]
-            # check for infinite values
-            if np.isinf(self.z_3d).any() :
-                self.z_3d[np.where(np.isinf(self.z_3d))] = 15.0 #limit to +15.0m i.e. above msl
-
-            self.block_KDtree_3d = cKDTree(np.vstack((self.x_3d,self.y_3d,self.z_3d)).T)
-            # do we need copy_data=True ..probably not since "data" [self.x_3d,self.y_3d,self.z_3d]
-            # will not change without the KDtree being recomputedplt
+        # window covered by a subset of nodes, see Reader.__subset_nodes__
+        self.window = self.data_dict.pop('window', None)
+        # if some 3d data is provided, save vertical level positions [node,vertical_levels]
+        self.zcor = self.data_dict.pop('zcor', None)
+
+        # Initialize KDtree of nodes for horizontal nearest-neighbor search
+        # > re-use the one of the full mesh (computed during reader __init__()) if all nodes are used
+        # > otherwise compute it for the subset of nodes
+        # Vertical interpolation is done within the column of each node, using zcor
+        if KDtree is not None and KDtree.n == len(self.x):
+            logger.debug('saving reader''s 2D (horizontal) KDtree to ReaderBlockUnstruct')
+            self.block_KDtree = KDtree
+        else:
+            logger.debug('Compute KDtree of %i subset nodes' % len(self.x))
+            self.block_KDtree = cKDTree(np.vstack((self.x,self.y)).T)
 
         # Mask any extremely large values, e.g. if missing netCDF _Fill_value
         filled_variables = set()
@@ -1014,34 +995,20 @@ class ReaderBlockUnstruct():
                         horizontal[:, elnum] = int_full[:, elnum]
             # standard data 2D or 3D
             else:
-                # use KDtree to find nearest neighbours and interpolate based on distance, on 2D or 3D
+                # use KDtree to find nearest neighbours and interpolate based on (horizontal) distance
                 # https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.cKDTree.query.html#scipy.spatial.cKDTree.query
-                # print(varname)
                 nb_closest_nodes = 3
                 DMIN=1.e-10
-                if data.shape[0] == self.x.shape[0] : # 2D data- full slice
-                    #2D KDtree
-                    dist,i=self.block_KDtree.query(np.vstack((x,y)).T,nb_closest_nodes, workers=-1) #quick nearest-neighbor lookup
-                    # dist = distance to nodes / i = index of nodes
-                elif hasattr(self,'z_3d') and (data.shape[0] == self.x_3d.shape[0]) : #3D data
-                    #3D KDtree
-                    dist,i=self.block_KDtree_3d.query(np.vstack((x,y,z)).T,nb_closest_nodes, workers=-1) #quick nearest-neighbor lookup
-                    # dist = distance to nodes / i = index of nodes
-                    ##############################
-                    # PLOT CHECKS
-                    if False:
-                        import matplotlib.pyplot as plt
-                        fig = plt.figure()
-                        ax = fig.add_subplot(111, projection='3d')
-                        ax.scatter(self.x_3d[i[0]].data.tolist(),self.y_3d[i[0]].data.tolist(),self.z_3d[i[0]].data.tolist(),c='r', marker='o')
-                        ax.scatter(x[0:1],y[0:1],z[0:1],c='g', marker='o')
-                        plt.ion()
-                        plt.show()
-                    ##############################3
+                dist,i=self.block_KDtree.query(np.vstack((x,y)).T,nb_closest_nodes, workers=-1) #quick nearest-neighbor lookup
+                # dist = distance to nodes / i = index of nodes
+                if data.ndim == 1: # 2D data
+                    values = data[i]
+                else: # 3D data [node,vertical_levels], interpolated vertically within each node column
+                    values = self._interpolate_columns(data, i, z)
 
                 dist[dist<DMIN]=DMIN
                 fac=(1./dist)
-                data_interpolated = (fac*data.take(i)).sum(-1)/fac.sum(-1)
+                data_interpolated = (fac*values).sum(-1)/fac.sum(-1)
 
                 # horizontal = self._interpolate_horizontal_layers(data, nearest=nearest)
 
@@ -1057,6 +1024,32 @@ class ReaderBlockUnstruct():
 
         return env_dict, profiles_dict
 
+    def _interpolate_columns(self, data, nodes, z):
+        '''
+        Interpolate 3D data [node,vertical_levels] linearly to depth z within the
+        columns of the given nodes [particle,closest_nodes], using the vertical
+        level positions zcor. Levels below seabed (nan) are skipped, and values are
+        constant above the surface level and below the deepest level.
+        '''
+        zc = self.zcor[nodes] # [particle,closest_nodes,vertical_levels]
+        z = np.broadcast_to(np.atleast_1d(z), nodes.shape[:1])[:, None, None]
+        valid = ~np.isnan(zc)
+        bottom = np.argmax(valid, axis=-1)[..., None] # deepest valid level
+        top = zc.shape[-1] - 1
+        # number of levels below z (nan levels are below seabed)
+        k = (np.where(valid, zc, -np.inf) <= z).sum(axis=-1)[..., None]
+        upper = np.clip(k, bottom, top)
+        lower = np.clip(k - 1, bottom, top)
+        z_lower = np.take_along_axis(zc, lower, axis=-1)
+        z_upper = np.take_along_axis(zc, upper, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(upper > lower,
+                              (z - z_lower) / (z_upper - z_lower), 0)
+        weight = np.clip(np.nan_to_num(weight), 0, 1)
+        values = data[nodes]
+        return (np.take_along_axis(values, lower, axis=-1) * (1 - weight) +
+                np.take_along_axis(values, upper, axis=-1) * weight)[..., 0]
+
     def _interpolate_horizontal_layers(self, data, nearest=False):
         '''Interpolate all layers of 3d (or 2d) array.'''
 
@@ -1078,22 +1071,13 @@ class ReaderBlockUnstruct():
     def covers_positions(self, x, y, z=None):
         '''Check if given positions are covered by this reader block.'''
 
-        indices = np.where((x >= self.x.min()) & (x <= self.x.max()) &
-                           (y >= self.y.min()) & (y <= self.y.max()))[0]
-
-        if len(indices) != len(x):
-            import matplotlib.pyplot as plt
-            plt.ion()
-            plt.plot(x,y,'r.')
-            box = np.array([(self.x.min(),self.y.min()),\
-            (self.x.max(),self.y.min()),\
-            (self.x.max(),self.y.max()),\
-            (self.x.min(),self.y.max()),\
-            (self.x.min(),self.y.min())])
-            plt.plot(box[:,0],box[:,1],'k--')
-            plt.title('Increase buffer distance around particle cloud')
-            import pdb;pdb.set_trace()
-            plt.close()
+        if self.window is not None: # subset of nodes, see Reader.__subset_nodes__
+            xmin, xmax, ymin, ymax = self.window
+        else:
+            xmin, xmax, ymin, ymax = \
+                self.x.min(), self.x.max(), self.y.min(), self.y.max()
+        indices = np.where((x >= xmin) & (x <= xmax) &
+                           (y >= ymin) & (y <= ymax))[0]
 
         if len(indices) == len(x):
             return True
@@ -16,6 +16,8 @@
 
 from opendrift.readers.basereader import BaseReader, ContinuousReader
 
+import hashlib
+import numpy as np
 import pyproj
 import shapely
 import shapely.ops
@@ -91,6 +93,10 @@ class Reader(BaseReader, ContinuousReader):
         logger.info("Pre-processing %d geometries" % len(self.polys))
         self.land = shapely.ops.unary_union(self.polys)
 
+        # Identifier of coastline, e.g. for cached distance to coast
+        self.coastline_source = (self.proj4, self.invert, hashlib.sha1(
+            shapely.to_wkb(self.land)).hexdigest())
+
         self.xmin, self.ymin, self.xmax, self.ymax = self.land.bounds
         self.xmin, self.ymin = self.lonlat2xy(self.xmin, self.ymin)
         self.xmax, self.ymax = self.lonlat2xy(self.xmax, self.ymax)
@@ -101,6 +107,11 @@ class Reader(BaseReader, ContinuousReader):
         else:  # Inverse if polygons are lakes and not land areas
             return 1 - shapely.vectorized.contains(self.land, x, y)
 
+    def coastline_polygons(self, extent):
+        """Return polygons intersecting extent (xmin, ymin, xmax, ymax)."""
+        polys = np.asarray(self.polys, dtype=object)
+        return polys[shapely.intersects(polys, shapely.box(*extent))]
+
     def get_variables(self, requestedVariables, time = None,
                       x = None, y = None, z = None):
         """
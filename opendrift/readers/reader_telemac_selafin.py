@@ -49,10 +49,15 @@ class Reader(BaseReader, UnstructuredReader):
         :type name: string, optional
         :param proj4: PROJ.4 string describing projection of data.
         :type proj4: string, optional
+        :param memmap: Memory-map the Selafin file, so that only the
+            values at requested nodes are read from frames
+        :type memmap: boolean, optional
     .. seealso::
         py:mod:`opendrift.readers.basereader.unstructured`.
     """
-    def __init__(self, filename=None, name=None, proj4=None, start_time=None):
+
+    def __init__(self, filename=None, name=None, proj4=None, start_time=None,
+                 memmap=False):
         def vardic(vars_slf):
             """
             Match the selafin variables from Telemac 3D to the variables used in
@@ -127,6 +132,8 @@ class Reader(BaseReader, UnstructuredReader):
 
         # using scipy directly
         self.tree = self._build_ckdtree_(self.slf.meshx, self.slf.meshy)
+        logger.debug("building triangle interpolator...")
+        self._build_interpolator_(self.slf.ikle2)
         #bounds
         self.xmin,self.ymin,self.xmax, self.ymax= self.slf.meshx.min(),\
                 self.slf.meshy.min(), self.slf.meshx.max(),self.slf.meshy.max()
@@ -157,6 +164,16 @@ class Reader(BaseReader, UnstructuredReader):
                      *self.slf.npoin2).astype(int)
         self.variables, self.var_idx = vardic(self.slf.varnames)
 
+        ### frame cache
+        # Selafin variables read from frames: altitude and mapped variables
+        self.frame_vars = sorted(set(self.altitude_ID) |
+                                 set(self.var_idx.tolist()))
+        self.frames = {}  # frame index: list of arrays of frame_vars
+        self.memmap = None
+        if memmap is True:
+            self.memmap = np.memmap(self.slf.file['name'], dtype=np.uint8,
+                                    mode='r')
+
         self.timer_end("build index")
         self.timer_end("open dataset")
 
@@ -203,10 +220,11 @@ class Reader(BaseReader, UnstructuredReader):
                       z=None):
         """
         - Query variables based on the particle coordinates x, y, z
-        - find the nearest node in the KD tree
+        - find the triangle containing the particles, and the barycentric
+          weights of its nodes
         - extract the z array corresponding.
-        - extract the index of the node within the 3D mesh
-        - extract the variables at the point
+        - extract the index of the nodes within the 3D mesh
+        - extract the variables at the nodes, and interpolate to the point
         Args:
             x,y,z: np.arrays(float)
                 3D coordinates of the particles
@@ -220,32 +238,28 @@ class Reader(BaseReader, UnstructuredReader):
         ### nearest time tupple
         frames, duration=self.__nearest_idx__(np.array(self.times).astype( \
                          'datetime64[s]'),np.datetime64(time))
-        ### nearest node in 2D
-        iii = self.__nearest_ckdtree__(self.tree, x, y)
+        ### surrounding nodes in 2D, shape (particles, 3)
+        _, iii, weights = self._locate_(x, y)
         # build depth ndarrays of each fibre
-        niii = len(iii)
-        idx_3D = self.meshID + iii
+        idx_3D = self.meshID[:, :, None] + iii
+        # extract all variables of the fibres at once, shape
+        # (frame_vars, planes, particles, 3)
+        columns = self.__extractslf__(frames, duration, self.frame_vars,
+                                      idx_3D)
         # locate the profile dimension
-        pm = self.__extractslf__(frames, duration, self.altitude_ID, idx_3D)[0]
+        pm = columns[self.frame_vars.index(self.altitude_ID[0])]
         # calculate distance from particles to nearest point altitude
-        idx_layer = np.abs(pm - z).argmin(axis=0)
-        indices = self.variables == np.array(requested_variables)[:, None]
-        Idxs = []
-        for line in indices:
-            Idxs.append(self.var_idx[line])
-        idx_nodes = idx_3D[idx_layer, np.arange(len(idx_layer))]
-        vectors = self.__extractslf__(frames, duration, Idxs,
-                                      idx_nodes.ravel())
+        idx_layer = np.abs(pm - np.atleast_1d(z)[:, None]).argmin(axis=0)
         vars = {}
-        for i in range(len(requested_variables)):
-            if requested_variables[i] == 'sea_floor_depth_below_sea_level':
-                bottom = self.__extractslf__(frames, duration,
-                                             self.altitude_ID, idx_3D[0])
-                surface = self.__extractslf__(frames, duration,
-                                              self.altitude_ID, idx_3D[-1])
-                vars['sea_floor_depth_below_sea_level'] = surface - bottom
+        for var in requested_variables:
+            if var == 'sea_floor_depth_below_sea_level':
+                vectors = pm[-1] - pm[0]  # surface - bottom
             else:
-                vars[requested_variables[i]] = vectors[i]
+                ivar = self.var_idx[self.variables == var][0]
+                vectors = np.take_along_axis(
+                    columns[self.frame_vars.index(ivar)],
+                    idx_layer[np.newaxis], axis=0)[0]
+            vars[var] = self.interpolator.interpolate(vectors, weights)
         return vars
 
     @staticmethod
@@ -279,19 +293,47 @@ class Reader(BaseReader, UnstructuredReader):
                 dist = (1 - prop, prop)
         return bounds, dist
 
-    def __extractslf__(self, frames, duration, index_var, index_nodes):
+    def __frame__(self, frame):
         """
-        extract variables from slf files
-        index_var must be a list of integer
+        Arrays of the variables `frame_vars` of a frame.
+
+        The frames in use are cached, and only read once from file.
+        With memmap, the arrays are views of the memory-mapped file.
         """
-        vector1 = self.slf.get_variables_at(frames[0], index_var)[:,
-                                                                  index_nodes]
-        if frames[1] is not None:
-            vector2 = self.slf.get_variables_at(frames[1],
-                                                index_var)[:, index_nodes]
+        if frame in self.frames:
+            return self.frames[frame]
+        if self.memmap is None:
+            data = list(self.slf.get_variables_at(frame, self.frame_vars))
         else:
-            vector2 = 0
+            # Frame record is time, followed by one record per variable
+            endian = self.slf.file['endian']
+            ftype, fsize = self.slf.file['float']
+            dtype = np.dtype(endian + ('f8' if fsize == 8 else 'f4'))
+            start = self.slf.tags['cores'][frame] + 4 + fsize + 4
+            data = [np.frombuffer(
+                self.memmap, dtype=dtype, count=self.slf.npoin3,
+                offset=start + ivar * (8 + fsize * self.slf.npoin3) + 4)
+                for ivar in self.frame_vars]
+        self.frames[frame] = data
+        return data
 
-        vector = duration[0] * vector1 + duration[1] * vector2
-        vector1, vector2 = None, None
+    def __extractslf__(self, frames, duration, index_var, index_nodes):
+        """
+        extract variables from slf files
+        index_var must be a list of integer, among frame_vars
+
+        Returns array of shape (len(index_var), *index_nodes.shape)
+        """
+        # Keeping only the frames in use
+        for frame in list(self.frames):
+            if frame not in frames:
+                del self.frames[frame]
+        rows = [self.frame_vars.index(ivar) for ivar in index_var]
+        vector = 0
+        for frame, weight in zip(frames, duration):
+            if frame is None:
+                continue
+            data = self.__frame__(frame)
+            vector = vector + weight * np.stack(
+                [data[row][index_nodes] for row in rows])
         return vector
@@ -8,6 +8,7 @@ class Timeable:
     """
     __timers__ = None
     __timing__ = None
+    __counters__ = None
 
     @property
     def timers(self):
@@ -23,6 +24,13 @@ class Timeable:
 
         return self.__timing__
 
+    @property
+    def counters(self):
+        if self.__counters__ is None:
+            self.__counters__ = OrderedDict()
+
+        return self.__counters__
+
     def timer_start(self, category):
         if category not in self.timing:
             self.timing[category] = timedelta(0)
@@ -33,3 +41,6 @@ class Timeable:
             self.timing[category] += datetime.now() - self.timers[category]
         self.timers[category] = None
 
+    def counter_increment(self, category, count=1):
+        """Increment a counter, e.g. for number of cache hits."""
+        self.counters[category] = self.counters.get(category, 0) + count
@@ -84,5 +84,38 @@ class TestElements(unittest.TestCase):
         self.assertEqual(len(e2), 2)
         self.assertEqual(len(e3), 1)
 
+    def test_move_in_place(self):
+        """Elements are compacted and appended within buffers"""
+        A = LagrangianArray(lon=np.arange(100.), lat=60., z=0)
+        A.ID = np.arange(100)
+        B = LagrangianArray(lon=[-1.], lat=60., z=0, ID=[-1])
+        # Arrays given as input are copied into buffers at first removal
+        for removed in ([0], [3, 50, 98], np.arange(10, 60)):
+            buffer = A.lon.__array_interface__['data'][0]
+            indices = np.zeros(len(A), dtype=bool)
+            indices[removed] = True
+            expected = A.lon[~indices]
+            A.move_elements(B, indices)
+            if len(B) > 2:
+                self.assertEqual(A.lon.__array_interface__['data'][0],
+                                 buffer)
+            np.testing.assert_array_equal(A.lon, expected)
+            np.testing.assert_array_equal(A.ID, expected)
+        self.assertEqual(len(A), 46)
+        self.assertEqual(len(B), 55)
+        np.testing.assert_array_equal(np.sort(np.concatenate(
+            (A.ID, B.ID))), np.arange(-1, 100))
+        np.testing.assert_array_equal(B.lon, B.ID)
+        # Identical scalars remain scalars
+        self.assertFalse(hasattr(A.lat, '__len__'))
+        self.assertFalse(hasattr(B.z, '__len__'))
+        # Capacity is doubled when full, and thereafter not reallocated
+        B.extend(LagrangianArray(lon=[0.], lat=60., z=0, ID=[100]))
+        buffer = B.ID.__array_interface__['data'][0]
+        B.extend(LagrangianArray(lon=[0.], lat=60., z=0, ID=[101]))
+        self.assertEqual(B.ID.__array_interface__['data'][0], buffer)
+        self.assertListEqual(list(B.ID[-2:]), [100, 101])
+
+
 if __name__ == '__main__':
     unittest.main()
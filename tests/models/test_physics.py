@@ -27,8 +27,11 @@ import numpy as np
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
 from opendrift.models.openoil import OpenOil
+from opendrift.models.oceandrift import OceanDrift
+from opendrift.models import physics_methods
 from opendrift.models.physics_methods import verticaldiffusivity_Large1994, verticaldiffusivity_Sundby1983, \
-        distance_between_trajectories, distance_along_trajectory, skillscore_darpa, skillscore_liu_weissberg
+        distance_between_trajectories, distance_along_trajectory, skillscore_darpa, skillscore_liu_weissberg, \
+        displace_positions
 
 
 class TestPhysics(unittest.TestCase):
@@ -208,6 +211,56 @@ class TestPhysics(unittest.TestCase):
             elif scheme == 'constant':
                 self.assertAlmostEqual(o.elements.z.min(), -3.62, 1)
 
+    def test_vertical_mixing_kernel(self):
+        def simulation(kernel):
+            o = OceanDrift(loglevel=50)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_wind', 10)
+            o.set_config('environment:fallback:sea_floor_depth_below_sea_level', 30)
+            o.set_config('drift:vertical_mixing', True)
+            o.set_config('vertical_mixing:diffusivitymodel', 'windspeed_Large1994')
+            o.set_config('vertical_mixing:compiled_kernel', kernel)
+            o.seed_elements(4, 60, z=-5, number=500, terminal_velocity=.001,
+                            time=datetime.now())
+            np.random.seed(1)
+            o.run(steps=2, time_step=1800)
+            return o
+
+        o1 = simulation(False)
+        o2 = simulation(True)
+        self.assertTrue(o2.elements.z.min() >= -30)
+        if physics_methods.njit is None:
+            # Same random numbers as for the Python loop
+            np.testing.assert_array_almost_equal(o1.elements.z, o2.elements.z)
+        else:
+            self.assertAlmostEqual(o1.elements.z.mean(), o2.elements.z.mean(),
+                                   delta=2)
+
+    def test_vertical_mixing_adaptive_timestep(self):
+        def simulation(adaptive):
+            o = OceanDrift(loglevel=50)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_wind', 8)
+            o.set_config('environment:fallback:ocean_mixed_layer_thickness', 20)
+            o.set_config('environment:fallback:sea_floor_depth_below_sea_level', 40)
+            o.set_config('drift:vertical_mixing', True)
+            o.set_config('vertical_mixing:diffusivitymodel', 'windspeed_Large1994')
+            o.set_config('vertical_mixing:compiled_kernel', True)
+            o.set_config('vertical_mixing:adaptive_timestep', adaptive)
+            o.seed_elements(4, 60, z=np.linspace(-40, 0, 5000), number=5000,
+                            terminal_velocity=.0005, time=datetime.now())
+            np.random.seed(1)
+            o.run(steps=2, time_step=3600)
+            return o.elements.z
+
+        z1 = simulation(False)
+        z2 = simulation(True)
+        # Statistically equivalent vertical distributions
+        self.assertAlmostEqual(z1.mean(), z2.mean(), delta=.5)
+        self.assertAlmostEqual(z1.std(), z2.std(), delta=.5)
+        np.testing.assert_allclose(np.percentile(z1, [10, 50, 90]),
+                                   np.percentile(z2, [10, 50, 90]), atol=1)
+
     def test_parameterised_stokes(self):
         o = OpenOil(loglevel=30)
         o.set_config('drift:use_tabularised_stokes_drift', False)
@@ -255,5 +308,35 @@ class TestPhysics(unittest.TestCase):
         skill_lw = skillscore_liu_weissberg(lon_obs, lat_obs, lon_model, lat_model)
         self.assertAlmostEqual(skill_lw, 0.99099, 5)
 
+    def test_displace_positions(self):
+        np.random.seed(1)
+        lon = np.random.uniform(-180, 180, 1000)
+        lat = np.random.uniform(-85, 85, 1000)
+        x = np.random.normal(0, 3000, 1000)
+        y = np.random.normal(0, 3000, 1000)
+        lon_g, lat_g = displace_positions(lon, lat, x, y)
+        lon_t, lat_t = displace_positions(lon, lat, x, y,
+                                          method='tangent_plane')
+        # Tangent plane is close to geodesic, also across the dateline
+        dist = distance_between_trajectories(lon_g, lat_g, lon_t, lat_t)
+        self.assertLess(dist.max(), 0.2)
+        self.assertTrue(np.all(np.abs(lon_t) <= 180))
+        # Displacements of 10 km within 80 degrees latitude
+        angle = np.random.uniform(0, 2*np.pi, 1000)
+        x, y = 1e4*np.sin(angle), 1e4*np.cos(angle)
+        for latmax, maxdist in [(60, .02), (80, .2)]:
+            lat = np.random.uniform(-latmax, latmax, 1000)
+            lon_g, lat_g = displace_positions(lon, lat, x, y)
+            lon_t, lat_t = displace_positions(lon, lat, x, y,
+                                              method='tangent_plane')
+            dist = distance_between_trajectories(lon_g, lat_g, lon_t, lat_t)
+            self.assertLess(dist.max(), maxdist)
+        # Large displacements are moved along geodesics
+        lon_t, lat_t = displace_positions(0, 60, 1e5, 1e5,
+                                          method='tangent_plane')
+        lon_g, lat_g = displace_positions(0, 60, 1e5, 1e5)
+        self.assertEqual(lon_t, lon_g)
+        self.assertEqual(lat_t, lat_g)
+
 if __name__ == '__main__':
     unittest.main()
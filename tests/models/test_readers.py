@@ -17,6 +17,8 @@
 #
 # Copyright 2015, Knut-Frode Dagestad, MET Norway
 
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
 
@@ -428,6 +430,25 @@ class TestReaders(unittest.TestCase):
                                -0.783, 2)
                                #-0.803, 2)
 
+    def test_sigma_coefficients_cache(self):
+        filename = o.test_data_folder() + \
+            '2Feb2016_Nordic_sigma_3d/Nordic_subset.nc'
+        data = {}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for cache in [None, cache_dir, cache_dir]:
+                r = reader_ROMS_native.Reader(filename)
+                r.s2z_cache_dir = cache
+                x, y = r.lonlat2xy(np.array([13.5, 14.5]),
+                                   np.array([67.3, 67.6]))
+                data[cache] = r.get_variables(
+                    ['sea_water_temperature'], time=r.start_time,
+                    x=x, y=y, z=np.array([-33, -200]))
+            # Last reader loads memory-mapped coefficients from cache
+            self.assertTrue(isinstance(r.s2z_A, np.memmap))
+            self.assertEqual(len(os.listdir(cache_dir)), 5)  # 4 + lock
+        np.testing.assert_array_equal(data[None]['sea_water_temperature'],
+                                      data[cache_dir]['sea_water_temperature'])
+
     def test_get_environment(self):
         o = PelagicEggDrift(loglevel=0)
         reader_nordic = reader_ROMS_native.Reader(o.test_data_folder() + '2Feb2016_Nordic_sigma_3d/Nordic-4km_SLEVELS_avg_00_subset2Feb2016.nc', name='Nordic')
@@ -30,11 +30,13 @@ from opendrift.readers import reader_global_landmask
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
 from opendrift.readers import reader_oscillating
+from opendrift.readers import reader_constant
 from opendrift.models.oceandrift import OceanDrift
 from opendrift.models.openoil import OpenOil
 from opendrift.models.leeway import Leeway
 from opendrift.models.pelagicegg import PelagicEggDrift
 from opendrift.models.plastdrift import PlastDrift
+from opendrift.models.physics_methods import displace_positions
 
 
 def gdal_error_handler(err_class, err_num, err_msg):
@@ -854,5 +856,250 @@ def test_plot_animation(tmpdir):
     #os.remove('test_plot.mp4')
 
 
+def test_run_parallel(tmpdir):
+    def simulation(diffusivity=0):
+        o = OceanDrift(loglevel=50)
+        o.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        o.set_config('drift:horizontal_diffusivity', diffusivity)
+        time = datetime(2015, 9, 22, 6)
+        np.random.seed(1)
+        o.seed_elements(lon=2, lat=62, radius=5000, number=100,
+                        time=[time, time + timedelta(hours=3)])
+        return o
+
+    o = simulation()
+    o.run(steps=12, time_step=900, time_step_output=1800)
+    op = simulation()
+    op.run_parallel(processes=2, chunk_size=30, steps=12, time_step=900,
+                    time_step_output=1800, outfile='%s/parallel.nc' % tmpdir)
+    assert op.history.shape == o.history.shape
+    np.testing.assert_array_equal(op.history['ID'], o.history['ID'])
+    # Reader blocks differ, giving round-off differences in interpolation
+    np.testing.assert_array_almost_equal(op.history['lon'], o.history['lon'],
+                                         decimal=4)
+    np.testing.assert_array_almost_equal(op.elements.lat, o.elements.lat,
+                                         decimal=4)
+    imported = OceanDrift(loglevel=50)
+    imported.io_import_file('%s/parallel.nc' % tmpdir)
+    np.testing.assert_array_almost_equal(imported.history['lon'],
+                                         op.history['lon'])
+
+    # Random numbers of elements depend on seed, but not on chunks or
+    # number of processes
+    lons = []
+    for processes, chunk_size, seed in [(1, 30, 5), (3, 17, 5), (2, 30, 6)]:
+        op = simulation(diffusivity=10)
+        op.run_parallel(processes=processes, chunk_size=chunk_size,
+                        seed=seed, steps=12, time_step=900,
+                        time_step_output=1800)
+        lons.append(op.history['lon'])
+    np.testing.assert_array_almost_equal(lons[0], lons[1], decimal=4)
+    assert np.ma.abs(lons[0] - lons[2]).max() > 1e-3
+    assert np.ma.abs(lons[0] - o.history['lon']).max() > 1e-3
+
+
+def test_export_buffer_writer(tmpdir):
+    def simulation():
+        o = OceanDrift(loglevel=50)
+        o.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        time = datetime(2015, 9, 22, 6)
+        np.random.seed(1)
+        o.seed_elements(lon=2, lat=62, radius=5000, number=50,
+                        time=[time, time + timedelta(hours=3)])
+        return o
+
+    o1 = simulation()
+    o1.run(steps=13, time_step=900, time_step_output=1800)
+    o2 = simulation()
+    o2.run(steps=13, time_step=900, time_step_output=1800,
+           export_buffer_length=2, outfile='%s/buffer.nc' % tmpdir)
+    assert not hasattr(o2, 'outfile_writer')
+    np.testing.assert_array_equal(o1.history['lon'], o2.history['lon'])
+    np.testing.assert_array_equal(o1.history['status'],
+                                  o2.history['status'])
+    # Element properties are chunked along buffer length, and compressed
+    from netCDF4 import Dataset
+    with Dataset('%s/buffer.nc' % tmpdir) as d:
+        assert d.variables['lon'].chunking() == [50, 2]
+        assert d.variables['lon'].filters()['zlib'] is True
+        assert d.steps_exported == 7
+
+
+def test_lazy_history(tmpdir):
+    def simulation():
+        o = OceanDrift(loglevel=50)
+        o.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        time = datetime(2015, 9, 22, 6)
+        np.random.seed(1)
+        o.seed_elements(lon=2, lat=62, radius=5000, number=50,
+                        time=[time, time + timedelta(hours=3)])
+        return o
+
+    o1 = simulation()
+    o1.run(steps=13, time_step=900, time_step_output=1800,
+           export_buffer_length=2, outfile='%s/eager.nc' % tmpdir)
+    o2 = simulation()
+    o2.run(steps=13, time_step=900, time_step_output=1800,
+           export_buffer_length=2, outfile='%s/lazy.nc' % tmpdir,
+           load_history='lazy')
+    assert not isinstance(o2.history, np.ndarray)
+    assert o2.history.shape == o1.history.shape
+    np.testing.assert_array_equal(o2.elements.lon, o1.elements.lon)
+    for prop in ['lon', 'z', 'x_sea_water_velocity']:
+        p1, s1 = o1.get_property(prop)
+        p2, s2 = o2.get_property(prop)
+        np.testing.assert_array_equal(p1, p2)
+        np.testing.assert_array_equal(s1, s2)
+    np.testing.assert_array_equal(o1.get_density_array(1000)[0],
+                                  o2.get_density_array(1000)[0])
+    o2.write_netcdf_density_map('%s/density.nc' % tmpdir)
+    assert os.path.exists('%s/density.nc' % tmpdir)
+    np.testing.assert_array_equal(o2.history[0:2, :]['lat'],
+                                  o1.history[0:2, :]['lat'])
+    # Properties are kept when read
+    assert o2.history['lon'] is o2.history['lon']
+    # Other indexing reads only indexed elements and times from file
+    lazy = OceanDrift(loglevel=50)
+    lazy.io_import_file('%s/lazy.nc' % tmpdir, load_history='lazy')
+    full = o2.history.load()
+    assert lazy.history.properties == {}
+    for key in [0, (slice(0, 2), slice(None)), (np.array([3, 1, 3]), 2),
+                (slice(None, None, -3), np.array([5, 0])),
+                (np.array([1, 2]), np.array([3, 4])), (4, 5)]:
+        for prop in ['lat', 'status']:
+            np.testing.assert_array_equal(lazy.history[key][prop],
+                                          full[key][prop])
+            np.testing.assert_array_equal(
+                np.ma.getmaskarray(lazy.history[key][prop]),
+                np.ma.getmaskarray(full[key][prop]))
+    assert lazy.history.properties == {}
+
+
+def test_history_packing(tmpdir):
+    def simulation():
+        o = OceanDrift(loglevel=50)
+        o.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        time = datetime(2015, 9, 22, 6)
+        np.random.seed(1)
+        o.seed_elements(lon=2, lat=62, radius=5000, number=50,
+                        time=[time, time + timedelta(hours=3)])
+        return o
+
+    o1 = simulation()
+    o1.run(steps=13, time_step=900, time_step_output=1800)
+    packing = {'x_sea_water_velocity': 'float16',
+               'y_sea_water_velocity': ('int16', 0.001, 0)}
+    o2 = simulation()
+    o2.run(steps=13, time_step=900, time_step_output=1800,
+           export_dtypes=packing)
+    o3 = simulation()
+    o3.run(steps=13, time_step=900, time_step_output=1800,
+           export_dtypes=packing, export_buffer_length=3,
+           outfile='%s/packed.nc' % tmpdir)
+    assert o2.history.nbytes < o1.history.nbytes
+    assert o2.history.columns['y_sea_water_velocity'].dtype == np.int16
+    for var in ['lon', 'status']:
+        np.testing.assert_array_equal(o2.history[var], o1.history[var])
+        np.testing.assert_array_equal(o3.history[var], o1.history[var])
+    for var in packing:
+        assert o2.history[var].dtype == np.float32
+        np.testing.assert_array_equal(np.ma.getmaskarray(o2.history[var]),
+                                      np.ma.getmaskarray(o1.history[var]))
+        np.testing.assert_allclose(o2.history[var], o1.history[var],
+                                   atol=1e-3)
+        np.testing.assert_allclose(o3.history[var], o2.history[var],
+                                   atol=1e-6)
+    # Writing to values would not update packed storage or mask
+    with pytest.raises(ValueError):
+        o2.history['y_sea_water_velocity'][0, 0] = 0
+
+
+def test_ragged_output(tmpdir):
+    import opendrift
+    from netCDF4 import Dataset
+
+    def simulation(**kwargs):
+        o = OceanDrift(loglevel=50, **kwargs)
+        o.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        o.set_config('drift:max_age_seconds', 2*3600)
+        time = datetime(2015, 9, 22, 6)
+        np.random.seed(1)
+        # Continuous release
+        o.seed_elements(lon=2, lat=62, radius=5000, number=100,
+                        time=[time, time + timedelta(hours=5)])
+        return o
+
+    o1 = simulation()
+    o1.run(steps=24, time_step=900, time_step_output=1800,
+           export_buffer_length=2, outfile='%s/dense.nc' % tmpdir)
+    o2 = simulation(iomodule='netcdf_ragged')
+    o2.run(steps=24, time_step=900, time_step_output=1800,
+           export_buffer_length=2, outfile='%s/ragged.nc' % tmpdir)
+    with Dataset('%s/ragged.nc' % tmpdir) as f:
+        assert f.featureType == 'trajectory'
+        assert f.variables['rowSize'].sample_dimension == 'obs'
+        num_obs = len(f.dimensions['obs'])
+        assert f.variables['rowSize'][:].sum() == num_obs
+        assert np.all(np.diff(f.variables['time'][0:f.variables[
+            'rowSize'][0]]) > 0)
+    assert num_obs == o1.history['lon'].count()
+    assert num_obs < 0.5*o1.history['lon'].size
+    for o in [o2, opendrift.open('%s/ragged.nc' % tmpdir)]:
+        assert o.history.shape == o1.history.shape
+        for var in ['lon', 'status', 'x_sea_water_velocity']:
+            np.testing.assert_array_equal(o.history[var], o1.history[var])
+            np.testing.assert_array_equal(
+                np.ma.getmaskarray(o.history[var]),
+                np.ma.getmaskarray(o1.history[var]))
+        np.testing.assert_array_equal(o.elements.ID, o1.elements.ID)
+        np.testing.assert_array_equal(o.elements.lat, o1.elements.lat)
+        assert o.status_categories == o1.status_categories
+    # Subset of elements
+    o3 = opendrift.open('%s/ragged.nc' % tmpdir, elements=[3, 4])
+    np.testing.assert_array_equal(o3.history['lon'], o1.history['lon'][3:5])
+
+    # No active elements at first output steps
+    o4 = OceanDrift(loglevel=50, iomodule='netcdf_ragged')
+    o4.add_reader(reader_ArtificialOceanEddy.Reader(2, 62))
+    o4.set_config('environment:fallback:land_binary_mask', 0)
+    o4.seed_elements(lon=2, lat=62, number=3,
+                     time=datetime(2015, 9, 22, 7))
+    o4.start_time = datetime(2015, 9, 22, 6)
+    o4.run(steps=12, time_step=900, time_step_output=1800,
+           outfile='%s/late.nc' % tmpdir)
+    o5 = opendrift.open('%s/late.nc' % tmpdir)
+    assert o5.start_time == o4.start_time
+    np.testing.assert_array_equal(o5.history['lon'].count(axis=0),
+                                  [0, 0, 3, 3, 3, 3, 3])
+
+
+
+def test_velocity_accumulation():
+    o = OceanDrift(loglevel=50)
+    o.set_config('environment:fallback:land_binary_mask', 0)
+    o.add_reader(reader_constant.Reader(
+        {'x_sea_water_velocity': .05, 'y_sea_water_velocity': .1,
+         'x_wind': 5, 'y_wind': -10}))
+    o.set_config('drift:horizontal_diffusivity', 10)
+    o.seed_elements(lon=4, lat=60, number=10, wind_drift_factor=.02,
+                    time=datetime.now())
+    np.random.seed(1)
+    o.run(steps=1, time_step=3600)
+    x_vel, y_vel = o.drift_velocity
+    # Current, wind drift and diffusion, moved as one displacement
+    assert np.std(x_vel) > 0
+    np.testing.assert_allclose(x_vel.mean(), .05 + .1, atol=.05)
+    np.testing.assert_allclose(y_vel.mean(), .1 - .2, atol=.05)
+    lon, lat = displace_positions(4, 60, x_vel*3600, y_vel*3600)
+    np.testing.assert_array_almost_equal(o.elements.lon, lon, 10)
+    np.testing.assert_array_almost_equal(o.elements.lat, lat, 10)
+    assert o.accumulated_velocity is None
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -215,10 +215,87 @@ class TestSeed(unittest.TestCase):
         self.assertAlmostEqual(lat[0], 60, 5)
         self.assertNotAlmostEqual(lat[1], 60, 5)
 
+    def test_closest_ocean_points(self):
+        import shapely
+        from opendrift.readers import reader_shape
+        from opendrift.readers.basereader.coastline import OceanPoints
+        o = OceanDrift(loglevel=50)
+        reader_land = reader_shape.Reader([
+            shapely.box(4.5, 59, 6, 61),  # Island, and corners of domain
+            shapely.box(0, 55, .1, 55.1), shapely.box(9.9, 64.9, 10, 65)])
+        o.add_reader(reader_land)
+        lon = np.array([4.55, 5.95, 5.2, 4.0])
+        lat = np.array([60.0, 60.5, 60.97, 60.0])
+        lon, lat = o.closest_ocean_points(lon, lat)
+        # Moved to ocean, within grid resolution of nearest coast
+        np.testing.assert_allclose(lon[[0, 1, 3]], [4.5, 6, 4], atol=.01)
+        np.testing.assert_allclose(lat[[1, 2, 3]], [60.5, 61, 60], atol=.02)
+        self.assertTrue(lon[0] < 4.5 and lon[1] > 6 and lat[2] > 61)
+        # Grid is refined near the coast
+        self.assertAlmostEqual(lon[0], 4.5, delta=.01 / 4)
+        # Ocean points of tiles are cached, and reused for nearby points
+        num_tiles = len(reader_land.ocean_points)
+        lon, lat = o.closest_ocean_points(np.array([4.55]), np.array([60.05]))
+        self.assertEqual(len(reader_land.ocean_points), num_tiles)
+        np.testing.assert_allclose(lon, [4.5], atol=.01)
+        # Narrow channel through land is found, and number of cached
+        # tiles is limited
+        o = OceanDrift(loglevel=50)
+        reader_land = reader_shape.Reader([
+            shapely.box(4.5, 59, 5, 61), shapely.box(5.02, 59, 6, 61),
+            shapely.box(0, 55, .1, 55.1), shapely.box(9.9, 64.9, 10, 65)])
+        reader_land.ocean_points = OceanPoints(max_tiles=2)
+        o.add_reader(reader_land)
+        lon, lat = o.closest_ocean_points(np.array([5.06]), np.array([60.]))
+        self.assertTrue(5 < lon[0] < 5.02)
+        self.assertEqual(len(reader_land.ocean_points), 2)
+        import pickle
+        ocean_points = pickle.loads(pickle.dumps(reader_land.ocean_points))
+        self.assertEqual(len(ocean_points), 2)
+
     def test_seed_letters(self):
         o = OceanDrift(loglevel=50)
         o.seed_letters('Obey Soros', lon=-2, lat=61, time=datetime.now(), number=1000)
         self.assertAlmostEqual(o.elements_scheduled.lon.max(), 5.64, 1)
 
+def test_seed_release_groups(tmp_path):
+    import opendrift
+    o = OceanDrift(loglevel=50)
+    o.set_config('environment:fallback:x_sea_water_velocity', .1)
+    o.set_config('environment:fallback:land_binary_mask', 0)
+    t0 = datetime(2020, 2, 1, 12)
+    groups = [{'lon': 2, 'lat': 60, 'time': t0 + timedelta(days=d),
+               'name': 'Station %d' % s, 'metadata': {'station': s, 'day': d}}
+              for s in [1, 2] for d in [0, 1, 2]]
+    o.seed_release_groups(groups, duration=timedelta(days=2), number=10)
+    assert o.num_elements_scheduled() == 60
+    assert o.get_config('drift:max_age_seconds') is None
+    end_time = max(g['end_time'] for g in o.release_groups.values())
+    assert end_time == t0 + timedelta(days=4)
+    # Element outside groups, which is not retired
+    o.seed_elements(lon=2, lat=60, time=t0)
+
+    o.run(end_time=end_time, time_step=3600, time_step_output=3600*6)
+    assert o.num_elements_deactivated() == 60
+    assert o.num_elements_active() == 1
+
+    filenames = o.export_release_groups(
+        str(tmp_path / 'station{station}_day{day}.nc'))
+    assert len(filenames) == 6
+    for filename, group in zip(filenames, groups):
+        og = opendrift.open(filename)
+        assert og.history.shape == (10, 9)
+        assert og.status_categories == o.status_categories
+        assert og.get_config('environment:fallback:x_sea_water_velocity') == .1
+        assert og.start_time == group['time']
+        lon = og.history['lon']
+        # Drifting the same distance, independent of release time
+        np.testing.assert_array_almost_equal(
+            lon[:, -1].compressed(), o.history['lon'][0:10, 8])
+
+    with pytest.raises(ValueError):
+        o.export_release_groups(str(tmp_path / 'station{station}.nc'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -17,6 +17,7 @@
 #
 # Copyright 2015, Knut-Frode Dagestad, MET Norway
 
+import os
 import unittest
 import pytest
 from datetime import datetime, timedelta
@@ -26,6 +27,8 @@ from opendrift.readers import reader_ROMS_native
 from opendrift.readers import reader_global_landmask
 from opendrift.readers import reader_oscillating
 from opendrift.readers import reader_netCDF_CF_generic
+from opendrift.readers import reader_shape
+from opendrift.readers import reader_constant
 from opendrift.models.pelagicegg import PelagicEggDrift
 from opendrift.models.oceandrift import OceanDrift
 
@@ -144,6 +147,93 @@ class TestStranding(unittest.TestCase):
         self.assertAlmostEqual(lons[-2], 5.092, 2)
         self.assertAlmostEqual(lons[-1], 5.092, 2)
 
+    def test_coastline_crossing(self):
+        import shapely
+        land = [shapely.box(4.5, 59, 6, 61),  # Island, and domain corners
+                shapely.box(0, 55, .1, 55.1), shapely.box(9.9, 64.9, 10, 65)]
+        for crossing in [False, True]:
+            o = OceanDrift(loglevel=50)
+            reader_land = reader_shape.Reader(land)
+            calls = []  # Number of positions checked by landmask
+            get_variables = reader_land.get_variables
+            def count_calls(variables, time, x, y, z):
+                calls.append(len(x))
+                return get_variables(variables, time, x, y, z)
+            reader_land.get_variables = count_calls
+            o.add_reader(reader_land)
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('general:coastline_crossing', crossing)
+            o.set_config('seed:ocean_only', False)
+            o.set_config('environment:fallback:x_sea_water_velocity', .05)
+            o.seed_elements(lon=4.47, lat=60, number=10, radius=100,
+                            time=datetime.now())
+            o.run(steps=20, time_step=3600)
+            self.assertEqual(o.num_elements_deactivated(), 10)
+            if crossing is False:  # Stranded on land
+                self.assertTrue(o.elements_deactivated.lon.min() > 4.5001)
+                num_checked = sum(calls)
+            else:  # Stranded at coastline, only seeding positions checked
+                np.testing.assert_array_almost_equal(
+                    o.elements_deactivated.lon, 4.5, 5)
+                self.assertTrue(sum(calls) < num_checked / 2)
+
+    def test_coastline_crossing_outside_extent(self):
+        import shapely
+        land = [shapely.box(4.5, 59, 6, 61),  # Island, and domain corners
+                shapely.box(0, 55, .1, 55.1), shapely.box(9.9, 64.9, 10, 65)]
+        for crossing in [False, True]:
+            o = OceanDrift(loglevel=50)
+            o.max_speed = .001  # Elements leave the simulation extent
+            o.add_reader([reader_shape.Reader(land), reader_constant.Reader(
+                {'x_sea_water_velocity': .1, 'y_sea_water_velocity': 0})])
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('general:coastline_crossing', crossing)
+            o.set_config('general:coastline_action', 'stranding')
+            o.set_config('drift:horizontal_diffusivity', 0)
+            o.seed_elements(lon=4.4, lat=60, number=5, radius=100,
+                            time=datetime.now())
+            o.run(steps=24, time_step=3600)
+            self.assertEqual(o.num_elements_deactivated(), 5)
+            self.assertTrue(o.elements_deactivated.lon.max() < 4.6)
+
+    def test_coast_distance(self):
+        import shapely
+        import tempfile
+        land = [shapely.box(4.5, 59, 6, 61),  # Island, and domain corners
+                shapely.box(0, 55, .1, 55.1), shapely.box(9.9, 64.9, 10, 65)]
+        lons = []
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for i, distance in enumerate([False, True, True]):
+                o = OceanDrift(loglevel=50)
+                o.coast_distance_cache_dir = cache_dir
+                reader_land = reader_shape.Reader(land)
+                calls = []  # Number of positions checked by landmask
+                get_variables = reader_land.get_variables
+                def count_calls(variables, time, x, y, z):
+                    calls.append(len(x))
+                    return get_variables(variables, time, x, y, z)
+                o.add_reader(reader_land)
+                reader_land.get_variables = count_calls
+                o.set_config('general:use_auto_landmask', False)
+                o.set_config('general:coast_distance', distance)
+                o.set_config('seed:ocean_only', False)
+                o.set_config('environment:fallback:x_sea_water_velocity', .05)
+                o.seed_elements(lon=4.47, lat=60, number=10, radius=100,
+                                time=datetime.now())
+                o.seed_elements(lon=2, lat=57, number=10, radius=100,
+                                time=datetime.now())
+                o.run(steps=20, time_step=3600)
+                lons.append(o.elements.lon)
+                self.assertEqual(o.num_elements_deactivated(), 10)
+                if i == 0:
+                    num_checked = sum(calls)
+                else:  # Raster is made at first run, and then cached
+                    self.assertEqual(len(os.listdir(cache_dir)), 1)
+                if i == 2:  # Offshore elements are not checked with landmask
+                    self.assertTrue(sum(calls) < num_checked*.6)
+        np.testing.assert_array_equal(lons[0], lons[1])
+        np.testing.assert_array_equal(lons[0], lons[2])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,8 @@ import pytest
 import matplotlib.pyplot as plt
 from tests import *
 from opendrift.readers import reader_netCDF_CF_unstructured
+from opendrift.readers.interpolation.unstructured import triangle_neighbours, \
+    UnstructuredBlock
 from opendrift.models.oceandrift import OceanDrift
 
 akvaplan = "https://thredds.met.no/thredds/dodsC/metusers/knutfd/thredds/netcdf_unstructured_samples/AkvaplanNiva_sample_lonlat_fixed.nc"
@@ -143,3 +145,101 @@ def test_profile():
     # Elements at 10 and 50m depth should not have same trajectory
     # This is presently failing
     assert o.elements.lon[1] != o.elements.lon[2]
+
+def test_interpolate_triangles(tmp_path):
+    # Small synthetic FVCOM mesh of two triangles
+    from netCDF4 import Dataset
+    fname = str(tmp_path / 'fvcom_mesh.nc')
+    with Dataset(fname, 'w') as d:
+        d.CoordinateProjection = proj
+        d.CoordinateSystem = 'Cartesian'
+        d.createDimension('node', 4)
+        d.createDimension('nele', 2)
+        d.createDimension('three', 3)
+        d.createDimension('siglay', 2)
+        d.createDimension('siglev', 3)
+        d.createDimension('time', 2)
+        x = np.array([5.6e5, 5.7e5, 5.7e5, 5.6e5])
+        y = np.array([7.76e6, 7.76e6, 7.77e6, 7.77e6])
+        nv = np.array([[1, 2, 3], [1, 3, 4]])
+        d.createVariable('x', 'f8', ('node',))[:] = x
+        d.createVariable('y', 'f8', ('node',))[:] = y
+        d.createVariable('xc', 'f8', ('nele',))[:] = x[nv - 1].mean(axis=1)
+        d.createVariable('yc', 'f8', ('nele',))[:] = y[nv - 1].mean(axis=1)
+        d.createVariable('nv', 'i4', ('three', 'nele'))[:] = nv.T
+        # Elements across the sides opposite of each node
+        d.createVariable('nbe', 'i4', ('three', 'nele'))[:] = \
+            np.array([[0, 2, 0], [0, 0, 1]]).T
+        t = d.createVariable('time', 'f8', ('time',))
+        t.time_zone = 'UTC'
+        t.units = 'days since 1858-11-17 00:00:00'
+        t.format = 'modified julian day (MJD)'
+        t[:] = [58000, 58000.5]
+        d.createVariable('siglay', 'f8', ('siglay', 'node'))[:] = \
+            np.array([[-.25], [-.75]]) * np.ones(4)
+        d.createVariable('siglev', 'f8', ('siglev', 'node'))[:] = \
+            np.array([[0], [-.5], [-1]]) * np.ones(4)
+        d.createVariable('siglay_center', 'f8', ('siglay', 'nele'))[:] = \
+            np.array([[-.25], [-.75]]) * np.ones(2)
+        d.createVariable('siglev_center', 'f8', ('siglev', 'nele'))[:] = \
+            np.array([[0], [-.5], [-1]]) * np.ones(2)
+        h = d.createVariable('h', 'f8', ('node',))
+        h.standard_name = 'sea_floor_depth_below_geoid'
+        h[:] = [10, 20, 30, 40]
+        d.createVariable('h_center', 'f8', ('nele',))[:] = [20, 25]
+        u = d.createVariable('u', 'f8', ('time', 'siglay', 'nele'))
+        u.standard_name = 'eastward_sea_water_velocity'
+        u[:] = [[[.1, .2], [.3, .4]], [[.5, .6], [.7, .8]]]
+
+    r = reader_netCDF_CF_unstructured.Reader(fname)
+    np.testing.assert_array_equal(
+        r.interpolator.neighbours,
+        triangle_neighbours(r.interpolator.triangles))
+    # Linear interpolation of node variables within triangles
+    x = np.array([5.61e5, 5.64e5, 5.69e5, 5.6e5])
+    y = np.array([7.761e6, 7.766e6, 7.761e6, 7.77e6])
+    z = np.array([0, -20, -12, -30])
+    v = r.get_variables(['sea_floor_depth_below_geoid',
+                         'x_sea_water_velocity'], r.start_time, x, y, z)
+    np.testing.assert_array_almost_equal(
+        v['sea_floor_depth_below_geoid'], [12, 24, 20, 40])
+    # Face variables are taken from containing triangle
+    np.testing.assert_array_almost_equal(
+        v['x_sea_water_velocity'], [.1, .4, .3, .4])
+    # Triangles are reused for next call
+    np.testing.assert_array_equal(r.interpolator.last, [0, 1, 0, 1])
+    v = r.get_variables(['sea_floor_depth_below_geoid'], r.start_time,
+                        x + 1, y, z)
+    np.testing.assert_array_almost_equal(
+        v['sea_floor_depth_below_geoid'], [12.001, 23.999, 20.001, 39.999])
+
+    # Interpolation in time, with blocks kept for before and after
+    from datetime import timedelta
+    time = r.start_time + timedelta(hours=3)
+    u = r._get_variables_interpolated_(['x_sea_water_velocity'], None, None,
+                                       time, x, y, z)[0]
+    np.testing.assert_array_almost_equal(
+        u['x_sea_water_velocity'], [.2, .5, .4, .5])
+    blocks_read = r.counters['blocks read']
+    u = r._get_variables_interpolated_(['x_sea_water_velocity'], None, None,
+                                       time + timedelta(hours=1), x, y, z)[0]
+    np.testing.assert_array_almost_equal(
+        u['x_sea_water_velocity'], np.array([.1, .4, .3, .4]) + .4/3)
+    assert r.counters['blocks read'] == blocks_read
+
+    # Only requested columns are read, if scattered
+    r.block_sparse_ratio = 0
+    r.var_block_before = {}
+    r.var_block_after = {}
+    v = r.get_variables(['sea_floor_depth_below_geoid',
+                         'x_sea_water_velocity'], r.start_time, x, y, z)
+    np.testing.assert_array_almost_equal(
+        v['sea_floor_depth_below_geoid'], [12, 24, 20, 40])
+    np.testing.assert_array_almost_equal(
+        v['x_sea_water_velocity'], [.1, .4, .3, .4])
+    block = UnstructuredBlock(None, np.array([[1., 2.], [3., 4.]]),
+                              columns=np.array([2, 7]))
+    assert block.covers(np.array([7, 2]))
+    assert not block.covers(np.array([2, 3]))
+    np.testing.assert_array_equal(block.values(np.array([7, 7, 2])),
+                                  [[2, 2, 1], [4, 4, 3]])
@@ -207,6 +207,35 @@ class TestInterpolation(unittest.TestCase):
         np.testing.assert_array_almost_equal(bi(d), bi_flipped(np.flip(d, axis=1)))
         np.testing.assert_array_almost_equal(bi(d), 5*x0)
 
+    def test_linearNDFast_layers_and_reuse(self):
+        from scipy.ndimage import map_coordinates
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        data_dict['var3d'][:, 5:8, 5:8] = np.nan
+        b = ReaderBlock(data_dict.copy())
+        b2 = ReaderBlock(data_dict.copy())
+        b2.time = b.time + timedelta(hours=1)
+
+        # All layers interpolated at once, as layer by layer
+        interpolator2d = b.Interpolator2DClass(b.x, b.y, x, y)
+        values = interpolator2d(b.data_dict['var3d'].copy())
+        for layer in range(len(b.z)):
+            np.testing.assert_array_almost_equal(
+                values[layer, :],
+                interpolator2d(b.data_dict['var3d'][layer, :, :].copy()))
+        xi = (x - b.x[0])/(b.x[-1] - b.x[0])*(len(b.x) - 1)
+        yi = (y - b.y[0])/(b.y[-1] - b.y[0])*(len(b.y) - 1)
+        np.testing.assert_array_almost_equal(
+            interpolator2d(b.data_dict['var2d']),
+            map_coordinates(b.data_dict['var2d'], [yi, xi],
+                            cval=np.nan, order=1))
+
+        # Block with same grid reuses indices and weights
+        env, _ = b.interpolate(x, y, z, ['var2d', 'var3d'], profiles=None)
+        env2, _ = b2.interpolate(x, y, z, ['var2d', 'var3d'], profiles=None,
+                                 reuse_from=b)
+        self.assertIs(b.interpolator2d, b2.interpolator2d)
+        np.testing.assert_array_almost_equal(env['var3d'], env2['var3d'])
+
     def test_interpolation_ensemble(self):
         data_dict, x, y, z = self.get_synthetic_data_dict()
         x = x[0:15]
@@ -24,3 +24,63 @@ def test_get_variables():
 
     np.testing.assert_almost_equal(e['x_sea_water_velocity'], [-0.16828385])
 
+
+
+def test_subset_blocks(tmp_path):
+    # Small synthetic 3D SCHISM file, with velocity varying linearly with depth
+    import xarray as xr
+    x, y = np.meshgrid(np.arange(40) * 1000. + 5e5, np.arange(40) * 1000. + 6.6e6)
+    x = x.ravel()
+    y = y.ravel()
+    depth = 20 + x / 1e4 - 50
+    zcor = np.stack((-depth, -depth / 2, 0 * depth), axis=-1)
+    zcor[0, 0] = np.nan  # below seabed
+    u = .05 + .002 * zcor
+    hvel = np.stack((u, -u), axis=-1)
+    ds = xr.Dataset({
+        'SCHISM_hgrid_node_x': ('nSCHISM_hgrid_node', x,
+                                {'standard_name': 'projection_x_coordinate'}),
+        'SCHISM_hgrid_node_y': ('nSCHISM_hgrid_node', y,
+                                {'standard_name': 'projection_y_coordinate'}),
+        'time': ('time', [0., 3600.],
+                 {'units': 'seconds since 2020-01-01 00:00:00'}),
+        'depth': ('nSCHISM_hgrid_node', depth),
+        'zcor': (('time', 'nSCHISM_hgrid_node', 'nSCHISM_vgrid_layers'),
+                 np.stack((zcor, zcor))),
+        'hvel': (('time', 'nSCHISM_hgrid_node', 'nSCHISM_vgrid_layers', 'two'),
+                 np.stack((hvel, hvel))),
+        })
+    filename = str(tmp_path / 'schism.nc')
+    ds.to_netcdf(filename)
+
+    r = reader_schism_native.Reader(filename=filename,
+        proj4='+proj=utm +zone=33 +ellps=WGS84 +units=m +no_defs')
+    assert r.use_3d
+    px = np.array([5.05e5, 5.1e5, 5.15e5])
+    py = np.array([6.605e6, 6.61e6, 6.61e6])
+    pz = np.array([-2, -5, 0])
+    e, _ = r._get_variables_interpolated_(
+        ['x_sea_water_velocity', 'y_sea_water_velocity'], None, None,
+        r.start_time, px, py, pz)
+    np.testing.assert_array_almost_equal(e['x_sea_water_velocity'],
+                                         .05 + .002 * pz)
+    np.testing.assert_array_almost_equal(e['y_sea_water_velocity'],
+                                         -.05 - .002 * pz)
+    assert r.var_block_before[str(['x_sea_water_velocity',
+        'y_sea_water_velocity'])].block_KDtree.n == len(x)
+
+    # Blocks of prepared reader contain only nodes around particles
+    r = reader_schism_native.Reader(filename=filename,
+        proj4='+proj=utm +zone=33 +ellps=WGS84 +units=m +no_defs')
+    r.prepare(extent=None, start_time=r.start_time, end_time=r.end_time,
+              max_speed=.5)
+    e, _ = r._get_variables_interpolated_(
+        ['x_sea_water_velocity', 'y_sea_water_velocity'], None, None,
+        r.start_time + (r.end_time - r.start_time) / 2, px, py, pz)
+    np.testing.assert_array_almost_equal(e['x_sea_water_velocity'],
+                                         .05 + .002 * pz)
+    block = r.var_block_before[str(['x_sea_water_velocity',
+                                    'y_sea_water_velocity'])]
+    assert block.block_KDtree.n < len(x) / 2
+    assert block.covers_positions(px, py)
+    assert not block.covers_positions(px + 5000, py)
@@ -28,3 +28,21 @@ proj = "+proj=lcc +lat_1=49.50000000000001 +lat_0=49.50000000000001 +lon_0=0 \
 def test_open(sel_3d):
     r = Reader(sel_3d, proj4=proj)
     print(r)
+
+
+@need_telemac
+def test_frame_cache(sel_3d):
+    import numpy as np
+    r = Reader(sel_3d, proj4=proj)
+    rm = Reader(sel_3d, proj4=proj, memmap=True)
+    x = r.x[[10, 100, 1000]] + 1
+    y = r.y[[10, 100, 1000]] + 1
+    z = np.array([0, -1, -5])
+    time = r.times[0] + (r.times[1] - r.times[0]) / 3
+    variables = ['x_sea_water_velocity', 'sea_floor_depth_below_sea_level']
+    v = r.get_variables(variables, time, x, y, z)
+    vm = rm.get_variables(variables, time, x, y, z)
+    for var in variables:
+        np.testing.assert_array_almost_equal(v[var], vm[var])
+    # Frames before and after are cached
+    assert len(r.frames) == 2
@@ -1,4 +1,7 @@
+import copy
+import pickle
 import numpy as np
+from datetime import datetime, timedelta
 import pytest
 from . import *
 from opendrift.readers import reader_netCDF_CF_generic, reader_ROMS_native
@@ -93,3 +96,190 @@ def test_lonlat2xy_parallel_big(test_data, benchmark):
 
     np.testing.assert_equal(x, xs)
     np.testing.assert_equal(y, ys)
+
+def test_prefetch_next_block(test_data):
+    fname = test_data + '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'
+    variables = ['x_sea_water_velocity', 'y_sea_water_velocity']
+    lon = np.array([15., 16.])
+    lat = np.array([71., 71.5])
+    z = np.array([0., -10.])
+
+    reader = reader_netCDF_CF_generic.Reader(fname)
+    reader_prefetch = reader_netCDF_CF_generic.Reader(fname)
+    reader_prefetch.set_prefetch()
+
+    for hours in [12, 24, 36, 48, 72]:
+        time = reader.start_time + timedelta(hours=hours)
+        env = reader.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        variables = variables[::-1]  # Order of variables does not matter
+        env_prefetch = reader_prefetch.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        for var in variables:
+            np.testing.assert_array_almost_equal(env[var], env_prefetch[var])
+
+    assert 'reading prefetched' in reader_prefetch.timing
+    # Prefetched blocks are used, and not read again
+    for future in list(reader_prefetch.__prefetch_futures__.values()):
+        future.result()
+    # Four blocks are read, and one block ahead by prefetching
+    assert reader_prefetch.counters['bytes read'] == \
+        reader.counters['bytes read']*5/4
+
+    # Thread is only started with prefetch, and readers may be copied
+    assert reader.__prefetch_executor__ is None
+    for r in [copy.deepcopy(reader_prefetch),
+              pickle.loads(pickle.dumps(reader_prefetch))]:
+        assert r.__prefetch_executor__ is None
+        assert r.__prefetch_futures__ == {}
+        env_copy = r.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        for var in variables:
+            np.testing.assert_array_almost_equal(env[var], env_copy[var])
+    executor = reader_prefetch.__prefetch_executor__
+    reader_prefetch.set_prefetch(False)
+    assert executor._shutdown is True
+    assert reader_prefetch.__prefetch_executor__ is None
+
+def test_block_cache(test_data):
+    fname = test_data + '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'
+    variables = ['x_sea_water_velocity', 'y_sea_water_velocity']
+    lon = np.array([15., 16.])
+    lat = np.array([71., 71.5])
+    z = np.array([0., -10.])
+
+    reader = reader_netCDF_CF_generic.Reader(fname)
+    reader_cache = reader_netCDF_CF_generic.Reader(fname)
+    reader_cache.set_block_cache_size(100e6)
+
+    # Going back and forth in time, as e.g. repeated runs
+    for hours in [12, 60, 12, 36, 60]:
+        time = reader.start_time + timedelta(hours=hours)
+        env = reader.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        env_cache = reader_cache.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        for var in variables:
+            np.testing.assert_array_almost_equal(env[var], env_cache[var])
+
+    assert reader_cache.counters['block cache hits'] == 4
+    assert reader_cache.counters['block cache misses'] == 4
+    assert 'block cache hits' in reader_cache.performance()
+
+    # Only the least recently used blocks are kept within budget
+    cache = reader_cache.block_cache
+    blocks = list(cache.blocks.values())
+    cache.max_bytes = blocks[-1][1] + blocks[-2][1]
+    cache.put(*list(cache.blocks)[-1][0:2], blocks[-1][0])
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+
+def test_disk_cache(test_data, tmp_path):
+    fname = test_data + '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'
+    variables = ['x_sea_water_velocity', 'y_sea_water_velocity',
+                 'sea_floor_depth_below_sea_level']
+    lon = np.array([15., 16.])
+    lat = np.array([71., 71.5])
+    z = np.array([0., -10.])
+    time = datetime(2016, 2, 2, 12)
+
+    reader = reader_netCDF_CF_generic.Reader(fname)
+    env = reader.get_variables_interpolated(
+        variables, lon=lon, lat=lat, z=z, time=time)[0]
+
+    # Second reader, e.g. in another process, reads from disk cache
+    for i in range(2):
+        reader_cache = reader_netCDF_CF_generic.Reader(fname)
+        reader_cache.set_disk_cache(tmp_path / 'cache')
+        env_cache = reader_cache.get_variables_interpolated(
+            variables, lon=lon, lat=lat, z=z, time=time)[0]
+        for var in variables:
+            np.testing.assert_array_almost_equal(env[var], env_cache[var])
+    assert reader_cache.counters['disk cache hits'] == 3
+    assert 'disk cache misses' not in reader_cache.counters
+    assert len(list((tmp_path / 'cache').glob('*.nc'))) == 3
+
+    # Least recently used files are evicted when exceeding size limit,
+    # down to low_water fraction of the limit
+    cache = reader_cache.disk_cache
+    sizes = [f[1] for f in cache.files()]
+    cache.max_bytes = max(sizes) / cache.low_water
+    cache.evict()
+    assert len(cache.files()) == 1
+    assert cache.nbytes == sum(f[1] for f in cache.files())
+
+    # Directory is not scanned again while within size limit
+    cache.files = None
+    cache.evict()
+
+def test_variable_blocks(test_data):
+    fname = test_data + '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'
+    velocity = ['x_sea_water_velocity', 'y_sea_water_velocity']
+    lon = np.array([15., 16.])
+    lat = np.array([71., 71.5])
+    z = np.array([-50., -100.])
+
+    reader = reader_netCDF_CF_generic.Reader(fname)
+    requested = []
+    get_variables = reader.get_variables
+    def spy(variables, *args, **kwargs):
+        requested.append(sorted(variables))
+        return get_variables(variables, *args, **kwargs)
+    reader.get_variables = spy
+
+    time = reader.start_time + timedelta(hours=12)
+    reader.get_variables_interpolated(['sea_floor_depth_below_sea_level'],
+        lon=lon, lat=lat, z=0*z, time=reader.start_time)
+    env = reader.get_variables_interpolated(
+        velocity + ['sea_water_temperature'], lon=lon, lat=lat, z=z,
+        time=time)[0]
+    # Variables are read in one block per time, and shared by later requests
+    assert requested == [['sea_floor_depth_below_sea_level']] + \
+                        2*[sorted(velocity + ['sea_water_temperature'])]
+    env2 = reader.get_variables_interpolated(
+        velocity + ['sea_floor_depth_below_sea_level'], lon=lon, lat=lat,
+        z=z, time=time)[0]
+    # Only depth at time after is missing
+    assert requested[3:] == [['sea_floor_depth_below_sea_level']]
+
+    # Same values as a reader reading all variables in one block
+    reader2 = reader_netCDF_CF_generic.Reader(fname)
+    env_all = reader2.get_variables_interpolated(
+        velocity + ['sea_floor_depth_below_sea_level'], lon=lon, lat=lat,
+        z=z, time=time)[0]
+    for var in env2:
+        np.testing.assert_array_almost_equal(env2[var], env_all[var])
+    for var in velocity:
+        np.testing.assert_array_almost_equal(env[var], env_all[var])
+
+def test_adaptive_buffer(test_data):
+    from opendrift.models.oceandrift import OceanDrift
+    fname = test_data + '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'
+    lon = {}
+    readers = {}
+    for adaptive in [False, True]:
+        o = OceanDrift(loglevel=50)
+        reader = reader_netCDF_CF_generic.Reader(fname)
+        if adaptive is True:
+            reader.set_adaptive_buffer()
+        o.add_reader(reader)
+        if adaptive is True:
+            reader.buffer = 0  # Too small, must be increased
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        o.set_config('drift:vertical_mixing', False)
+        np.random.seed(1)
+        o.seed_elements(lon=15, lat=71, radius=20000, number=100,
+                        time=reader.start_time, z=np.linspace(-100, 0, 100))
+        o.run(steps=100, time_step=1800)
+        lon[adaptive] = o.elements.lon
+        readers[adaptive] = reader
+
+    # Same result, but reading less data than with buffer from max_speed.
+    # Small differences may occur where missing values (land) are filled
+    # from neighbour pixels, which depends on block extent.
+    np.testing.assert_allclose(lon[False], lon[True], atol=1e-2)
+    counters = readers[True].counters
+    assert counters['blocks re-read'] > 0
+    assert counters['buffer increases'] > 0
+    assert readers[True].buffer < readers[False].buffer
+    assert counters['bytes read'] < readers[False].counters['bytes read']